@@ -0,0 +1,133 @@
+"""
+Cold start benchmark of an API worker: import time, baseline memory and the
+first query
+
+Each run starts a fresh interpreter that imports main_api (the whole serving
+stack), builds the index from the existing store and answers one
+autocomplete query, and reports:
+
+- import_s: duration of `import main_api` (and of pandas with --with-pandas)
+- rss_mb: resident memory right after the import
+- build_s: duration of TrieService.build_trie
+- first_query_ms: duration of the first formatted autocomplete response
+- peak_rss_mb: peak resident memory at the end of the run
+- pandas_loaded: whether pandas was imported along the way (it should not be)
+
+The medians over --repeat runs are printed as JSON. --with-pandas imports
+pandas before main_api, which shows what a serving path depending on it
+costs.
+
+Usage:
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --repeat 10 --output cold_start.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Run in the child interpreter; prints one JSON line of measurements
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+if {with_pandas}:
+    import pandas
+import main_api
+import_s = time.perf_counter() - start
+from src.services.index_stats import process_memory
+rss_mb = process_memory()["rss_bytes"] / 1e6
+from src.services.autocomplete_service import (
+    format_autocomplete_response, get_autocomplete_results,
+)
+from src.services.trie_service import TrieService
+service = TrieService.get_instance()
+service.store
+start = time.perf_counter()
+service.build_trie()
+build_s = time.perf_counter() - start
+start = time.perf_counter()
+format_autocomplete_response("pi", get_autocomplete_results("pi", 10), 10)
+first_query_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    "import_s": import_s,
+    "rss_mb": rss_mb,
+    "build_s": build_s,
+    "first_query_ms": first_query_ms,
+    "peak_rss_mb": process_memory()["peak_rss_bytes"] / 1e6,
+    "pandas_loaded": "pandas" in sys.modules,
+}}))
+"""
+
+
+def run_once(with_pandas=False):
+    """Measure one cold start in a fresh interpreter
+
+    Args:
+        with_pandas (bool, optional): Import pandas before the serving stack
+
+    Returns:
+        dict: Measurements of the run
+    """
+    env = dict(os.environ, PYTHONPATH=os.getcwd(), AUTOCOMPLETE_WARM_START="0")
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(with_pandas=with_pandas)],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(repeat, with_pandas=False):
+    """Return the median measurements of several cold starts
+
+    Args:
+        repeat (int): Number of runs
+        with_pandas (bool, optional): Import pandas before the serving stack
+
+    Returns:
+        dict: Median of each measurement, and whether any run loaded pandas
+    """
+    runs = [run_once(with_pandas) for _ in range(repeat)]
+    report = {
+        name: round(statistics.median(run[name] for run in runs), 3)
+        for name in ["import_s", "rss_mb", "build_s", "first_query_ms", "peak_rss_mb"]
+    }
+    report["pandas_loaded"] = any(run["pandas_loaded"] for run in runs)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--with-pandas",
+        action="store_true",
+        help="Also measure a start that imports pandas first",
+    )
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    # Create the store beforehand: importing the CSV is offline work
+    from src.services.trie_service import TrieService
+
+    TrieService(shard_index=0, shard_count=1).store
+
+    report = {"serving": measure(args.repeat)}
+    if args.with_pandas:
+        report["with_pandas"] = measure(args.repeat, with_pandas=True)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Compare the prefix index engines on build time, memory and query latency
+
+Builds the index once per engine of TRIE_MODES over the restaurant dataset,
+optionally replicated --scale times (each copy of a name gets a numeric
+suffix, so prefixes match --scale times more entries), and prints a JSON
+report with, per engine:
+
+- build_s: duration of TrieService.build_trie
+- traced_mb: Python memory allocated by the build (tracemalloc)
+- estimated_mb: size estimated by the /api/stats structure walk
+- latency_us: p50 / p95 / p99 of a top-10 query (search and ranking, without
+  the record lookup shared by all engines) per prefix length
+
+Usage:
+    python -m benchmarks.engine_comparison
+    python -m benchmarks.engine_comparison --scale 10 --output engines.json
+"""
+
+import argparse
+import gc
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from src.data.columnar_store import ColumnarStore
+from src.data.data_loader import rank_entry_ids
+from src.services.index_stats import cached_structure_stats
+from src.services.trie_service import TRIE_MODES, TrieService
+
+
+def percentile(sorted_values, pct):
+    """Return the nearest-rank percentile of a sorted list"""
+    rank = max(int(round(pct / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def write_scaled_store(source, path, scale):
+    """Write a copy of a store with every row replicated scale times
+
+    Args:
+        source (ColumnarStore): Store to copy
+        path (str): Directory of the new store
+        scale (int): Number of copies of each row
+
+    Returns:
+        ColumnarStore: The new store
+    """
+    rows = source.rows()
+    columns = {name: [] for name in source.schema}
+    for copy in range(scale):
+        for row in rows:
+            for name in source.schema:
+                value = row[name]
+                if name == "display_name" and copy:
+                    value = f"{value} {copy}"
+                columns[name].append(value)
+    return ColumnarStore.create(path, columns, source.schema)
+
+
+def build_engine(trie_mode, store_path):
+    """Build the index of a store with one engine, measuring the build
+
+    Returns:
+        tuple: (TrieService, traced bytes allocated by the build)
+    """
+    service = TrieService(trie_mode, shard_index=0, shard_count=1)
+    service.data_path = store_path
+    TrieService._instance = service
+    TrieService._is_initialized = False
+    service.store
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = service.build_trie()
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    if result["status"] != "success":
+        raise RuntimeError(result["message"])
+
+    # Rebuild without tracing, which slows allocations down
+    service.build_trie()
+    return service, traced
+
+
+def top_ten(service, prefix):
+    """Run the engine part of a top-10 autocomplete query"""
+    if service.supports_top_k():
+        return service.search_top(prefix, 10)[0]
+    return rank_entry_ids(service.search_prefix(prefix), service.store, 10)
+
+
+def measure_latency(service, prefixes, repeat):
+    """Return latency percentiles in microseconds per prefix length"""
+    report = {}
+    for length, group in sorted(prefixes.items()):
+        for prefix in group[:50]:
+            top_ten(service, prefix)
+        latencies = []
+        for _ in range(repeat):
+            for prefix in group:
+                start = time.perf_counter()
+                top_ten(service, prefix)
+                latencies.append((time.perf_counter() - start) * 1e6)
+        latencies.sort()
+        report[str(length)] = {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", type=int, default=1, help="Dataset replication")
+    parser.add_argument(
+        "--modes", nargs="+", default=list(TRIE_MODES), choices=list(TRIE_MODES)
+    )
+    parser.add_argument("--prefixes", type=int, default=500, help="Per length")
+    parser.add_argument("--max-length", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    tmp_dir = tempfile.mkdtemp(prefix="engines-")
+    try:
+        source = TrieService(shard_index=0, shard_count=1).store
+        store = write_scaled_store(source, f"{tmp_dir}/restaurants.store", args.scale)
+
+        rng = random.Random(args.seed)
+        entries = len(store)
+        names = store.strings("display_name")
+        prefixes = {}
+        for length in range(1, args.max_length + 1):
+            candidates = sorted(
+                {name[:length] for name in names if len(name) >= length}
+            )
+            prefixes[length] = rng.sample(
+                candidates, min(args.prefixes, len(candidates))
+            )
+
+        engines = {}
+        for trie_mode in args.modes:
+            service, traced = build_engine(trie_mode, store.path)
+            structure = cached_structure_stats(service.trie, service.index_tag())
+            engines[trie_mode] = {
+                "build_s": service.build_duration_s,
+                "traced_mb": round(traced / 1e6, 2),
+                "estimated_mb": round(structure["estimated_bytes"] / 1e6, 2),
+                "nodes": structure["nodes"],
+                "latency_us": measure_latency(service, prefixes, args.repeat),
+            }
+            print(f"{trie_mode}: done", file=sys.stderr)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {"entries": entries, "scale": args.scale, "engines": engines}
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Keystroke-trace load generator and replay harness for /api/autocomplete
+
+Generates realistic typing traffic from the restaurant names and replays it
+at a target QPS, either in-process against the ASGI app or over HTTP against
+a running server, and prints a JSON report of throughput, latency
+percentiles and error rates.
+
+A trace is a list of sessions. Each session is one user typing (a prefix of)
+a restaurant name:
+
+- names are picked with Zipfian popularity over their rank by rating count
+- inter-keystroke delays are log-normally distributed around --keystroke-ms
+- with probability --typo-rate a keystroke is a wrong character, followed by
+  a backspace
+- like the frontend, a request is only sent once the user pauses for at
+  least --debounce-ms, or after the last keystroke
+- the user stops typing after each keystroke with probability --stop-rate
+- requests carry the frontend's limit and expand budget (--limit, --expand)
+
+Sessions start as a Poisson process whose rate is chosen so the aggregate
+request rate matches --qps, which keeps the intra-session timing intact.
+
+The replay starts once the server reports it is ready. The index loaded by
+the server's warm start (which the app lifespan also runs in-process) is
+used as is; POST /api/initialize only builds it when no startup load runs.
+
+Usage:
+    # In-process against main_api:app
+    python -m benchmarks.keystroke_load --qps 200 --duration 10
+
+    # Against a local uvicorn (python main_api.py)
+    python -m benchmarks.keystroke_load --mode http --url http://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import random
+import string
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.autocomplete_service import FRONTEND_EXPAND
+
+TYPO_CHARACTERS = string.ascii_lowercase + " "
+
+
+def load_names_and_ratings():
+    """Load restaurant names and rating counts from the columnar store
+
+    Returns:
+        tuple: (list of names, list of rating counts)
+    """
+    from src.services.trie_service import TrieService
+
+    store = TrieService.get_instance().store
+    return store.strings("display_name"), store.column("user_rating_count").tolist()
+
+
+class ZipfSampler:
+    """Sample names with probability proportional to 1 / rank ** s"""
+
+    def __init__(self, names, ratings, s, rng):
+        ranked = sorted(zip(ratings, names), key=lambda pair: -pair[0])
+        self.names = [name for _, name in ranked]
+        self.cumulative = []
+        total = 0.0
+        for rank in range(1, len(self.names) + 1):
+            total += 1.0 / rank**s
+            self.cumulative.append(total)
+        self.rng = rng
+
+    def sample(self):
+        x = self.rng.random() * self.cumulative[-1]
+        return self.names[bisect.bisect_left(self.cumulative, x)]
+
+
+def generate_session(name, rng, args):
+    """Simulate one user typing a name
+
+    Args:
+        name (str): Name the user is looking for
+        rng (random.Random): Random generator
+        args (argparse.Namespace): Trace parameters
+
+    Returns:
+        list: (offset in seconds, prefix) for each request the client sends
+    """
+    # Build the keystroke sequence as (delay before keystroke, text after it)
+    keystrokes = []
+    text = ""
+    mean_delay = args.keystroke_ms / 1000.0
+    for c in name:
+        if rng.random() < args.typo_rate:
+            keystrokes.append(
+                (
+                    rng.lognormvariate(0, 0.5) * mean_delay,
+                    text + rng.choice(TYPO_CHARACTERS),
+                )
+            )
+            keystrokes.append((rng.lognormvariate(0, 0.5) * mean_delay * 2, text))
+        text += c
+        keystrokes.append((rng.lognormvariate(0, 0.5) * mean_delay, text))
+        if len(text) >= 2 and rng.random() < args.stop_rate:
+            break
+
+    # Debounce: a request fires when the next keystroke comes too late
+    requests = []
+    offset = 0.0
+    debounce = args.debounce_ms / 1000.0
+    for i, (delay, text) in enumerate(keystrokes):
+        offset += delay
+        next_delay = keystrokes[i + 1][0] if i + 1 < len(keystrokes) else None
+        if text.strip() and (next_delay is None or next_delay >= debounce):
+            requests.append((offset + debounce, text))
+    return requests
+
+
+def generate_trace(names, ratings, args):
+    """Generate a trace of requests covering --duration seconds
+
+    Args:
+        names (list): Restaurant names
+        ratings (list): Rating counts, used to rank popularity
+        args (argparse.Namespace): Trace parameters
+
+    Returns:
+        list: (send time in seconds, prefix) sorted by send time
+    """
+    rng = random.Random(args.seed)
+    sampler = ZipfSampler(names, ratings, args.zipf_s, rng)
+
+    # Estimate requests per session to derive the session arrival rate
+    sample = [generate_session(sampler.sample(), rng, args) for _ in range(200)]
+    requests_per_session = max(sum(len(s) for s in sample) / len(sample), 1e-9)
+    session_rate = args.qps / requests_per_session
+
+    # Start sessions before time 0 so the trace begins in steady state
+    # instead of ramping up while the first users are still typing
+    warmup = max((s[-1][0] for s in sample if s), default=0.0)
+
+    trace = []
+    start = -warmup
+    while True:
+        start += rng.expovariate(session_rate)
+        if start >= args.duration:
+            break
+        for offset, prefix in generate_session(sampler.sample(), rng, args):
+            if 0 <= start + offset < args.duration:
+                trace.append((start + offset, prefix))
+    trace.sort()
+    return trace
+
+
+class AsgiClient:
+    """Minimal in-process client that sends GET/POST requests to an ASGI app"""
+
+    def __init__(self, app):
+        self.app = app
+        self._lifespan_queue = None
+        self._lifespan_task = None
+
+    async def startup(self):
+        """Run the app's lifespan startup"""
+        self._lifespan_queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            return await self._lifespan_queue.get()
+
+        async def send(message):
+            if message["type"].startswith("lifespan.startup") and not started.done():
+                started.set_result(message)
+
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._lifespan_task = asyncio.create_task(self.app(scope, receive, send))
+        await self._lifespan_queue.put({"type": "lifespan.startup"})
+        message = await started
+        if message["type"] == "lifespan.startup.failed":
+            raise RuntimeError(message.get("message", "Lifespan startup failed"))
+
+    async def shutdown(self):
+        """Run the app's lifespan shutdown"""
+        if self._lifespan_task is not None:
+            await self._lifespan_queue.put({"type": "lifespan.shutdown"})
+            await self._lifespan_task
+
+    async def request(self, method, path, query=""):
+        """Send a request and return its status code and body"""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"loadgen")],
+            "client": ("127.0.0.1", 0),
+            "server": ("loadgen", 80),
+        }
+        response = {"status": None, "body": b""}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+
+        await self.app(scope, receive, send)
+        return response["status"], response["body"]
+
+
+class HttpClient:
+    """Client that sends requests to a running server from a thread pool"""
+
+    def __init__(self, base_url, workers):
+        self.base_url = base_url.rstrip("/")
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def startup(self):
+        pass
+
+    async def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def _request(self, method, path, query):
+        url = f"{self.base_url}{path}" + (f"?{query}" if query else "")
+        req = urllib.request.Request(url, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+        except (urllib.error.URLError, OSError):
+            return None, b""
+
+    async def request(self, method, path, query=""):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, self._request, method, path, query
+        )
+
+
+def percentile(sorted_values, pct):
+    """Return the nearest-rank percentile of a sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def replay(client, trace, args):
+    """Replay a trace open-loop and collect per-request results
+
+    Args:
+        client (AsgiClient | HttpClient): Client to send requests with
+        trace (list): (send time in seconds, prefix) sorted by send time
+        args (argparse.Namespace): Replay parameters
+
+    Returns:
+        dict: JSON-serializable report
+    """
+    latencies = []
+    statuses = {}
+    lateness = []
+
+    async def fire(prefix):
+        query = urllib.parse.urlencode(
+            {"prefix": prefix, "limit": args.limit, "expand": args.expand}
+        )
+        sent = time.perf_counter()
+        status, _ = await client.request("GET", "/api/autocomplete", query)
+        latencies.append(time.perf_counter() - sent)
+        key = str(status) if status is not None else "connection_error"
+        statuses[key] = statuses.get(key, 0) + 1
+
+    tasks = []
+    start = time.perf_counter()
+    for send_at, prefix in trace:
+        delay = send_at - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            lateness.append(-delay)
+        tasks.append(asyncio.create_task(fire(prefix)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    errors = sum(n for status, n in statuses.items() if not status.startswith("2"))
+    total = len(latencies)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "mode": args.mode,
+        "target_qps": args.qps,
+        "duration_s": round(elapsed, 3),
+        "requests": total,
+        "throughput_qps": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": to_ms(sum(latencies) / total) if total else None,
+            "p50": to_ms(percentile(latencies, 50)),
+            "p90": to_ms(percentile(latencies, 90)),
+            "p95": to_ms(percentile(latencies, 95)),
+            "p99": to_ms(percentile(latencies, 99)),
+            "max": to_ms(latencies[-1] if latencies else None),
+        },
+        "status_counts": statuses,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "late_sends": len(lateness),
+        "max_send_lag_ms": to_ms(max(lateness) if lateness else 0.0),
+        "trace": {
+            "seed": args.seed,
+            "zipf_s": args.zipf_s,
+            "keystroke_ms": args.keystroke_ms,
+            "debounce_ms": args.debounce_ms,
+            "typo_rate": args.typo_rate,
+            "stop_rate": args.stop_rate,
+            "limit": args.limit,
+            "expand": args.expand,
+        },
+    }
+
+
+async def wait_until_ready(client, args):
+    """Wait until the server has loaded its index, building it if needed
+
+    A server loading its index at startup is awaited rather than initialized
+    again, which would build the index twice and overlap the replay.
+
+    Args:
+        client (AsgiClient | HttpClient): Client to send requests with
+        args (argparse.Namespace): Replay parameters
+
+    Raises:
+        RuntimeError: If the initialization fails or the server is still not
+            ready after --ready-timeout seconds
+    """
+    deadline = time.perf_counter() + args.ready_timeout
+    initialized = False
+    while True:
+        status, body = await client.request("GET", "/api/health/ready")
+        if status == 200:
+            return
+        startup = {}
+        if status == 503:
+            detail = json.loads(body).get("detail")
+            if isinstance(detail, dict):
+                startup = detail.get("startup") or {}
+        if not initialized and startup.get("status") in ("idle", "failed"):
+            status, body = await client.request("POST", "/api/initialize")
+            if status != 200:
+                raise RuntimeError(f"Initialization failed ({status}): {body[:200]!r}")
+            initialized = True
+            continue
+        if time.perf_counter() > deadline:
+            raise RuntimeError(
+                f"Server not ready after {args.ready_timeout} s ({status}): "
+                f"{body[:200]!r}"
+            )
+        await asyncio.sleep(0.1)
+
+
+async def run(args):
+    if args.trace_in:
+        with open(args.trace_in) as f:
+            trace = [tuple(json.loads(line)) for line in f]
+    else:
+        names, ratings = load_names_and_ratings()
+        trace = generate_trace(names, ratings, args)
+
+    if args.trace_out:
+        with open(args.trace_out, "w") as f:
+            for entry in trace:
+                f.write(json.dumps(entry) + "\n")
+
+    if args.mode == "inprocess":
+        from main_api import app
+
+        client = AsgiClient(app)
+    else:
+        client = HttpClient(args.url, args.workers)
+
+    await client.startup()
+    try:
+        if not args.no_initialize:
+            await wait_until_ready(client, args)
+        return await replay(client, trace, args)
+    finally:
+        await client.shutdown()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument(
+        "--url", default="http://127.0.0.1:8000", help="Base URL in http mode"
+    )
+    parser.add_argument("--workers", type=int, default=64, help="HTTP client threads")
+    parser.add_argument("--qps", type=float, default=100.0, help="Target request rate")
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Trace length in seconds"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--zipf-s", type=float, default=1.0, help="Zipf exponent of name popularity"
+    )
+    parser.add_argument(
+        "--keystroke-ms",
+        type=float,
+        default=180.0,
+        help="Mean delay between keystrokes",
+    )
+    parser.add_argument(
+        "--debounce-ms", type=float, default=300.0, help="Client debounce delay"
+    )
+    parser.add_argument(
+        "--typo-rate",
+        type=float,
+        default=0.03,
+        help="Probability of a typo per keystroke",
+    )
+    parser.add_argument(
+        "--stop-rate",
+        type=float,
+        default=0.15,
+        help="Probability of stopping after a keystroke",
+    )
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument(
+        "--expand",
+        type=int,
+        default=FRONTEND_EXPAND,
+        help="Expand budget of the requests, as sent by the frontend",
+    )
+    parser.add_argument(
+        "--no-initialize",
+        action="store_true",
+        help="Replay right away, without waiting for or building the index",
+    )
+    parser.add_argument(
+        "--ready-timeout",
+        type=float,
+        default=120.0,
+        help="Seconds to wait for the server to load its index",
+    )
+    parser.add_argument("--trace-in", help="Replay a trace saved with --trace-out")
+    parser.add_argument("--trace-out", help="Save the generated trace as JSON lines")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    return 0 if report["requests"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
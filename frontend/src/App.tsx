@@ -1,11 +1,32 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import SearchBar from './components/SearchBar';
 import DataManagement from './components/DataManagement';
+import { checkReadiness } from './api';
 
 const App: React.FC = () => {
   const [activeTab, setActiveTab] = useState<'search' | 'manage'>('search');
   const [trieInitialized, setTrieInitialized] = useState<boolean>(false);
 
+  // The backend loads the index at startup: poll readiness until it is loaded
+  useEffect(() => {
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout> | null = null;
+    const poll = async () => {
+      const ready = await checkReadiness();
+      if (cancelled) return;
+      if (ready) {
+        setTrieInitialized(true);
+      } else {
+        timer = setTimeout(poll, 2000);
+      }
+    };
+    poll();
+    return () => {
+      cancelled = true;
+      if (timer) clearTimeout(timer);
+    };
+  }, []);
+
   return (
     <div className="app">
       <h1>Autocomplete search box</h1>
@@ -0,0 +1,7 @@
+import { normalizeText } from "./api";
+import vectors from "./normalizationVectors.json";
+
+// The same vectors are checked against the backend in tests/test_text_utils.py
+test.each(vectors)("normalizes %j like the backend", (text, expected) => {
+  expect(normalizeText(text)).toBe(expected);
+});
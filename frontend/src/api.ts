@@ -13,6 +13,7 @@ export const initializeTrie = async (): Promise<ApiResponse> => {
     const response = await axios.post<ApiResponse>(
       `${API_BASE_URL}/initialize`
     );
+    clearLocalSuggestions();
     return response.data;
   } catch (error) {
     console.error("Error initializing trie:", error);
@@ -20,17 +21,90 @@ export const initializeTrie = async (): Promise<ApiResponse> => {
   }
 };
 
+// Check whether the index is loaded and queries can be served
+export const checkReadiness = async (): Promise<boolean> => {
+  try {
+    await axios.get(`${API_BASE_URL}/health/ready`);
+    return true;
+  } catch (error) {
+    return false;
+  }
+};
+
+// Result sets smaller than this are returned in full, so that the client can
+// refine them locally for longer prefixes. The server pre-computes responses
+// for this budget: keep in sync with FRONTEND_EXPAND in
+// src/services/autocomplete_service.py
+const EXPANDED_RESULT_BUDGET = 50;
+
+// Last complete result set returned by the server
+let completeResults: { prefix: string; response: AutocompleteResponse } | null =
+  null;
+
+// Same normalization as the backend's normalize_text; both are checked
+// against the test vectors in normalizationVectors.json
+export const normalizeText = (text: string): string =>
+  text.toLowerCase().replace(/[`´′’]/g, "'");
+
+// Derive the results of a longer prefix from a complete result set
+const refineLocally = (
+  prefix: string,
+  complete: AutocompleteResponse,
+  limit: number
+): AutocompleteResponse => {
+  const normalized = normalizeText(prefix);
+  const matches = complete.suggestions.filter((suggestion) =>
+    [suggestion.name, ...(suggestion.aliases ?? [])].some((key) =>
+      key.startsWith(normalized)
+    )
+  );
+  const suggestions = matches.slice(0, limit);
+  const maxRating = suggestions.length > 0 ? suggestions[0].rating_count : 1;
+  return {
+    query: prefix,
+    suggestions: suggestions.map((suggestion) => ({
+      ...suggestion,
+      score:
+        maxRating > 0
+          ? Math.round((suggestion.rating_count / maxRating) * 100) / 100
+          : 0,
+    })),
+    total_count: matches.length,
+    complete: matches.length <= suggestions.length,
+    status: "success",
+  };
+};
+
+// Forget the local result set, e.g. after the data changed
+export const clearLocalSuggestions = () => {
+  completeResults = null;
+};
+
 // Get autocomplete suggestions
 export const getAutocompleteSuggestions = async (
   prefix: string,
   limit: number = 10
 ): Promise<AutocompleteResponse> => {
+  // Every match of a longer prefix is in the complete set of a shorter one
+  if (
+    completeResults &&
+    normalizeText(prefix).startsWith(completeResults.prefix)
+  ) {
+    return refineLocally(prefix, completeResults.response, limit);
+  }
+
   try {
     const response = await axios.get<AutocompleteResponse>(
       `${API_BASE_URL}/autocomplete?prefix=${encodeURIComponent(
         prefix
-      )}&limit=${limit}`
+      )}&limit=${limit}&expand=${EXPANDED_RESULT_BUDGET}`
     );
+    if (response.data.complete) {
+      completeResults = {
+        prefix: normalizeText(prefix),
+        response: response.data,
+      };
+    }
     return response.data;
   } catch (error) {
     console.error("Error fetching autocomplete suggestions:", error);
@@ -38,6 +112,7 @@ export const getAutocompleteSuggestions = async (
       query: prefix,
       suggestions: [],
       total_count: 0,
+      complete: false,
       status: "error",
     };
   }
@@ -69,6 +144,7 @@ export const addRestaurant = async (
       `${API_BASE_URL}/restaurants`,
       { name, rating }
     );
+    clearLocalSuggestions();
     return response.data;
   } catch (error) {
     console.error("Error adding restaurant:", error);
@@ -1,6 +1,7 @@
 // Types for API responses and data structures
 
 export interface Restaurant {
+  id?: number;
   display_name: string;
   user_rating_count: number;
 }
@@ -12,15 +13,18 @@ export interface RestaurantListResponse {
 }
 
 export interface AutocompleteSuggestion {
+  id?: number;
   name: string;
   rating_count: number;
   score: number;
+  aliases?: string[];
 }
 
 export interface AutocompleteResponse {
   query: string;
   suggestions: AutocompleteSuggestion[];
   total_count: number;
+  complete: boolean;
   status: string;
 }
 
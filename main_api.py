@@ -1,14 +1,37 @@
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
 import os
+import tracemalloc
 
 from src.api.routes import router
+from src.services.warm_start import start_warm_start_thread
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Trace allocations from the start so /api/stats?deep=true can attribute
+    # the memory of the index; this slows allocations down noticeably
+    if os.environ.get("AUTOCOMPLETE_TRACEMALLOC", "0") == "1":
+        tracemalloc.start()
+
+    # Load the index and pre-warm the hottest prefixes in the background, so
+    # liveness is answered right away and readiness once the index is loaded
+    if os.environ.get("AUTOCOMPLETE_WARM_START", "1") != "0":
+        start_warm_start_thread(
+            num_names=int(os.environ.get("AUTOCOMPLETE_WARM_NAMES", "100")),
+            max_prefix_length=int(
+                os.environ.get("AUTOCOMPLETE_WARM_PREFIX_LENGTH", "3")
+            ),
+        )
+    yield
+
 
 # Create FastAPI app
-app = FastAPI(title="Restaurant Autocomplete API")
+app = FastAPI(title="Restaurant Autocomplete API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
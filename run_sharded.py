@@ -0,0 +1,116 @@
+"""
+Start a sharded autocomplete deployment on the local machine
+
+Launches one backend process per shard on consecutive ports and the router
+in front of them, then waits until interrupted:
+
+    python run_sharded.py --shards 4 --port 8000
+
+The router listens on --port and the shards on the following ports. Each
+shard works on its own copy of the store under data/shards/, seeded from
+data/restaurants_names.store the first time, and only indexes the rows it
+owns. Shard 0 also builds the suffix array answering substring queries.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from src.data.columnar_store import ColumnarStore
+from src.services.sharding import DEFAULT_SHARD_PREFIX_LENGTH
+from src.services.trie_service import TrieService, shard_store_path
+
+
+def prepare_shard_stores(shard_count):
+    """Copy the main store to the shards that do not have a store yet
+
+    Args:
+        shard_count (int): Number of shards
+    """
+    # Opening the main store imports it from the CSV export if needed
+    source = TrieService(shard_index=0, shard_count=1).store.path
+    for shard in range(shard_count):
+        path = shard_store_path(shard)
+        if not ColumnarStore.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+            shutil.copytree(source, path)
+
+
+def start_server(app, port, env):
+    """Start a uvicorn process serving an app
+
+    Returns:
+        subprocess.Popen: The server process
+    """
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            app,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+        ],
+        env={**os.environ, **env},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--shards", type=int, default=2, help="Number of shards")
+    parser.add_argument("--port", type=int, default=8000, help="Router port")
+    parser.add_argument(
+        "--prefix-length",
+        type=int,
+        default=DEFAULT_SHARD_PREFIX_LENGTH,
+        help="Number of leading characters hashed to pick a shard",
+    )
+    args = parser.parse_args()
+
+    prepare_shard_stores(args.shards)
+
+    common = {
+        "AUTOCOMPLETE_SHARD_COUNT": str(args.shards),
+        "AUTOCOMPLETE_SHARD_PREFIX_LENGTH": str(args.prefix_length),
+    }
+    shard_ports = [args.port + 1 + shard for shard in range(args.shards)]
+    processes = [
+        start_server(
+            "main_api:app",
+            port,
+            {**common, "AUTOCOMPLETE_SHARD_INDEX": str(shard)},
+        )
+        for shard, port in enumerate(shard_ports)
+    ]
+    processes.append(
+        start_server(
+            "shard_router:app",
+            args.port,
+            {
+                **common,
+                "AUTOCOMPLETE_SHARD_URLS": ",".join(
+                    f"http://127.0.0.1:{port}" for port in shard_ports
+                ),
+            },
+        )
+    )
+
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""
+Router front-end of a sharded autocomplete deployment
+
+Each shard is a regular backend (main_api:app) started with
+AUTOCOMPLETE_SHARD_INDEX and AUTOCOMPLETE_SHARD_COUNT, which only indexes the
+keys whose first characters hash to it. The router exposes the same /api
+endpoints as a single backend:
+
+- autocomplete queries are forwarded to the shard owning the prefix, or sent
+  to every shard and merged by rating when the prefix is too short to pick one
+- streamed (NDJSON) queries are relayed line by line from the same shards,
+  one after the other
+- substring queries are forwarded to the shard hosting the suffix array of
+  all the names (SUBSTRING_SHARD), the only one that builds it
+- initialization is broadcast to every shard
+- added restaurants are sent to every shard with the entry ID they must get,
+  so that all shard stores assign the same IDs. A shard that missed adds
+  (because it failed or was unreachable) is rolled forward from the store of
+  another shard before the next add, and readiness fails while the shard
+  stores differ
+- other reads are answered by the first shard
+
+The shard URLs are listed, in shard order, in AUTOCOMPLETE_SHARD_URLS
+(comma-separated). Use run_sharded.py to start a local deployment.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import APIRouter, Body, FastAPI, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+
+from src.models.attribute_filter import BOROUGHS
+from src.services.sharding import (
+    DEFAULT_SHARD_PREFIX_LENGTH,
+    SUBSTRING_SHARD,
+    merge_autocomplete_responses,
+    shard_for_prefix,
+)
+from src.utils.http_utils import STREAM_BATCH_SIZE, etag_matches
+from src.utils.text_utils import normalize_text
+
+SHARD_URLS = [
+    url.strip().rstrip("/")
+    for url in os.environ.get("AUTOCOMPLETE_SHARD_URLS", "").split(",")
+    if url.strip()
+]
+SHARD_PREFIX_LENGTH = int(
+    os.environ.get("AUTOCOMPLETE_SHARD_PREFIX_LENGTH", DEFAULT_SHARD_PREFIX_LENGTH)
+)
+SHARD_TIMEOUT_S = float(os.environ.get("AUTOCOMPLETE_SHARD_TIMEOUT", "10"))
+
+# Headers of shard autocomplete responses passed on to the client
+FORWARDED_HEADERS = ("ETag", "Cache-Control")
+
+executor = ThreadPoolExecutor(max_workers=max(4 * len(SHARD_URLS), 4))
+
+# Writes are sent to the shards one at a time so their stores stay in step
+write_lock = threading.Lock()
+
+# Attempts of a write to a shard before it is reported as failed; writes carry
+# their expected entry ID, so retrying one that was applied is harmless
+WRITE_ATTEMPTS = 3
+
+# Entries copied per request when a shard is rolled forward
+ROLL_FORWARD_BATCH = 100
+
+router = APIRouter()
+
+
+def shard_request(shard, method, path, query="", payload=None, headers=None):
+    """Send a request to a shard
+
+    Args:
+        shard (int): Index of the shard
+        method (str): HTTP method
+        path (str): Path under /api
+        query (str, optional): Raw query string
+        payload (dict, optional): JSON body
+        headers (dict, optional): Extra request headers
+
+    Returns:
+        tuple: (status code, case-insensitive response headers, body bytes).
+            The status is 502 if the shard cannot be reached.
+    """
+    url = f"{SHARD_URLS[shard]}/api{path}" + (f"?{query}" if query else "")
+    data = None
+    headers = dict(headers or {})
+    if payload is not None:
+        data = json.dumps(payload).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(url, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=SHARD_TIMEOUT_S) as resp:
+            return resp.status, resp.headers, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+    except (urllib.error.URLError, OSError) as e:
+        detail = json.dumps({"detail": f"Shard {shard} unreachable: {e}"})
+        return 502, {}, detail.encode("utf-8")
+
+
+def all_shards(method, path, query="", payload=None):
+    """Send the same request to every shard in parallel
+
+    Returns:
+        list: (status code, response headers, body bytes) of each shard
+    """
+    futures = [
+        executor.submit(shard_request, shard, method, path, query, payload)
+        for shard in range(len(SHARD_URLS))
+    ]
+    return [future.result() for future in futures]
+
+
+def json_response(status, body, headers=None):
+    """Relay a shard response body as is"""
+    return Response(
+        content=body,
+        status_code=status,
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def stream_shards(shards, query, limit):
+    """Relay the NDJSON streams of shards one after the other
+
+    Every shard stream is opened before the response starts, so a failing
+    shard is reported with its status code rather than a truncated body.
+
+    Args:
+        shards (list): Indexes of the shards to query
+        query (str): Raw query string
+        limit (int): Maximum number of lines relayed, 0 for all
+
+    Returns:
+        Response: Streaming response, or the error of the first failing shard
+    """
+    responses = []
+    error = None
+    for shard in shards:
+        url = f"{SHARD_URLS[shard]}/api/autocomplete?{query}"
+        try:
+            responses.append(urllib.request.urlopen(url, timeout=SHARD_TIMEOUT_S))
+        except urllib.error.HTTPError as e:
+            error = json_response(e.code, e.read())
+        except (urllib.error.URLError, OSError) as e:
+            detail = json.dumps({"detail": f"Shard {shard} unreachable: {e}"})
+            error = json_response(502, detail.encode("utf-8"))
+        if error is not None:
+            for response in responses:
+                response.close()
+            return error
+
+    def lines():
+        count = 0
+        try:
+            for response in responses:
+                batch = []
+                for line in response:
+                    batch.append(line)
+                    count += 1
+                    if len(batch) >= STREAM_BATCH_SIZE or count == limit:
+                        yield b"".join(batch)
+                        batch = []
+                    if count == limit:
+                        return
+                if batch:
+                    yield b"".join(batch)
+        finally:
+            for response in responses:
+                response.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def first_error(results):
+    """Return the first non-200 shard result, or None if all succeeded"""
+    for result in results:
+        if result[0] != 200:
+            return result
+    return None
+
+
+def shard_entry_counts():
+    """Return the number of entries in the store of every shard
+
+    Returns:
+        tuple: (entry count of each shard, None), or (None, first error
+            result) if a shard is not ready
+    """
+    results = all_shards("GET", "/health/ready")
+    error = first_error(results)
+    if error is not None:
+        return None, error
+    return [json.loads(body)["entries"] for _, _, body in results], None
+
+
+def add_to_shard(shard, payload):
+    """Add a restaurant to a shard, retrying failed attempts
+
+    Args:
+        shard (int): Index of the shard
+        payload (dict): Body of the add, with its expected_id
+
+    Returns:
+        tuple: (status code, response headers, body bytes) of the last attempt
+    """
+    for _ in range(WRITE_ATTEMPTS):
+        result = shard_request(shard, "POST", "/restaurants", payload=payload)
+        if result[0] < 500:
+            break
+    return result
+
+
+def restaurant_payload(record):
+    """Return the add payload recreating a restaurant listed by a shard
+
+    Args:
+        record (dict): Restaurant from the /restaurants listing of a shard
+
+    Returns:
+        dict: Body of an add giving it the same entry ID
+    """
+    return {
+        "name": record["display_name"],
+        "rating": record["user_rating_count"],
+        "average_rating": record["average_rating"],
+        "is_open": bool(record["is_open"]),
+        "borough": BOROUGHS[record["borough"]] if record["borough"] else None,
+        "expected_id": record["id"],
+    }
+
+
+def roll_forward(counts):
+    """Copy to every shard the entries it misses from the most complete one
+
+    Args:
+        counts (list): Entry count of each shard
+
+    Returns:
+        tuple | None: First error result, or None if every shard now has the
+            same entries
+    """
+    target = max(counts)
+    source = counts.index(target)
+    for shard, count in enumerate(counts):
+        while count < target:
+            status, headers, body = shard_request(
+                source,
+                "GET",
+                "/restaurants",
+                f"offset={count}&limit={min(ROLL_FORWARD_BATCH, target - count)}",
+            )
+            if status != 200:
+                return status, headers, body
+            for record in json.loads(body)["restaurants"]:
+                result = add_to_shard(shard, restaurant_payload(record))
+                if result[0] != 200:
+                    return result
+                count += 1
+    return None
+
+
+@router.get("/autocomplete")
+def api_autocomplete(request: Request):
+    """Route an autocomplete query to its shard, or scatter-gather it
+
+    Accepts the same parameters as the autocomplete endpoint of a backend.
+
+    Returns:
+        Response: The shard's response, or the merged top results of every
+            shard
+    """
+    params = request.query_params
+    prefix = params.get("prefix")
+    if prefix is None:
+        raise HTTPException(status_code=422, detail="Missing prefix parameter")
+    query = request.url.query
+    if_none_match = request.headers.get("If-None-Match")
+
+    normalized_prefix = normalize_text(prefix)
+    if params.get("mode") == "substring":
+        shard = SUBSTRING_SHARD
+    else:
+        shard = shard_for_prefix(
+            normalized_prefix, len(SHARD_URLS), SHARD_PREFIX_LENGTH
+        )
+    if params.get("stream", "").lower() in ("1", "true", "yes", "on"):
+        try:
+            limit = int(params.get("limit", 10))
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        shards = [shard] if shard is not None else range(len(SHARD_URLS))
+        return stream_shards(shards, query, limit)
+
+    if shard is not None:
+        status, headers, body = shard_request(
+            shard,
+            "GET",
+            "/autocomplete",
+            query,
+            headers={"If-None-Match": if_none_match} if if_none_match else None,
+        )
+        forwarded = {
+            name: headers[name] for name in FORWARDED_HEADERS if name in headers
+        }
+        if status == 304:
+            return Response(status_code=304, headers=forwarded)
+        return json_response(status, body, forwarded)
+
+    results = all_shards("GET", "/autocomplete", query)
+    error = first_error(results)
+    if error is not None:
+        return json_response(error[0], error[2])
+
+    try:
+        limit = int(params.get("limit", 10))
+        expand = int(params.get("expand", 0))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # The merged response changes whenever one of the shard responses does
+    shard_etags = [headers.get("ETag", "") for _, headers, _ in results]
+    digest = hashlib.sha1("|".join(shard_etags).encode("utf-8")).hexdigest()[:16]
+    cache_headers = {"ETag": f'W/"merged-{digest}"'}
+    if "Cache-Control" in results[0][1]:
+        cache_headers["Cache-Control"] = results[0][1]["Cache-Control"]
+    if not all(shard_etags):
+        # Debug responses are not cacheable
+        cache_headers = {"Cache-Control": "no-store"}
+    elif if_none_match and etag_matches(if_none_match, cache_headers["ETag"]):
+        return Response(status_code=304, headers=cache_headers)
+
+    response = merge_autocomplete_responses(
+        prefix, [json.loads(body) for _, _, body in results], limit, expand
+    )
+    return Response(
+        content=json.dumps(response),
+        media_type="application/json",
+        headers=cache_headers,
+    )
+
+
+@router.post("/initialize")
+def initialize_trie() -> Dict[str, Any]:
+    """Rebuild the index of every shard
+
+    Returns:
+        Dict[str, Any]: Status of the initialization of each shard
+    """
+    results = all_shards("POST", "/initialize")
+    error = first_error(results)
+    if error is not None:
+        return json_response(error[0], error[2])
+    return {
+        "status": "success",
+        "message": f"Trie built successfully on {len(results)} shards",
+        "shards": [json.loads(body) for _, _, body in results],
+    }
+
+
+@router.post("/restaurants")
+def add_restaurant(payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+    """Add a restaurant to every shard
+
+    Every shard appends it to its own store under the same expected entry ID,
+    and indexes it under the keys it owns. Shards that missed earlier adds
+    are rolled forward first. If a shard still fails, the shards that
+    succeeded keep the restaurant and the failing one is rolled forward by
+    the next add.
+
+    Returns:
+        Dict[str, Any]: Response of the first shard
+    """
+    with write_lock:
+        counts, error = shard_entry_counts()
+        if error is None and len(set(counts)) > 1:
+            error = roll_forward(counts)
+        if error is not None:
+            return json_response(error[0], error[2])
+
+        payload = {**payload, "expected_id": max(counts)}
+        results = [add_to_shard(shard, payload) for shard in range(len(SHARD_URLS))]
+    error = first_error(results)
+    if error is not None:
+        return json_response(error[0], error[2])
+    return json.loads(results[0][2])
+
+
+@router.get("/restaurants")
+def list_restaurants(request: Request):
+    """List restaurants from the store of the first shard
+
+    Returns:
+        Response: Response of the first shard
+    """
+    status, _, body = shard_request(0, "GET", "/restaurants", request.url.query)
+    return json_response(status, body)
+
+
+@router.get("/health/live")
+def liveness() -> Dict[str, Any]:
+    """Liveness probe of the router itself
+
+    Returns:
+        Dict[str, Any]: Always {"status": "alive"}
+    """
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+def readiness() -> Dict[str, Any]:
+    """Readiness probe: every shard is ready and the shard stores agree
+
+    Returns:
+        Dict[str, Any]: Readiness status and entry count of each shard
+
+    Raises:
+        HTTPException: 503 while a shard is not ready, or while the shards
+            hold different numbers of entries (until the next add rolls the
+            lagging ones forward)
+    """
+    results = all_shards("GET", "/health/ready")
+    shards = [
+        {"shard": shard, "status_code": status}
+        for shard, (status, _, _) in enumerate(results)
+    ]
+    if first_error(results) is not None:
+        raise HTTPException(
+            status_code=503, detail={"status": "not_ready", "shards": shards}
+        )
+    for shard, (_, _, body) in zip(shards, results):
+        shard["entries"] = json.loads(body)["entries"]
+    if len({shard["entries"] for shard in shards}) > 1:
+        raise HTTPException(
+            status_code=503, detail={"status": "out_of_sync", "shards": shards}
+        )
+    return {"status": "ready", "shards": shards}
+
+
+@router.get("/stats")
+def index_stats(request: Request) -> Dict[str, Any]:
+    """Collect the index statistics of every shard
+
+    Returns:
+        Dict[str, Any]: Statistics of each shard, in shard order
+    """
+    results = all_shards("GET", "/stats", request.url.query)
+    error = first_error(results)
+    if error is not None:
+        return json_response(error[0], error[2])
+    return {"shards": [json.loads(body) for _, _, body in results]}
+
+
+app = FastAPI(title="Restaurant Autocomplete Router")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # Allow all origins for development
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(router, prefix="/api")
+
+
+if __name__ == "__main__":
+    uvicorn.run("shard_router:app", host="0.0.0.0", port=8000)
@@ -2,23 +2,51 @@
 FastAPI routes for autocomplete API
 """
 
-from fastapi import APIRouter, Query, HTTPException, Body
+from fastapi import APIRouter, Query, HTTPException, Body, Header, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import Optional, Dict, Any, List
-import pandas as pd
 import os
 
+from src.models.attribute_filter import AttributeFilter, BOROUGHS, borough_code
 from src.services.autocomplete_service import (
+    SEARCH_MODES,
+    autocomplete_cache_key,
+    autocomplete_etag,
     get_autocomplete_results,
     format_autocomplete_response,
+    stream_autocomplete_results,
 )
-from src.services.trie_service import TrieService
+from src.services.index_stats import collect_index_stats
+from src.services.request_coalescer import OverloadedError, RequestCoalescer
+from src.services.request_profiler import RequestProfiler, StageTimer
+from src.services.trie_service import EntryIdConflict, TrieService
+from src.services.warm_start import get_warm_start_state
+from src.utils.http_utils import etag_matches
 from src.utils.text_utils import normalize_text
 
 # Create router
 router = APIRouter()
 
-# Constants
-DATA_PATH = "data/restaurants_names.csv"
+# Concurrent autocomplete requests for the same normalized prefix and limit
+# share one computation; new computations over the bound are shed with a 503
+# before they are dispatched to the worker thread pool (40 threads), so the
+# default bound stays below its size
+coalescer = RequestCoalescer(
+    max_pending=int(os.environ.get("AUTOCOMPLETE_MAX_PENDING", "32"))
+)
+
+# Browsers and shared caches may reuse autocomplete responses for this long,
+# then revalidate them with If-None-Match against the index-fingerprint ETag
+CACHE_CONTROL = (
+    f"public, max-age={int(os.environ.get('AUTOCOMPLETE_CACHE_MAX_AGE', '60'))}"
+)
+
+# A fraction of autocomplete computations is captured with cProfile
+profiler = RequestProfiler(
+    sample_rate=float(os.environ.get("AUTOCOMPLETE_PROFILE_SAMPLE_RATE", "0")),
+    output_dir=os.environ.get("AUTOCOMPLETE_PROFILE_DIR", "profiles"),
+)
 
 
 @router.post("/initialize")
@@ -40,6 +68,69 @@ def initialize_trie() -> Dict[str, Any]:
     return result
 
 
+@router.get("/health/live")
+def liveness() -> Dict[str, Any]:
+    """Liveness probe: the process is up and serving requests
+
+    Returns:
+        Dict[str, Any]: Always {"status": "alive"}
+    """
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+def readiness() -> Dict[str, Any]:
+    """Readiness probe: the index is loaded and queries can be served
+
+    Returns:
+        Dict[str, Any]: Readiness status, the state of the startup load and
+            the number of entries in the store
+
+    Raises:
+        HTTPException: 503 while the index is not loaded
+    """
+    startup = get_warm_start_state()
+    ready = (
+        TrieService.get_instance().is_initialized()
+        and startup["status"] != "loading"
+    )
+    if not ready:
+        raise HTTPException(
+            status_code=503, detail={"status": "not_ready", "startup": startup}
+        )
+    return {
+        "status": "ready",
+        "startup": startup,
+        "entries": len(TrieService.get_instance().store),
+    }
+
+
+@router.get("/stats")
+def index_stats(
+    deep: bool = Query(
+        False, description="Include the tracemalloc breakdown of allocations"
+    ),
+) -> Dict[str, Any]:
+    """Report the size and shape of the index for capacity planning
+
+    Structural statistics are computed once per index fingerprint, so the
+    endpoint is cheap enough to be scraped by a monitoring system.
+
+    Args:
+        deep: Include traced allocations per source file (requires the
+            AUTOCOMPLETE_TRACEMALLOC=1 environment variable at startup)
+
+    Returns:
+        Dict with index, trie and memory statistics
+    """
+    try:
+        return collect_index_stats(TrieService.get_instance(), deep)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error collecting stats: {str(e)}"
+        )
+
+
 @router.get("/restaurants")
 def list_restaurants(
     limit: int = Query(100, description="Maximum number of restaurants to return"),
@@ -55,21 +146,16 @@ def list_restaurants(
         Dict with restaurants list and total count
     """
     try:
-        # Check if file exists
-        if not os.path.exists(DATA_PATH):
-            return {"restaurants": [], "total": 0}
-
-        # Read the CSV file
-        df = pd.read_csv(DATA_PATH)
+        store = TrieService.get_instance().store
 
         # Get total count
-        total = len(df)
-
-        # Apply pagination
-        df = df.iloc[offset : offset + limit]
+        total = len(store)
 
-        # Convert to list of dictionaries
-        restaurants = df.to_dict(orient="records")
+        # Apply pagination and convert to list of dictionaries
+        restaurants = [
+            {"id": offset + i, **row}
+            for i, row in enumerate(store.rows(offset, offset + limit))
+        ]
 
         return {"restaurants": restaurants, "total": total}
     except Exception as e:
@@ -82,12 +168,24 @@ def list_restaurants(
 def add_restaurant(
     name: str = Body(..., embed=True, description="Restaurant name to add"),
     rating: int = Body(0, embed=True, description="User rating count"),
+    average_rating: float = Body(0.0, embed=True, description="Average rating (1-5)"),
+    is_open: bool = Body(False, embed=True, description="Whether the place is open"),
+    borough: Optional[str] = Body(None, embed=True, description="Borough name"),
+    expected_id: Optional[int] = Body(
+        None, embed=True, description="Entry ID the restaurant must get"
+    ),
 ) -> Dict[str, Any]:
     """Add a new restaurant name to the dataset
 
     Args:
         name: Restaurant name to add
         rating: User rating count
+        average_rating: Average rating, 0 if unknown
+        is_open: Whether the place is open
+        borough: Borough name, unknown if not given
+        expected_id: Entry ID the restaurant must get (used by the shard
+            router to keep the shard stores in step). Answered with 409 if
+            the next entry ID differs, unless this restaurant already has it.
 
     Returns:
         Status of the operation
@@ -96,35 +194,25 @@ def add_restaurant(
         # Normalize the name
         normalized_name = normalize_text(name)
 
-        # Create DataFrame for the new restaurant
-        new_restaurant = pd.DataFrame(
-            {"display_name": [normalized_name], "user_rating_count": [rating]}
+        # Append the new restaurant to the store and index it
+        entry_id = TrieService.get_instance().add_restaurant(
+            {
+                "display_name": normalized_name,
+                "user_rating_count": rating,
+                "average_rating": average_rating,
+                "is_open": int(is_open),
+                "borough": borough_code(borough),
+            },
+            expected_id,
         )
 
-        # Check if file exists
-        if os.path.exists(DATA_PATH):
-            # Read existing data
-            df = pd.read_csv(DATA_PATH)
-
-            # Check if restaurant already exists
-            if normalized_name in df["display_name"].values:
-                return {"status": "error", "message": "Restaurant already exists"}
-
-            # Append new restaurant
-            df = pd.concat([df, new_restaurant], ignore_index=True)
-        else:
-            # Create new file with the restaurant
-            df = new_restaurant
-
-        # Save to CSV
-        df.to_csv(DATA_PATH, index=False)
-
-        # If trie is initialized, add the new restaurant to it
-        trie_service = TrieService.get_instance()
-        if trie_service.is_initialized():
-            trie_service.trie.insert(normalized_name)
-
-        return {"status": "success", "message": f"Added restaurant: {name}"}
+        return {
+            "status": "success",
+            "message": f"Added restaurant: {name}",
+            "id": entry_id,
+        }
+    except EntryIdConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error adding restaurant: {str(e)}"
@@ -132,15 +220,52 @@ def add_restaurant(
 
 
 @router.get("/autocomplete")
-def api_autocomplete(
+async def api_autocomplete(
     prefix: str = Query(..., description="Prefix to search for"),
     limit: Optional[int] = Query(10, description="Maximum number of results to return"),
+    open_only: bool = Query(False, description="Only return places that are open"),
+    borough: Optional[List[str]] = Query(
+        None, description=f"Only return places in these boroughs {list(BOROUGHS[1:])}"
+    ),
+    min_rating: Optional[float] = Query(None, description="Minimum average rating"),
+    expand: int = Query(
+        0, description="Return every match if there are at most this many"
+    ),
+    mode: str = Query(
+        "prefix", description=f"Where the query matches the names {list(SEARCH_MODES)}"
+    ),
+    stream: bool = Query(
+        False, description="Stream the matches as NDJSON, in index order"
+    ),
+    debug: bool = Query(False, description="Include per-stage timings"),
+    x_debug_timing: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    http_response: Response = None,
 ):
     """API endpoint function for autocomplete that returns JSON-serializable results
 
+    Cached and materialized responses are answered on the event loop; other
+    queries are admitted by the coalescer, then searched in the worker
+    thread pool.
+
     Args:
         prefix (str): The prefix to search for
         limit (int, optional): Maximum number of results to return. Defaults to 10.
+        open_only (bool, optional): Only return places that are open
+        borough (list, optional): Only return places in one of these boroughs
+        min_rating (float, optional): Minimum average rating
+        expand (int, optional): If the prefix has at most this many matches
+            (capped at 200), return all of them so the response is complete
+        mode (str, optional): "prefix" (default) matches the start of the
+            names, "substring" matches anywhere in them
+        stream (bool, optional): Return an application/x-ndjson stream with
+            one {"id", "name", "rating_count"} suggestion per line, straight
+            from a lazy traversal of the index: unranked, but in constant
+            memory. Use limit=0 to get every match.
+        debug (bool, optional): Include a "timings" breakdown in milliseconds.
+            Can also be enabled with the X-Debug-Timing: 1 header.
+        if_none_match (str, optional): ETags of cached copies; answered with
+            304 Not Modified without searching if one is still current
 
     Returns:
         dict: JSON-serializable dictionary with autocomplete results
@@ -155,6 +280,7 @@ def api_autocomplete(
                 ...
             ],
             "total_count": 15,  # Total number of matches before limit
+            "complete": False,  # True if suggestions hold every match
             "status": "success"
         }
     """
@@ -166,10 +292,88 @@ def api_autocomplete(
             detail="Trie not initialized. Please call the /initialize endpoint first.",
         )
 
-    # Get the ordered DataFrame of results
-    results_df = get_autocomplete_results(prefix, limit)
+    try:
+        attribute_filter = AttributeFilter(open_only, borough, min_rating)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown mode {mode!r}, expected one of {list(SEARCH_MODES)}",
+        )
+    if mode == "substring" and not trie_service.supports_substring():
+        raise HTTPException(
+            status_code=400,
+            detail="Substring search is disabled (AUTOCOMPLETE_SUBSTRING_INDEX=0)",
+        )
+
+    if stream:
+        key = autocomplete_cache_key(prefix, limit, attribute_filter, 0, mode)
+        cache_headers = {
+            "ETag": autocomplete_etag(key + ("ndjson",)),
+            "Cache-Control": CACHE_CONTROL,
+        }
+        if if_none_match and etag_matches(if_none_match, cache_headers["ETag"]):
+            return Response(status_code=304, headers=cache_headers)
+        return StreamingResponse(
+            stream_autocomplete_results(prefix, limit, attribute_filter, mode),
+            media_type="application/x-ndjson",
+            headers=cache_headers,
+        )
 
-    # Format the response
-    response = format_autocomplete_response(prefix, results_df, limit)
+    # Debug requests are timed individually, outside of coalescing and caching
+    if debug or x_debug_timing in ("1", "true"):
+        http_response.headers["Cache-Control"] = "no-store"
+        timer = StageTimer()
+        results = await run_in_threadpool(
+            get_autocomplete_results,
+            prefix,
+            limit,
+            timer,
+            attribute_filter,
+            expand,
+            mode,
+        )
+        with timer.stage("format"):
+            response = format_autocomplete_response(prefix, results, limit)
+        response["timings"] = timer.as_dict()
+        return response
+
+    def compute_response():
+        # Get the ordered result records
+        results = get_autocomplete_results(
+            prefix, limit, attribute_filter=attribute_filter, expand=expand, mode=mode
+        )
 
-    return response
+        # Format the response
+        return format_autocomplete_response(prefix, results, limit)
+
+    key = autocomplete_cache_key(prefix, limit, attribute_filter, expand, mode)
+    cache_headers = {"ETag": autocomplete_etag(key), "Cache-Control": CACHE_CONTROL}
+    if if_none_match and etag_matches(if_none_match, cache_headers["ETag"]):
+        return Response(status_code=304, headers=cache_headers)
+
+    # Short prefixes may have their serialized response built with the index
+    if mode == "prefix" and attribute_filter.is_empty():
+        body = trie_service.materialized_response(prefix, limit, expand)
+        if body is not None:
+            return Response(
+                content=body, media_type="application/json", headers=cache_headers
+            )
+    http_response.headers.update(cache_headers)
+
+    response = trie_service.result_cache.get(key)
+    if response is None:
+        try:
+            response = await coalescer.run(
+                key,
+                lambda: run_in_threadpool(profiler.run, compute_response, label=prefix),
+            )
+        except OverloadedError as e:
+            raise HTTPException(
+                status_code=503, detail=str(e), headers={"Retry-After": "1"}
+            )
+        trie_service.result_cache.put(key, response)
+
+    # Coalesced requests may differ in their raw (unnormalized) prefix
+    return {**response, "query": prefix}
@@ -0,0 +1,360 @@
+"""
+Binary columnar storage for the processed restaurant dataset
+
+A store is a directory holding one file per column plus a small JSON schema:
+
+    schema.json                  column names and their type codes
+    <column>.col                 fixed-width numeric column (native byte order)
+    <column>.offsets             uint64 end offsets of a string column
+    <column>.data                concatenated UTF-8 bytes of a string column
+
+Numeric columns use the type codes of the `array` module ("q" for int64,
+"d" for float64, "B" for uint8, ...). String columns use the code "s".
+Columns are read through `mmap`, so opening a store costs nothing beyond the
+file handles and values are decoded only when they are accessed.
+
+Rows are appended column by column, each value written at the position of
+its row. The number of rows is the length of the shortest column, so a row
+is only visible once its last column is written. If an append is
+interrupted, the bytes it left past the last complete row are cut off when
+the store is opened, and otherwise overwritten by the next append, so they
+never shift the rows that follow.
+"""
+
+import json
+import mmap
+import os
+import shutil
+from array import array
+
+SCHEMA_FILE = "schema.json"
+STRING_TYPE = "s"
+
+# Suffixes of the directories a new store is written to, and the previous
+# store is moved to while it is replaced
+TMP_SUFFIX = ".tmp"
+OLD_SUFFIX = ".old"
+
+# Schema of the processed restaurant dataset
+RESTAURANT_SCHEMA = {
+    "display_name": STRING_TYPE,
+    "user_rating_count": "q",
+    "average_rating": "d",
+    "is_open": "B",
+    "borough": "B",
+}
+
+# Values of the filterable attribute columns when they are not known
+ATTRIBUTE_DEFAULTS = {"average_rating": 0.0, "is_open": 0, "borough": 0}
+
+
+def _map_file(path):
+    """Memory-map a file read-only
+
+    Args:
+        path (str): Path of the file to map
+
+    Returns:
+        mmap.mmap | bytes: The mapped file, or empty bytes for an empty file
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _write_at(path, offset, data):
+    """Write bytes at an offset of a file and cut the file off after them
+
+    Args:
+        path (str): Path of the file
+        offset (int): Position of the first byte written
+        data (bytes): Bytes to write
+    """
+    end = offset + len(data)
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+        if f.seek(0, os.SEEK_END) > end:
+            f.truncate(end)
+
+
+def _truncate(path, size):
+    """Cut a file off at a size if it is longer"""
+    if os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
+
+
+def _recover(path):
+    """Restore the previous store if replacing it was interrupted
+
+    Args:
+        path (str): Directory of the store
+    """
+    old_path = path + OLD_SUFFIX
+    if not os.path.exists(path) and os.path.exists(old_path):
+        os.replace(old_path, path)
+
+
+class ColumnarStore:
+    """Append-only columnar table backed by memory-mapped column files"""
+
+    def __init__(self, path):
+        """Open an existing store
+
+        Bytes left by an interrupted append are discarded, so a store must
+        have a single writer.
+
+        Args:
+            path (str): Directory of the store
+        """
+        _recover(path)
+        self.path = path
+        with open(os.path.join(path, SCHEMA_FILE)) as f:
+            self.schema = json.load(f)
+        self._maps = {}
+        self._length = None
+        self._discard_uncommitted()
+
+    @classmethod
+    def create(cls, path, columns, schema=RESTAURANT_SCHEMA):
+        """Write a new store, replacing any existing one at the same path
+
+        The store is written to a temporary directory first. The existing
+        store is then renamed aside and the new one moved into place, so
+        neither is ever half-written. If the process stops between the two
+        renames, the existing store is restored when it is next opened.
+
+        Args:
+            path (str): Directory of the store
+            columns (dict): Mapping of column name to a sequence of values
+            schema (dict, optional): Mapping of column name to type code
+
+        Returns:
+            ColumnarStore: The newly written store
+        """
+        lengths = {len(columns[name]) for name in schema}
+        if len(lengths) > 1:
+            raise ValueError("All columns must have the same length")
+
+        _recover(path)
+        tmp_path = path + TMP_SUFFIX
+        old_path = path + OLD_SUFFIX
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        with open(os.path.join(tmp_path, SCHEMA_FILE), "w") as f:
+            json.dump(schema, f)
+
+        for name, type_code in schema.items():
+            values = columns[name]
+            if type_code == STRING_TYPE:
+                offsets = array("Q")
+                end = 0
+                with open(os.path.join(tmp_path, f"{name}.data"), "wb") as f:
+                    for value in values:
+                        encoded = value.encode("utf-8")
+                        f.write(encoded)
+                        end += len(encoded)
+                        offsets.append(end)
+                with open(os.path.join(tmp_path, f"{name}.offsets"), "wb") as f:
+                    offsets.tofile(f)
+            else:
+                with open(os.path.join(tmp_path, f"{name}.col"), "wb") as f:
+                    array(type_code, values).tofile(f)
+
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return cls(path)
+
+    @staticmethod
+    def exists(path):
+        """Check whether a store exists at the given path
+
+        Args:
+            path (str): Directory of the store
+
+        Returns:
+            bool: True if the directory holds a store schema
+        """
+        _recover(path)
+        return os.path.exists(os.path.join(path, SCHEMA_FILE))
+
+    def _map(self, filename):
+        """Return the (cached) memory map of one of the store files"""
+        if filename not in self._maps:
+            self._maps[filename] = _map_file(os.path.join(self.path, filename))
+        return self._maps[filename]
+
+    def _discard_uncommitted(self):
+        """Cut every column file off after the last complete row"""
+        rows = len(self)
+        sizes = {}
+        for name, type_code in self.schema.items():
+            if type_code == STRING_TYPE:
+                sizes[f"{name}.offsets"] = rows * 8
+                sizes[f"{name}.data"] = self._offsets(name)[rows - 1] if rows else 0
+            else:
+                sizes[f"{name}.col"] = rows * array(type_code).itemsize
+        # Files are not truncated while this store maps them
+        self._refresh()
+        for filename, size in sizes.items():
+            _truncate(os.path.join(self.path, filename), size)
+
+    def _refresh(self):
+        """Drop cached maps so the next read sees newly appended rows
+
+        Maps are not closed explicitly because callers may still hold
+        memoryviews over them; they are released once unreferenced.
+        """
+        self._maps = {}
+        self._length = None
+
+    def column(self, name):
+        """Return a zero-copy view of a numeric column
+
+        Args:
+            name (str): Column name
+
+        Returns:
+            memoryview: Typed view over the mapped column, one item per row
+        """
+        type_code = self.schema[name]
+        if type_code == STRING_TYPE:
+            raise TypeError(f"Column {name} is a string column, use strings()")
+        view = memoryview(self._map(f"{name}.col"))
+        if not view.nbytes:
+            return memoryview(array(type_code))
+        return view.cast(type_code)[: len(self)]
+
+    def _offsets(self, name):
+        view = memoryview(self._map(f"{name}.offsets"))
+        if not view.nbytes:
+            return memoryview(array("Q"))
+        return view.cast("Q")
+
+    def string(self, name, row):
+        """Decode a single value of a string column
+
+        Args:
+            name (str): Column name
+            row (int): Row index
+
+        Returns:
+            str: The decoded value
+        """
+        offsets = self._offsets(name)
+        start = offsets[row - 1] if row > 0 else 0
+        return self._map(f"{name}.data")[start : offsets[row]].decode("utf-8")
+
+    def strings(self, name, start=0, stop=None):
+        """Decode a contiguous range of a string column
+
+        Args:
+            name (str): Column name
+            start (int, optional): First row. Defaults to 0.
+            stop (int, optional): Row after the last one. Defaults to the end.
+
+        Returns:
+            list: Decoded values
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return []
+        offsets = self._offsets(name)
+        data = self._map(f"{name}.data")
+        begin = offsets[start - 1] if start > 0 else 0
+        values = []
+        for row in range(start, stop):
+            end = offsets[row]
+            values.append(data[begin:end].decode("utf-8"))
+            begin = end
+        return values
+
+    def row(self, row):
+        """Return a single row as a dictionary
+
+        Args:
+            row (int): Row index
+
+        Returns:
+            dict: Mapping of column name to value
+        """
+        record = {}
+        for name, type_code in self.schema.items():
+            if type_code == STRING_TYPE:
+                record[name] = self.string(name, row)
+            else:
+                record[name] = self.column(name)[row]
+        return record
+
+    def rows(self, start=0, stop=None):
+        """Return a contiguous range of rows as dictionaries
+
+        Args:
+            start (int, optional): First row. Defaults to 0.
+            stop (int, optional): Row after the last one. Defaults to the end.
+
+        Returns:
+            list: List of row dictionaries
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        columns = {}
+        for name, type_code in self.schema.items():
+            if type_code == STRING_TYPE:
+                columns[name] = self.strings(name, start, stop)
+            else:
+                columns[name] = self.column(name)[start:stop].tolist()
+        return [
+            {name: columns[name][i] for name in self.schema}
+            for i in range(max(stop - start, 0))
+        ]
+
+    def append(self, record):
+        """Append one row to the store
+
+        Args:
+            record (dict): Mapping of column name to value
+
+        Returns:
+            int: Index of the appended row
+        """
+        row = len(self)
+        for name, type_code in self.schema.items():
+            value = record[name]
+            if type_code == STRING_TYPE:
+                encoded = value.encode("utf-8")
+                offsets = self._offsets(name)
+                start = offsets[row - 1] if row > 0 else 0
+                _write_at(os.path.join(self.path, f"{name}.data"), start, encoded)
+                _write_at(
+                    os.path.join(self.path, f"{name}.offsets"),
+                    row * 8,
+                    array("Q", [start + len(encoded)]).tobytes(),
+                )
+            else:
+                values = array(type_code, [value])
+                _write_at(
+                    os.path.join(self.path, f"{name}.col"),
+                    row * values.itemsize,
+                    values.tobytes(),
+                )
+        self._refresh()
+        return row
+
+    def __len__(self):
+        if self._length is None:
+            lengths = []
+            for name, type_code in self.schema.items():
+                if type_code == STRING_TYPE:
+                    size = os.path.getsize(os.path.join(self.path, f"{name}.offsets"))
+                    lengths.append(size // 8)
+                else:
+                    size = os.path.getsize(os.path.join(self.path, f"{name}.col"))
+                    lengths.append(size // array(type_code).itemsize)
+            self._length = min(lengths) if lengths else 0
+        return self._length
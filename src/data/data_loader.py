@@ -1,43 +1,160 @@
 """
 Data loading and processing functions for restaurant data
+
+The serving path only reads the columnar store. pandas is imported lazily by
+the CSV import and export functions, so API workers never load it.
 """
 
-import pandas as pd
+import heapq
+
+from src.data.columnar_store import (
+    ATTRIBUTE_DEFAULTS,
+    ColumnarStore,
+    RESTAURANT_SCHEMA,
+)
+
 
+def read_restaurants_txt(store):
+    """Read the restaurant names from the columnar store
 
-def read_restaurants_txt(txt_file):
-    """Read txt file and create a list of names
-    
     Args:
-        txt_file (str): Path to the CSV file with restaurant data
-        
+        store (ColumnarStore): Store with the processed restaurant data
+
     Returns:
         list: List of restaurant names
     """
-    return pd.read_csv(txt_file)["display_name"].to_list()
+    return store.strings("display_name")
+
 
+def read_restaurant_attributes(store):
+    """Read the filterable attribute columns from the columnar store
 
-def join_results_with_user_rating_count(all_words_starting_w_prefix, data_path):
-    """Extract subset of the restaurant names df with user rating count
+    Stores written before the attributes were introduced get default values.
 
     Args:
-        all_words_starting_w_prefix (list): List of restaurant names matching the prefix
-        data_path (str): Path to the CSV file with restaurant data
+        store (ColumnarStore): Store with the processed restaurant data
 
     Returns:
-        DataFrame: Ordered results matching the prefix, sorted by user_rating_count
+        dict: Mapping of attribute name to a sequence of values indexed by
+            entry ID (a zero-copy view of the column when it exists)
     """
-    all_restaurants = pd.read_csv(data_path)
+    return {
+        name: store.column(name) if name in store.schema else [default] * len(store)
+        for name, default in ATTRIBUTE_DEFAULTS.items()
+    }
+
 
-    # Filter restaurants that match our prefix results
-    # Use .isin() method for filtering a list of values
-    subset_with_prefix = all_restaurants[
-        all_restaurants["display_name"].isin(all_words_starting_w_prefix)
+def filter_entry_ids(entry_ids, store, attribute_filter=None):
+    """Keep the entry IDs whose attributes match the filter
+
+    Attributes are read by ID from the memory-mapped columns, so the cost only
+    depends on the number of candidate IDs.
+
+    Args:
+        entry_ids (list): IDs of the candidate entries
+        store (ColumnarStore): Store with the processed restaurant data
+        attribute_filter (AttributeFilter, optional): Only keep matching entries
+
+    Returns:
+        list: Matching entry IDs, in their original order
+    """
+    if attribute_filter is None or attribute_filter.is_empty():
+        return entry_ids
+
+    attributes = read_restaurant_attributes(store)
+    is_open = attributes["is_open"]
+    borough = attributes["borough"]
+    average_rating = attributes["average_rating"]
+    return [
+        entry_id
+        for entry_id in entry_ids
+        if attribute_filter.matches(
+            is_open[entry_id], borough[entry_id], average_rating[entry_id]
+        )
     ]
 
-    # Sort by user_rating_count in descending order
-    ordered_results = subset_with_prefix.sort_values(
-        by="user_rating_count", ascending=False
+
+def rank_entry_ids(entry_ids, store, limit=0):
+    """Order entry IDs by user rating count
+
+    Args:
+        entry_ids (list): IDs of the entries to rank
+        store (ColumnarStore): Store with the processed restaurant data
+        limit (int, optional): Maximum number of IDs to return, 0 for all
+
+    Returns:
+        list: Entry IDs sorted by user_rating_count in descending order, ties
+            broken by ID
+    """
+    ratings = store.column("user_rating_count")
+    if limit and limit > 0:
+        return heapq.nsmallest(
+            limit, entry_ids, key=lambda entry_id: (-ratings[entry_id], entry_id)
+        )
+    return sorted(entry_ids, key=lambda entry_id: (-ratings[entry_id], entry_id))
+
+
+def lookup_records_by_id(entry_ids, store):
+    """Build the result records of the given entries
+
+    Args:
+        entry_ids (list): IDs of the entries, in result order
+        store (ColumnarStore): Store with the processed restaurant data
+
+    Returns:
+        list: {"id", "display_name", "user_rating_count"} dict of each entry,
+            in the given order
+    """
+    ratings = store.column("user_rating_count")
+    return [
+        {
+            "id": entry_id,
+            "display_name": store.string("display_name", entry_id),
+            "user_rating_count": ratings[entry_id],
+        }
+        for entry_id in entry_ids
+    ]
+
+
+def import_csv_to_store(csv_path, store_path):
+    """Convert a processed restaurants CSV into a columnar store
+
+    Args:
+        csv_path (str): Path to the CSV file with display_name and user_rating_count
+        store_path (str): Directory of the store to write
+
+    Returns:
+        ColumnarStore: The written store
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path)
+    for name, default in ATTRIBUTE_DEFAULTS.items():
+        if name not in df.columns:
+            df[name] = default
+        df[name] = df[name].fillna(default)
+
+    return ColumnarStore.create(
+        store_path,
+        {
+            "display_name": df["display_name"].astype(str).to_list(),
+            "user_rating_count": df["user_rating_count"].astype(int).to_list(),
+            "average_rating": df["average_rating"].astype(float).to_list(),
+            "is_open": df["is_open"].astype(int).to_list(),
+            "borough": df["borough"].astype(int).to_list(),
+        },
+        RESTAURANT_SCHEMA,
     )
 
-    return ordered_results
\ No newline at end of file
+
+def export_store_to_csv(store_path, csv_path):
+    """Export a columnar store as a CSV file
+
+    Args:
+        store_path (str): Directory of the store to read
+        csv_path (str): Path of the CSV file to write
+    """
+    import pandas as pd
+
+    store = ColumnarStore(store_path)
+    pd.DataFrame(store.rows()).to_csv(csv_path, index=False)
@@ -3,6 +3,12 @@ Data processing and preparation for the autocomplete service
 """
 
 import pandas as pd
+from src.data.columnar_store import (
+    ATTRIBUTE_DEFAULTS,
+    ColumnarStore,
+    RESTAURANT_SCHEMA,
+)
+from src.models.attribute_filter import borough_code
 from src.utils.text_utils import normalize_text
 
 
@@ -27,23 +33,66 @@ def prepare_names_and_user_ratings(data_path):
     # Convert user_rating_count to integer
     places_df["user_rating_count"] = places_df["user_rating_count"].astype(int)
 
+    return prepare_attributes(places_df)
+
+
+def prepare_attributes(places_df):
+    """Derive the filterable attribute columns from the raw place columns
+
+    Columns missing from the raw data get their default (unknown) value.
+    
+    Args:
+        places_df (DataFrame): DataFrame with the raw place columns
+        
+    Returns:
+        DataFrame: DataFrame with average_rating, is_open and borough columns
+    """
+    if "rating" in places_df.columns:
+        places_df["average_rating"] = places_df["rating"]
+
+    if "business_status" in places_df.columns:
+        places_df["is_open"] = (places_df["business_status"] == "OPERATIONAL").astype(
+            int
+        )
+
+    # Prefer an explicit borough column, fall back to parsing the address
+    for column in ["borough", "formatted_address", "address"]:
+        if column in places_df.columns:
+            places_df["borough"] = places_df[column].apply(borough_code)
+            break
+
+    for name, default in ATTRIBUTE_DEFAULTS.items():
+        if name not in places_df.columns:
+            places_df[name] = default
+        places_df[name] = places_df[name].fillna(default)
+
     return places_df
 
 
-def save_processed_data(input_path, output_path):
-    """Process the input data and save to output path
+def save_processed_data(input_path, output_path, csv_export_path=None):
+    """Process the input data and save it as a columnar store
     
     Args:
         input_path (str): Path to the input CSV file
-        output_path (str): Path to save the processed CSV file
+        output_path (str): Directory of the columnar store to write
+        csv_export_path (str, optional): Also export the processed data as CSV
     """
     processed_df = prepare_names_and_user_ratings(input_path)
-    processed_df.to_csv(output_path, index=False)
+    ColumnarStore.create(
+        output_path,
+        {name: processed_df[name].to_list() for name in RESTAURANT_SCHEMA},
+        RESTAURANT_SCHEMA,
+    )
     print(f"Processed data saved to {output_path}")
 
+    if csv_export_path is not None:
+        processed_df[list(RESTAURANT_SCHEMA)].to_csv(csv_export_path, index=False)
+        print(f"Processed data exported to {csv_export_path}")
+
 
 if __name__ == "__main__":
     # Example usage
     google_places_path = "data/detailed_google_maps_places_data.csv"
-    output_path = "data/restaurants_names.csv"
-    save_processed_data(google_places_path, output_path)
+    output_path = "data/restaurants_names.store"
+    csv_export_path = "data/restaurants_names.csv"
+    save_processed_data(google_places_path, output_path, csv_export_path)
@@ -0,0 +1,183 @@
+"""
+Restaurant attributes used to filter autocomplete results, and their compact
+per-node summaries
+
+Each entry is summarized as a bitset plus its average rating:
+
+    bit 0                   the place is open (business status is operational)
+    bit BOROUGHS.index(b)   the place is in borough b (codes start at 1)
+
+Boroughs are read from the locality of Google formatted addresses
+("350 5th Ave, New York, NY 10118, USA"), falling back to the ZIP code for
+localities that are neighborhoods ("Flushing, NY 11354" is in Queens).
+
+Ratings are Google average ratings between 1 and 5, 0 when unknown. A trie
+node holds the union of the bitsets and the maximum rating of all the
+entries below it, so a subtree can be skipped as soon as its summary cannot
+satisfy the filter.
+"""
+
+import re
+
+# Borough names, indexed by their code; code 0 means unknown
+BOROUGHS = ("unknown", "manhattan", "brooklyn", "queens", "bronx", "staten island")
+
+# Localities naming a borough, besides the borough names themselves
+BOROUGH_LOCALITIES = {"new york": "manhattan", "the bronx": "bronx"}
+
+# Boroughs of the first three digits of New York City ZIP codes
+BOROUGH_ZIP_PREFIXES = {
+    "100": "manhattan",
+    "101": "manhattan",
+    "102": "manhattan",
+    "103": "staten island",
+    "104": "bronx",
+    "111": "queens",
+    "112": "brooklyn",
+    "113": "queens",
+    "114": "queens",
+    "116": "queens",
+}
+
+# State component of an address, with an optional ZIP code
+STATE_PATTERN = re.compile(r"^ny(?:\s+(\d{5})(?:-\d{4})?)?$")
+
+OPEN_BIT = 1
+
+# Maximum rating of a node summary before any entry is added
+NO_RATING = -1.0
+
+
+def borough_code(text):
+    """Return the code of the borough of a borough name or an address
+
+    The locality of an address is the component before its ", NY" state
+    component, or its last component if it has none, so street names such as
+    "Brooklyn Ave" are never mistaken for the borough. Localities that are
+    not boroughs are resolved with the ZIP code of the state component.
+
+    Args:
+        text (str): Borough name or full address
+
+    Returns:
+        int: Index in BOROUGHS, 0 if no borough is recognized
+    """
+    if not isinstance(text, str):
+        return 0
+    components = [component.strip() for component in text.lower().split(",")]
+    if components[-1] in ("usa", "united states"):
+        components.pop()
+
+    locality, zip_code = components[-1], None
+    for i in range(1, len(components)):
+        state = STATE_PATTERN.match(components[i])
+        if state:
+            locality, zip_code = components[i - 1], state.group(1)
+            break
+
+    borough = BOROUGH_LOCALITIES.get(locality, locality)
+    if borough in BOROUGHS[1:]:
+        return BOROUGHS.index(borough)
+    if zip_code is not None and zip_code[:3] in BOROUGH_ZIP_PREFIXES:
+        return BOROUGHS.index(BOROUGH_ZIP_PREFIXES[zip_code[:3]])
+    return 0
+
+
+def entry_summary(is_open, borough, average_rating):
+    """Build the summary of a single entry
+
+    Args:
+        is_open (int): 1 if the place is open, 0 otherwise
+        borough (int): Borough code
+        average_rating (float): Average rating, 0 if unknown
+
+    Returns:
+        tuple: (bitset, rating)
+    """
+    mask = OPEN_BIT if is_open else 0
+    if borough:
+        mask |= 1 << borough
+    return mask, average_rating
+
+
+class AttributeFilter:
+    """Filter on restaurant attributes, checked against entries and node summaries"""
+
+    def __init__(self, open_only=False, boroughs=None, min_rating=None):
+        """Initialize the filter
+
+        Args:
+            open_only (bool, optional): Only keep open places. Defaults to False.
+            boroughs (list, optional): Borough names to keep. Defaults to all.
+            min_rating (float, optional): Minimum average rating. Defaults to None.
+
+        Raises:
+            ValueError: If a borough name is not recognized
+        """
+        self.open_only = open_only
+        self.boroughs = set()
+        for name in boroughs or []:
+            code = BOROUGHS.index(name.lower()) if name.lower() in BOROUGHS else 0
+            if code == 0:
+                raise ValueError(
+                    f"Unknown borough {name!r}, expected one of {list(BOROUGHS[1:])}"
+                )
+            self.boroughs.add(code)
+        self.min_rating = min_rating
+
+        self.borough_mask = 0
+        for code in self.boroughs:
+            self.borough_mask |= 1 << code
+
+    def is_empty(self):
+        """Check whether the filter keeps every entry
+
+        Returns:
+            bool: True if no condition is set
+        """
+        return not self.open_only and not self.boroughs and self.min_rating is None
+
+    def key(self):
+        """Return a hashable identity of the filter
+
+        Returns:
+            tuple: Identity usable in cache and coalescing keys
+        """
+        return (self.open_only, self.borough_mask, self.min_rating)
+
+    def matches_summary(self, mask, max_rating):
+        """Check whether a subtree with the given summary may hold a match
+
+        Args:
+            mask (int): Union of the entry bitsets of the subtree
+            max_rating (float): Maximum entry rating of the subtree
+
+        Returns:
+            bool: False if no entry of the subtree can match the filter
+        """
+        if self.open_only and not mask & OPEN_BIT:
+            return False
+        if self.borough_mask and not mask & self.borough_mask:
+            return False
+        if self.min_rating is not None and max_rating < self.min_rating:
+            return False
+        return True
+
+    def matches(self, is_open, borough, average_rating):
+        """Check whether a single entry matches the filter
+
+        Args:
+            is_open (int): 1 if the place is open, 0 otherwise
+            borough (int): Borough code
+            average_rating (float): Average rating, 0 if unknown
+
+        Returns:
+            bool: True if the entry matches
+        """
+        if self.open_only and not is_open:
+            return False
+        if self.boroughs and borough not in self.boroughs:
+            return False
+        if self.min_rating is not None and average_rating < self.min_rating:
+            return False
+        return True
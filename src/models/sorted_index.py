@@ -0,0 +1,450 @@
+"""
+Sorted-array prefix index
+
+All keys starting with a prefix form a contiguous range of the sorted keys,
+found with two binary searches. The entry IDs and attribute summaries of the
+keys are kept in NumPy arrays aligned with the sorted keys, so a prefix
+match is a slice rather than a tree traversal.
+
+Top-K queries by rating use a sparse table over the rank of each position
+(its place in the global (-rating, ID) order): the best position of any
+range is found in O(1), and the K best entries of a prefix range by
+repeatedly splitting the range around its best position.
+
+Inserts are buffered, so building the index is a single sort. Once the
+index is built, the few keys inserted since (new restaurants) are scanned
+linearly next to the arrays until there are more than MAX_PENDING of them,
+then merged in one linear pass, so a query never pays for a full re-sort.
+"""
+
+import bisect
+import heapq
+import sys
+import threading
+
+import numpy as np
+
+from src.models.attribute_filter import NO_RATING, OPEN_BIT
+
+# Appended to a prefix to get an upper bound of all the keys starting with it
+_MAX_CHAR = chr(sys.maxunicode)
+
+# Ranges up to this size are deduplicated with a set rather than np.unique
+SMALL_RANGE = 2048
+
+# Keys inserted into a built index are scanned linearly until there are this
+# many, then merged into the arrays
+MAX_PENDING = 256
+
+
+class _SortedState:
+    """Immutable snapshot of the sorted keys and their aligned arrays"""
+
+    def __init__(self, keys, ids, masks, ratings):
+        self.keys = keys  # Sorted keys, one per (key, entry ID) pair
+        self.ids = ids  # Entry ID of each key
+        self.masks = masks  # Attribute bitset of each entry
+        self.ratings = ratings  # Average rating of each entry
+        # Rank structures, built from the rating counts by freeze() or the
+        # first top-K query
+        self.order = None  # Position of each rank
+        self.sparse = None  # sparse[j][i]: best rank in positions [i, i + 2**j)
+        # Memoryviews of the same buffers: indexing them yields Python ints,
+        # much faster than NumPy scalars in the top-K loop
+        self._ids_view = memoryview(ids)
+        self._order_view = None
+        self._sparse_views = None
+
+    def rows(self):
+        """Return the (key, entry ID, mask, rating) rows of the state"""
+        return list(
+            zip(
+                self.keys,
+                self.ids.tolist(),
+                self.masks.tolist(),
+                self.ratings.tolist(),
+            )
+        )
+
+    def prefix_range(self, prefix):
+        """Return the [start, stop) range of the keys starting with prefix"""
+        start = bisect.bisect_left(self.keys, prefix)
+        stop = bisect.bisect_left(self.keys, prefix + _MAX_CHAR, start)
+        return start, stop
+
+    def build_ranks(self, rating_counts):
+        """Build the sparse table of ranks by (-rating count, entry ID)
+
+        Args:
+            rating_counts (sequence): user_rating_count indexed by entry ID
+        """
+        counts = np.asarray(rating_counts, dtype=np.int64)[self.ids]
+        order = np.lexsort((self.ids, -counts))
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+
+        sparse = [rank]
+        width = 1
+        while 2 * width <= len(rank):
+            previous = sparse[-1]
+            sparse.append(np.minimum(previous[:-width], previous[width:]))
+            width *= 2
+        self.order = order
+        self._order_view = memoryview(order)
+        self._sparse_views = [memoryview(table) for table in sparse]
+        self.sparse = sparse
+
+    def best_rank(self, start, stop):
+        """Return the best (smallest) rank in positions [start, stop)"""
+        level = (stop - start).bit_length() - 1
+        table = self._sparse_views[level]
+        return min(table[start], table[stop - (1 << level)])
+
+    def count_distinct(self, start, stop):
+        """Return the number of distinct entry IDs in positions [start, stop)"""
+        if stop - start <= SMALL_RANGE:
+            return len(set(self._ids_view[start:stop]))
+        return len(np.unique(self.ids[start:stop]))
+
+    def ranked_ids(self, start, stop, k):
+        """Return the best distinct entries of positions [start, stop)
+
+        Args:
+            start (int): First position
+            stop (int): Position after the last one
+            k (int): Number of entries to return, 0 for all
+
+        Returns:
+            list: Entry IDs by rank (rating count in descending order, ties
+                broken by ID)
+        """
+        if start == stop:
+            return []
+        if k <= 0:
+            # Sort the whole range by rank, where copies of the same entry
+            # under several keys are adjacent
+            ranks = np.sort(self.sparse[0][start:stop])
+            ids = self.ids[self.order[ranks]]
+            if len(ids) > 1:
+                ids = ids[np.concatenate(([True], ids[1:] != ids[:-1]))]
+            return ids.tolist()
+
+        # Pop ranges by their best rank, splitting each around its best
+        # position, until k distinct entries are found
+        order = self._order_view
+        ids = self._ids_view
+        ranked = []
+        seen = set()
+        heap = [(self.best_rank(start, stop), start, stop)]
+        while heap and len(ranked) < k:
+            rank, lo, hi = heapq.heappop(heap)
+            position = order[rank]
+            entry_id = ids[position]
+            if entry_id not in seen:
+                seen.add(entry_id)
+                ranked.append(entry_id)
+            if lo < position:
+                heapq.heappush(heap, (self.best_rank(lo, position), lo, position))
+            if position + 1 < hi:
+                heapq.heappush(
+                    heap, (self.best_rank(position + 1, hi), position + 1, hi)
+                )
+        return ranked
+
+
+class SortedArrayIndex:
+    """Prefix index with the same interface as Trie, backed by sorted arrays"""
+
+    def __init__(self):
+        # Current state and the (key, entry ID, mask, rating) rows inserted
+        # since it was built, swapped together so readers see a consistent pair
+        self._current = (
+            _SortedState(
+                [],
+                np.empty(0, dtype=np.uint32),
+                np.empty(0, dtype=np.uint32),
+                np.empty(0, dtype=np.float64),
+            ),
+            [],
+        )
+        self._lock = threading.Lock()
+
+    def insert(self, key, entry_id, summary=None):
+        """Add a key pointing to an entry ID
+
+        Args:
+            key (str): Normalized key
+            entry_id (int): ID of the entry
+            summary (tuple, optional): Summary of the filterable attributes
+        """
+        mask, rating = summary if summary is not None else (0, NO_RATING)
+        with self._lock:
+            self._current[1].append((key, entry_id, mask, rating))
+
+    def _snapshot(self, merge=False):
+        """Return the current state and a copy of the rows inserted since
+
+        The rows are merged into a new state first if the index was never
+        built, if there are more than MAX_PENDING of them, or if merge is
+        True.
+
+        Returns:
+            tuple: (_SortedState, list of pending rows)
+        """
+        state, pending = self._current
+        if not pending:
+            return state, []
+        if len(state.keys) and len(pending) <= MAX_PENDING and not merge:
+            return state, pending[:]
+        with self._lock:
+            state, pending = self._current
+            if pending:
+                pending = sorted(pending, key=lambda row: (row[0], row[1]))
+                rows = heapq.merge(
+                    state.rows(), pending, key=lambda row: (row[0], row[1])
+                )
+                # Drop repeated (key, entry ID) pairs
+                merged = []
+                for row in rows:
+                    if not merged or row[:2] != merged[-1][:2]:
+                        merged.append(row)
+                state = _SortedState(
+                    [row[0] for row in merged],
+                    np.array([row[1] for row in merged], dtype=np.uint32),
+                    np.array([row[2] for row in merged], dtype=np.uint32),
+                    np.array([row[3] for row in merged], dtype=np.float64),
+                )
+                self._current = (state, [])
+            return state, []
+
+    def _unmerged_rows(self):
+        """Return the current state and the pending rows it does not hold
+
+        Unlike _snapshot, nothing is merged, so read-only measurements keep
+        the rank structures of the current state.
+
+        Returns:
+            tuple: (_SortedState, list of distinct pending rows whose
+                (key, entry ID) pair is not in the state)
+        """
+        state, pending = self._current
+        rows = {}
+        for row in pending[:]:
+            start = bisect.bisect_left(state.keys, row[0])
+            stop = bisect.bisect_right(state.keys, row[0], start)
+            if row[1] not in state.ids[start:stop]:
+                rows.setdefault(row[:2], row)
+        return state, list(rows.values())
+
+    def freeze(self, rating_counts=None):
+        """Merge pending inserts and build the rank structures now
+
+        Otherwise this work is done by the first query that needs it.
+
+        Args:
+            rating_counts (sequence, optional): user_rating_count indexed by
+                entry ID, to build the top-K structures
+        """
+        self._snapshot(merge=True)
+        if rating_counts is not None:
+            self._ranked_snapshot(rating_counts)
+
+    def _ranked_snapshot(self, rating_counts):
+        """Return the current snapshot with the rank structures of its state"""
+        state, pending = self._snapshot()
+        if state.sparse is None:
+            with self._lock:
+                if state.sparse is None:
+                    state.build_ranks(rating_counts)
+        return state, pending
+
+    @staticmethod
+    def _pending_matches(pending, prefix, attribute_filter=None):
+        """Return the pending rows whose key starts with prefix, sorted"""
+        if attribute_filter is not None and attribute_filter.is_empty():
+            attribute_filter = None
+        return sorted(
+            row
+            for row in pending
+            if row[0].startswith(prefix)
+            and (
+                attribute_filter is None
+                or attribute_filter.matches_summary(row[2], row[3])
+            )
+        )
+
+    def search_prefix(self, prefix, attribute_filter=None):
+        """
+        Returns the IDs of all entries indexed under a key starting with the
+        given prefix, without duplicates.
+
+        Args:
+            prefix (str): The prefix to search for
+            attribute_filter (AttributeFilter, optional): Only return entries
+                matching the filter
+
+        Returns:
+            list: List of entry IDs
+        """
+        state, pending = self._snapshot()
+        start, stop = state.prefix_range(prefix)
+        ids = state.ids[start:stop]
+        if attribute_filter is not None and not attribute_filter.is_empty():
+            masks = state.masks[start:stop]
+            keep = np.ones(len(ids), dtype=bool)
+            if attribute_filter.open_only:
+                keep &= (masks & OPEN_BIT) != 0
+            if attribute_filter.borough_mask:
+                keep &= (masks & attribute_filter.borough_mask) != 0
+            if attribute_filter.min_rating is not None:
+                keep &= state.ratings[start:stop] >= attribute_filter.min_rating
+            ids = ids[keep]
+        ids = ids.tolist()
+        if pending:
+            ids += [
+                row[1]
+                for row in self._pending_matches(pending, prefix, attribute_filter)
+            ]
+        return list(dict.fromkeys(ids))
+
+    def iter_prefix(self, prefix, attribute_filter=None):
+        """Lazily yield the keys starting with the given prefix and their entries
+
+        The positions of the prefix range are read one at a time from the
+        snapshot current when iteration starts, followed by the matching keys
+        inserted since the snapshot was built. An entry indexed under several
+        matching keys is yielded once per key.
+
+        Args:
+            prefix (str): The prefix to search for
+            attribute_filter (AttributeFilter, optional): Skip entries whose
+                summary does not match the filter
+
+        Yields:
+            tuple: (key, entry ID)
+        """
+        state, pending = self._snapshot()
+        start, stop = state.prefix_range(prefix)
+        ids = state._ids_view
+        masks = memoryview(state.masks)
+        ratings = memoryview(state.ratings)
+        if attribute_filter is not None and attribute_filter.is_empty():
+            attribute_filter = None
+        for position in range(start, stop):
+            if attribute_filter is None or attribute_filter.matches_summary(
+                masks[position], ratings[position]
+            ):
+                yield state.keys[position], ids[position]
+        for key, entry_id, _, _ in self._pending_matches(
+            pending, prefix, attribute_filter
+        ):
+            yield key, entry_id
+
+    def top_k(self, prefix, k, rating_counts, expand=0):
+        """Return the best entries of a prefix by rating count
+
+        Args:
+            prefix (str): The prefix to search for
+            k (int): Number of entries to return, 0 for all
+            rating_counts (sequence): user_rating_count indexed by entry ID.
+                Rating counts of existing entries must not change.
+            expand (int, optional): Return every entry if there are at most
+                this many. Defaults to 0.
+
+        Returns:
+            tuple: (entry IDs ordered by rating count in descending order, ties
+                broken by ID; number of distinct entries matching the prefix)
+        """
+        state, pending = self._ranked_snapshot(rating_counts)
+        start, stop = state.prefix_range(prefix)
+        total_count = state.count_distinct(start, stop)
+
+        # Entries inserted since the state was built and not already in range
+        added = list(
+            dict.fromkeys(row[1] for row in self._pending_matches(pending, prefix))
+        )
+        if added and start < stop:
+            in_range = np.isin(added, state.ids[start:stop])
+            added = [entry_id for entry_id, old in zip(added, in_range) if not old]
+        total_count += len(added)
+
+        if k <= 0 or total_count <= max(k, expand):
+            k = 0  # Every entry is returned
+        ranked = state.ranked_ids(start, stop, k)
+        if added:
+            # Both lists are in rank order: merge them
+            def rank(entry_id):
+                return -rating_counts[entry_id], entry_id
+
+            ranked = list(heapq.merge(ranked, sorted(added, key=rank), key=rank))
+            if k > 0:
+                ranked = ranked[:k]
+        return ranked, total_count
+
+    def is_prefix(self, prefix):
+        """
+        Check if at least one key starts with the given prefix.
+
+        Args:
+            prefix (str): The prefix to check
+
+        Returns:
+            bool: True if the prefix exists in the index, False otherwise
+        """
+        state, pending = self._snapshot()
+        start, stop = state.prefix_range(prefix)
+        return (
+            prefix == ""
+            or start < stop
+            or any(row[0].startswith(prefix) for row in pending)
+        )
+
+    def count_nodes(self):
+        """
+        Count the slots of the sorted array, one per (key, entry ID) pair,
+        including the pending inserts.
+
+        Returns:
+            int: Number of slots
+        """
+        state, pending = self._unmerged_rows()
+        return len(state.keys) + len(pending)
+
+    def structure_stats(self):
+        """Measure the size of the index, including the pending inserts
+
+        The index is measured as is: pending inserts are not merged, so the
+        rank structures of the next top-K query are kept.
+
+        Returns:
+            dict: Slot, key and posting counts and estimated bytes, in the
+                format of index_stats.trie_structure_stats (without the
+                branching and depth histograms, which do not apply)
+        """
+        state, pending = self._unmerged_rows()
+        estimated_bytes = sys.getsizeof(state.keys) + sum(
+            sys.getsizeof(key) for key in state.keys
+        )
+        arrays = [state.ids, state.masks, state.ratings]
+        if state.sparse is not None:
+            arrays += [state.order] + state.sparse
+        estimated_bytes += sum(array.nbytes for array in arrays)
+        estimated_bytes += sys.getsizeof(pending) + sum(
+            sys.getsizeof(row) + sys.getsizeof(row[0]) for row in pending
+        )
+        distinct_keys = sum(
+            1 for i, key in enumerate(state.keys) if i == 0 or key != state.keys[i - 1]
+        )
+        for key in {row[0] for row in pending}:
+            i = bisect.bisect_left(state.keys, key)
+            if i == len(state.keys) or state.keys[i] != key:
+                distinct_keys += 1
+        slots = len(state.keys) + len(pending)
+        return {
+            "nodes": slots,
+            "keys": distinct_keys,
+            "postings": slots,
+            "branching": None,
+            "depth": None,
+            "estimated_bytes": estimated_bytes,
+        }
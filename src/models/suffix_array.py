@@ -0,0 +1,323 @@
+"""
+Suffix array over the normalized restaurant names, for substring search
+
+The names are concatenated into one text, each followed by a separator, and
+every suffix of the text starting inside a name is sorted. All occurrences of
+a substring are then a contiguous range of the suffix array:
+
+- the start of the range is found by binary search, comparing the query with
+  the first characters of the suffixes
+- the end of the range is found by galloping over the LCP array (length of
+  the longest common prefix of each suffix with the previous one) until it
+  drops below the length of the query, so its cost is proportional to the
+  number of occurrences
+
+The suffix array is built by prefix doubling with NumPy (sorting suffixes by
+their first 2**k characters from the ranks of the previous round) and the
+LCP array with Kasai's algorithm.
+"""
+
+import sys
+import threading
+
+import numpy as np
+
+# Separates the names in the text; it sorts before every other character
+SEPARATOR = "\x00"
+
+# Names added since the last build are scanned linearly; once there are more
+# than this many, the suffix array is rebuilt in a background thread
+MAX_PENDING = 256
+
+# Number of suffix array positions mapped to entries at once when iterating
+STREAM_CHUNK = 1024
+
+
+def build_suffix_array(codes):
+    """Sort the suffixes of a sequence of character codes
+
+    Args:
+        codes (ndarray): Code of each character of the text
+
+    Returns:
+        ndarray: Start positions of the suffixes in sorted order
+    """
+    n = len(codes)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    rank = np.unique(codes, return_inverse=True)[1].astype(np.int64).ravel()
+    k = 1
+    while True:
+        # Sort by the ranks of the two halves of each 2k-long prefix, packed
+        # in one key; past the end of the text the second half ranks first
+        second = np.zeros(n, dtype=np.int64)
+        second[: n - k] = rank[k:] + 1
+        key = rank * (n + 1) + second
+        suffix_array = np.argsort(key, kind="stable")
+        sorted_key = key[suffix_array]
+        changed = np.empty(n, dtype=bool)
+        changed[0] = True
+        changed[1:] = sorted_key[1:] != sorted_key[:-1]
+        rank = np.empty(n, dtype=np.int64)
+        rank[suffix_array] = np.cumsum(changed) - 1
+        if rank[suffix_array[-1]] == n - 1:
+            return suffix_array
+        k *= 2
+
+
+def build_lcp(text, suffix_array):
+    """Compute the LCP array of a suffix array with Kasai's algorithm
+
+    Args:
+        text (str): The text
+        suffix_array (ndarray): Sorted suffix positions of the text
+
+    Returns:
+        ndarray: lcp[i] is the length of the longest common prefix of the
+            suffixes at suffix_array[i - 1] and suffix_array[i] (0 for i = 0)
+    """
+    n = len(text)
+    if n == 0:
+        return np.empty(0, dtype=np.int32)
+    order = suffix_array.tolist()
+    rank = [0] * n
+    for i, position in enumerate(order):
+        rank[position] = i
+    # A character absent from the text ends every comparison at its end
+    padded = text + chr(ord(max(text)) + 1)
+    lcp = [0] * n
+    h = 0
+    for position, position_rank in enumerate(rank):
+        if position_rank == 0:
+            h = 0
+            continue
+        previous = order[position_rank - 1]
+        while padded[position + h] == padded[previous + h]:
+            h += 1
+        lcp[position_rank] = h
+        if h:
+            h -= 1
+    return np.array(lcp, dtype=np.int32)
+
+
+class _SuffixState:
+    """Immutable suffix array of a set of names"""
+
+    def __init__(self, names, entry_ids):
+        self.names = [name.replace(SEPARATOR, "") for name in names]
+        self.text = "".join(name + SEPARATOR for name in self.names)
+        # Start of each name in the text, and the entry it belongs to
+        lengths = np.array([len(name) + 1 for name in self.names], dtype=np.int64)
+        self.starts = np.cumsum(lengths) - lengths
+        self.entry_ids = np.array(entry_ids, dtype=np.int64)
+
+        codes = np.frombuffer(self.text.encode("utf-32-le"), dtype=np.uint32)
+        suffix_array = build_suffix_array(codes)
+        lcp = build_lcp(self.text, suffix_array)
+        # Suffixes starting with a separator sort first and never match a
+        # query, so they are dropped
+        skip = len(names)
+        self.suffix_array = suffix_array[skip:].astype(np.int32)
+        self.lcp = lcp[skip:]
+        if len(self.lcp):
+            self.lcp[0] = 0
+        self._nbytes = None
+
+    def match_range(self, query):
+        """Return the [start, stop) range of the suffixes starting with query"""
+        text = self.text
+        suffix_array = self.suffix_array
+        m = len(query)
+        lo, hi = 0, len(suffix_array)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = suffix_array[mid]
+            if text[position : position + m] < query:
+                lo = mid + 1
+            else:
+                hi = mid
+        start = lo
+        if start == len(suffix_array):
+            return start, start
+        position = suffix_array[start]
+        if text[position : position + m] != query:
+            return start, start
+
+        # Gallop over the LCP array until a suffix shares fewer than m
+        # characters with its predecessor
+        stop = start + 1
+        step = 16
+        while stop < len(suffix_array):
+            window = self.lcp[stop : stop + step]
+            short = np.flatnonzero(window < m)
+            if len(short):
+                return start, stop + int(short[0])
+            stop += len(window)
+            step *= 2
+        return start, stop
+
+    def search(self, query):
+        """Return the IDs of the entries whose name contains query"""
+        if not query:
+            # Also matches the empty names, which have no suffix
+            return np.unique(self.entry_ids).tolist()
+        start, stop = self.match_range(query)
+        if start == stop:
+            return []
+        names = np.searchsorted(self.starts, self.suffix_array[start:stop], "right")
+        return np.unique(self.entry_ids[names - 1]).tolist()
+
+    def iter_search(self, query):
+        """Lazily yield the IDs of the entries whose name contains query
+
+        An entry is yielded at the first occurrence of the query in its name
+        only, so no set of seen entries is needed.
+        """
+        if not query:
+            for entry_id in self.entry_ids:
+                yield int(entry_id)
+            return
+        start, stop = self.match_range(query)
+        # Map the range to names a bounded chunk at a time
+        for chunk_start in range(start, stop, STREAM_CHUNK):
+            positions = self.suffix_array[
+                chunk_start : min(chunk_start + STREAM_CHUNK, stop)
+            ]
+            names = np.searchsorted(self.starts, positions, "right") - 1
+            offsets = positions - self.starts[names]
+            for name, offset in zip(names.tolist(), offsets.tolist()):
+                if self.names[name].find(query) == offset:
+                    yield int(self.entry_ids[name])
+
+    def nbytes(self):
+        """Approximate memory used by the index, in bytes"""
+        if self._nbytes is None:
+            arrays = [self.starts, self.entry_ids, self.suffix_array, self.lcp]
+            strings = [self.text, self.names] + self.names
+            self._nbytes = sum(map(sys.getsizeof, strings)) + sum(
+                array.nbytes for array in arrays
+            )
+        return self._nbytes
+
+
+class SuffixArrayIndex:
+    """Substring index of the restaurant names"""
+
+    def __init__(self, names=(), entry_ids=()):
+        """Build the index
+
+        Args:
+            names (list, optional): Normalized names
+            entry_ids (list, optional): Entry ID of each name
+        """
+        # Suffix array and the (name, entry ID) pairs added since it was
+        # built, swapped together so readers see a consistent pair
+        self._current = (_SuffixState(list(names), list(entry_ids)), ())
+        self._lock = threading.Lock()
+        self._rebuild = None  # Background rebuild thread, if running
+
+    def add(self, name, entry_id):
+        """Add a name to the index
+
+        The name is scanned linearly by queries until a background rebuild
+        includes it in the suffix array, so adding is cheap.
+
+        Args:
+            name (str): Normalized name
+            entry_id (int): ID of the entry
+        """
+        with self._lock:
+            state, pending = self._current
+            self._current = (state, pending + ((name, entry_id),))
+            self._start_rebuild()
+
+    def _start_rebuild(self):
+        """Start a background rebuild if needed; the lock must be held"""
+        if len(self._current[1]) > MAX_PENDING and self._rebuild is None:
+            self._rebuild = threading.Thread(
+                target=self._run_rebuild, name="suffix-array-rebuild", daemon=True
+            )
+            self._rebuild.start()
+
+    def _run_rebuild(self):
+        """Build a suffix array including the pending names and swap it in"""
+        state, pending = self._current
+        try:
+            rebuilt = _SuffixState(
+                state.names + [name for name, _ in pending],
+                state.entry_ids.tolist() + [entry_id for _, entry_id in pending],
+            )
+        except Exception:
+            # Queries keep scanning the pending names
+            with self._lock:
+                self._rebuild = None
+            raise
+        with self._lock:
+            # Names added during the rebuild stay pending
+            self._current = (rebuilt, self._current[1][len(pending) :])
+            self._rebuild = None
+            self._start_rebuild()
+
+    def join(self, timeout=None):
+        """Wait until no background rebuild is running
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait per rebuild
+        """
+        while True:
+            rebuild = self._rebuild
+            if rebuild is None:
+                return
+            rebuild.join(timeout)
+            if rebuild.is_alive():
+                return
+
+    def search(self, query):
+        """Return the entries whose name contains a substring
+
+        Args:
+            query (str): Normalized substring
+
+        Returns:
+            list: IDs of the matching entries
+        """
+        state, pending = self._current
+        entry_ids = state.search(query)
+        if pending:
+            matched = set(entry_ids)
+            entry_ids += [
+                entry_id
+                for name, entry_id in pending
+                if query in name and entry_id not in matched
+            ]
+        return entry_ids
+
+    def iter_search(self, query):
+        """Lazily yield the entries whose name contains a substring
+
+        Unlike search, memory does not grow with the number of matches. The
+        entries are yielded in the order of the suffix array, not by rating.
+
+        Args:
+            query (str): Normalized substring
+
+        Yields:
+            int: ID of a matching entry, once per entry
+        """
+        state, pending = self._current
+        yield from state.iter_search(query)
+        for name, entry_id in pending:
+            if query in name:
+                yield entry_id
+
+    def nbytes(self):
+        """Approximate memory used by the index, in bytes
+
+        Returns:
+            int: Size of the text and of the arrays
+        """
+        return self._current[0].nbytes()
+
+    def __len__(self):
+        state, pending = self._current
+        return len(state.names) + len(pending)
@@ -1,36 +1,77 @@
 """
 Trie data structure for efficient prefix-based search
+
+Keys are normalized names (or their synonym variants). The node at the end of
+a key holds a posting list: a compact array of the integer IDs of the entries
+indexed under that key, so duplicate names such as chain locations share one
+path and one terminal node.
 """
 
+from array import array
+
+from src.models.attribute_filter import NO_RATING
+
+
 class TrieNode:
+    # No per-node __dict__, and sys.getsizeof covers every attribute slot
+    __slots__ = ("children", "isLeaf", "ids", "mask", "max_rating")
+
     def __init__(self):
         self.children = {}  # Use dictionary instead of fixed array
         self.isLeaf = False
+        self.ids = None  # Posting list of the entry IDs indexed under this key
+        # Summary of the attributes of all entries below this node
+        self.mask = 0
+        self.max_rating = NO_RATING
+
+
+def _add_summary(node, summary):
+    """Merge the summary of an entry into a node summary"""
+    if summary is not None:
+        mask, rating = summary
+        node.mask |= mask
+        if rating > node.max_rating:
+            node.max_rating = rating
+
+
+def _add_entry(node, entry_id):
+    """Mark a node as the end of a key and add an entry to its posting list"""
+    node.isLeaf = True
+    if node.ids is None:
+        node.ids = array("I", [entry_id])
+    elif node.ids[-1] != entry_id:
+        node.ids.append(entry_id)
 
 
 class Trie:
     def __init__(self):
         self.root = TrieNode()
 
-    # Method to insert a key into the Trie
-    def insert(self, key):
+    # Method to insert a key into the Trie, pointing to an entry ID
+    def insert(self, key, entry_id, summary=None):
         curr = self.root
+        _add_summary(curr, summary)
         for c in key:
             if c not in curr.children:
                 curr.children[c] = TrieNode()
             curr = curr.children[c]
-        curr.isLeaf = True
+            _add_summary(curr, summary)
+        _add_entry(curr, entry_id)
 
-    # Method to search for words with a given prefix
-    def search_prefix(self, prefix):
+    # Method to search for entries with a given prefix
+    def search_prefix(self, prefix, attribute_filter=None):
         """
-        Returns a list of all words in the Trie that start with the given prefix.
+        Returns the IDs of all entries indexed under a key starting with the
+        given prefix, without duplicates.
 
         Args:
             prefix (str): The prefix to search for
+            attribute_filter (AttributeFilter, optional): Skip subtrees whose
+                summary cannot match the filter. Returned IDs may still include
+                entries that do not match and must be checked individually.
 
         Returns:
-            list: List of complete words starting with the prefix
+            list: List of entry IDs
         """
         # First, navigate to the end of the prefix
         curr = self.root
@@ -39,10 +80,10 @@ class Trie:
                 return []  # Prefix not found
             curr = curr.children[c]
 
-        # Now collect all words starting from this node
-        words = []
-        self._collect_words(curr, prefix, words)
-        return words
+        # Now collect all entry IDs below this node
+        ids = []
+        self._collect_ids(curr, ids, attribute_filter)
+        return list(dict.fromkeys(ids))
 
     def is_prefix(self, prefix):
         """
@@ -62,19 +103,236 @@ class Trie:
             curr = curr.children[c]
         return True
 
-    def _collect_words(self, node, current_word, words):
+    def _locate(self, prefix):
+        """
+        Follow the prefix from the root.
+
+        Args:
+            prefix (str): The prefix to follow
+
+        Returns:
+            tuple: (node at the end of the prefix, key of that node), or None
+                if no key starts with the prefix
         """
-        Helper method to recursively collect all words from a given node.
+        curr = self.root
+        for c in prefix:
+            if c not in curr.children:
+                return None
+            curr = curr.children[c]
+        return curr, prefix
+
+    def _child_key(self, key, char, child):
+        """Return the key of a child node from the key of its parent"""
+        return key + char
+
+    def iter_prefix(self, prefix, attribute_filter=None):
+        """
+        Lazily yield the keys starting with the given prefix and their entries.
+
+        The traversal is iterative, with an explicit stack bounded by the
+        shape of the trie, so memory does not grow with the number of matches.
+        An entry indexed under several matching keys is yielded once per key.
+        Entries inserted while the traversal is suspended may be yielded too.
+
+        Args:
+            prefix (str): The prefix to search for
+            attribute_filter (AttributeFilter, optional): Skip subtrees whose
+                summary cannot match the filter
+
+        Yields:
+            tuple: (key, entry ID)
+        """
+        located = self._locate(prefix)
+        if located is None:
+            return
+
+        stack = [located]
+        while stack:
+            node, key = stack.pop()
+            if attribute_filter is not None and not attribute_filter.matches_summary(
+                node.mask, node.max_rating
+            ):
+                continue
+            if node.isLeaf:
+                for entry_id in node.ids:
+                    yield key, entry_id
+            # Copy the children so inserts between two yields do not break
+            # the iteration (entries they add may still be yielded); pushed
+            # in reverse to visit them in insertion order
+            children = list(node.children.items())
+            for char, child in reversed(children):
+                stack.append((child, self._child_key(key, char, child)))
+
+    def _collect_ids(self, node, ids, attribute_filter=None):
+        """
+        Helper method to recursively collect all entry IDs from a given node.
 
         Args:
             node (TrieNode): Current node in the Trie
-            current_word (str): Word built so far
-            words (list): List to store found words
+            ids (list): List to store found entry IDs
+            attribute_filter (AttributeFilter, optional): Filter used to prune subtrees
         """
-        # If this node marks the end of a word, add it to results
+        # Skip the whole subtree if no entry below can match the filter
+        if attribute_filter is not None and not attribute_filter.matches_summary(
+            node.mask, node.max_rating
+        ):
+            return
+
+        # If this node marks the end of a key, add its posting list to results
         if node.isLeaf:
-            words.append(current_word)
+            ids.extend(node.ids)
 
         # Recursively check all children
-        for char in node.children:
-            self._collect_words(node.children[char], current_word + char, words)
+        for child in node.children.values():
+            self._collect_ids(child, ids, attribute_filter)
+
+    def count_nodes(self):
+        """
+        Count the nodes of the Trie, including the root.
+
+        Returns:
+            int: Number of nodes
+        """
+        count = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children.values())
+        return count
+
+
+class RadixNode:
+    __slots__ = ("label", "children", "isLeaf", "ids", "mask", "max_rating")
+
+    def __init__(self, label=""):
+        self.label = label  # Characters on the edge leading to this node
+        self.children = {}  # First character of the child's label -> child
+        self.isLeaf = False
+        self.ids = None  # Posting list of the entry IDs indexed under this key
+        # Summary of the attributes of all entries below this node
+        self.mask = 0
+        self.max_rating = NO_RATING
+
+
+class RadixTrie(Trie):
+    """
+    Path-compressed Trie: chains of single-child nodes are collapsed into
+    a single node whose incoming edge is labelled with a string.
+    """
+
+    def __init__(self):
+        self.root = RadixNode()
+
+    # Method to insert a key into the Trie, splitting edges where needed
+    def insert(self, key, entry_id, summary=None):
+        curr = self.root
+        _add_summary(curr, summary)
+        i = 0
+        while i < len(key):
+            child = curr.children.get(key[i])
+            if child is None:
+                child = RadixNode(key[i:])
+                curr.children[key[i]] = child
+                curr = child
+                _add_summary(curr, summary)
+                break
+
+            # Length of the common prefix of the edge label and the rest of the key
+            label = child.label
+            j = 1
+            while j < len(label) and i + j < len(key) and label[j] == key[i + j]:
+                j += 1
+
+            if j < len(label):
+                # The key diverges inside the edge: split it at position j
+                middle = RadixNode(label[:j])
+                middle.mask = child.mask
+                middle.max_rating = child.max_rating
+                child.label = label[j:]
+                middle.children[child.label[0]] = child
+                curr.children[key[i]] = middle
+                child = middle
+
+            curr = child
+            _add_summary(curr, summary)
+            i += j
+        _add_entry(curr, entry_id)
+
+    def _locate(self, prefix):
+        """
+        Follow the prefix from the root, possibly ending inside an edge.
+
+        Args:
+            prefix (str): The prefix to follow
+
+        Returns:
+            tuple: (first node whose path covers the prefix, key of that
+                node), or None if no key starts with the prefix
+        """
+        curr = self.root
+        key = ""
+        i = 0
+        while i < len(prefix):
+            child = curr.children.get(prefix[i])
+            if child is None:
+                return None
+            label = child.label
+            n = min(len(label), len(prefix) - i)
+            if label[:n] != prefix[i : i + n]:
+                return None
+            i += len(label)
+            key += label
+            curr = child
+        return curr, key
+
+    def _child_key(self, key, char, child):
+        """Return the key of a child node from the key of its parent"""
+        return key + child.label
+
+    def _descend(self, prefix):
+        """
+        Follow the prefix from the root, possibly ending inside an edge.
+
+        Args:
+            prefix (str): The prefix to follow
+
+        Returns:
+            RadixNode: The first node whose path covers the prefix, or None if
+                no key starts with the prefix
+        """
+        located = self._locate(prefix)
+        return None if located is None else located[0]
+
+    def search_prefix(self, prefix, attribute_filter=None):
+        """
+        Returns the IDs of all entries indexed under a key starting with the
+        given prefix, without duplicates.
+
+        Args:
+            prefix (str): The prefix to search for
+            attribute_filter (AttributeFilter, optional): Skip subtrees whose
+                summary cannot match the filter
+
+        Returns:
+            list: List of entry IDs
+        """
+        node = self._descend(prefix)
+        if node is None:
+            return []
+
+        ids = []
+        self._collect_ids(node, ids, attribute_filter)
+        return list(dict.fromkeys(ids))
+
+    def is_prefix(self, prefix):
+        """
+        Check if the given string is a valid prefix in the Trie.
+
+        Args:
+            prefix (str): The prefix to check
+
+        Returns:
+            bool: True if the prefix exists in the Trie, False otherwise
+        """
+        return self._descend(prefix) is not None
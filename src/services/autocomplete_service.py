@@ -2,81 +2,333 @@
 Autocomplete service implementation
 """
 
-import pandas as pd
-from src.data.data_loader import join_results_with_user_rating_count
+import hashlib
+import heapq
+import json
+
+from src.data.data_loader import (
+    filter_entry_ids,
+    lookup_records_by_id,
+    rank_entry_ids,
+    read_restaurant_attributes,
+)
+from src.models.attribute_filter import AttributeFilter
+from src.services.request_profiler import NULL_TIMER
 from src.services.trie_service import TrieService
+from src.utils.http_utils import MAX_EXPAND, STREAM_BATCH_SIZE
+from src.utils.synonyms import expand_variants
+from src.utils.text_utils import normalize_text
+
+# Expanded result budget the bundled frontend sends with every query (keep in
+# sync with EXPANDED_RESULT_BUDGET in frontend/src/api.ts); server-side
+# pre-computed responses use it so they match the frontend's requests
+FRONTEND_EXPAND = 50
+
+# Match the query against the start of the names, or anywhere in them
+SEARCH_MODES = ("prefix", "substring")
+
+
+class AutocompleteResults(list):
+    """Ordered result records of a query
+
+    Each record is a {"id", "display_name", "user_rating_count"} dict. The
+    number of matches before the limit is in total_count.
+    """
+
+    def __init__(self, records=(), total_count=0):
+        super().__init__(records)
+        self.total_count = total_count
 
 
-def get_autocomplete_results(prefix, limit=10):
+def autocomplete_cache_key(prefix, limit, attribute_filter, expand=0, mode="prefix"):
+    """Identity of an autocomplete query, shared by equivalent raw prefixes
+
+    The key includes the fingerprint of the index data, so responses
+    computed from an older index are never served for the current one.
+
+    Args:
+        prefix (str): The prefix to search for
+        limit (int): Maximum number of results
+        attribute_filter (AttributeFilter): Filter of the query
+        expand (int, optional): Expanded result budget. Defaults to 0.
+        mode (str, optional): Search mode. Defaults to "prefix".
+
+    Returns:
+        tuple: Hashable key for caching and coalescing
+    """
+    return (
+        TrieService.get_instance().index_tag(),
+        normalize_text(prefix),
+        limit,
+        attribute_filter.key(),
+        expand,
+        mode,
+    )
+
+
+def autocomplete_etag(key):
+    """Build the HTTP entity tag of an autocomplete query
+
+    The tag is weak because raw prefixes normalizing to the same key get
+    equivalent responses that only differ in their "query" field.
+
+    Args:
+        key (tuple): Key returned by autocomplete_cache_key
+
+    Returns:
+        str: Weak ETag derived from the index fingerprint and the query
+    """
+    digest = hashlib.sha1(repr(key[1:]).encode("utf-8")).hexdigest()[:16]
+    return f'W/"{key[0]}-{digest}"'
+
+
+def get_autocomplete_results(
+    prefix,
+    limit=10,
+    timer=NULL_TIMER,
+    attribute_filter=None,
+    expand=0,
+    mode="prefix",
+    trie_service=None,
+):
     """Main function that performs autocomplete search and returns ordered results
 
     Args:
         prefix (str): The prefix to search for
         limit (int, optional): Maximum number of results to return. Defaults to 10.
+        timer (StageTimer, optional): Records the duration of each stage.
+            Defaults to a no-op timer.
+        attribute_filter (AttributeFilter, optional): Only return restaurants
+            matching the filter. Defaults to None.
+        expand (int, optional): If there are at most this many matches, return
+            all of them even if that exceeds limit, so the client gets the
+            complete result set. Capped at MAX_EXPAND. Defaults to 0.
+        mode (str, optional): "prefix" to match the start of the names, or
+            "substring" to match anywhere in them. Defaults to "prefix".
+        trie_service (TrieService, optional): Index to search, already
+            built. Defaults to the singleton, if it is initialized.
 
     Returns:
-        DataFrame: Ordered results matching the prefix
+        AutocompleteResults: Ordered records matching the prefix, with the
+            number of matches before the limit in total_count.
     """
-    # Get the singleton instance of TrieService
-    trie_service = TrieService.get_instance()
-    
-    # Check if the trie is initialized
-    if not trie_service.is_initialized():
-        # If not initialized, return empty results
-        return pd.DataFrame()
-    
-    data_path = "data/restaurants_names.csv"
+    if mode not in SEARCH_MODES:
+        raise ValueError(
+            f"Unknown search mode {mode!r}, expected one of {list(SEARCH_MODES)}"
+        )
+
+    if trie_service is None:
+        # Get the singleton instance of TrieService
+        trie_service = TrieService.get_instance()
+
+        # Check if the trie is initialized
+        if not trie_service.is_initialized():
+            # If not initialized, return empty results
+            return AutocompleteResults()
     
-    # Get all words starting with the prefix using the existing trie
-    all_words_starting_w_prefix = trie_service.search_prefix(prefix)
+    no_filter = attribute_filter is None or attribute_filter.is_empty()
+    if mode == "prefix" and no_filter and trie_service.supports_top_k():
+        # The index ranks the matches itself without listing all of them
+        with timer.stage("trie_search"):
+            ranked_ids, total_count = trie_service.search_top(
+                prefix, limit, min(expand, MAX_EXPAND)
+            )
+    else:
+        # Get the IDs of all entries starting with the prefix using the trie,
+        # or containing it using the suffix array
+        with timer.stage("trie_search"):
+            if mode == "substring":
+                entry_ids = trie_service.search_substring(prefix)
+            else:
+                entry_ids = trie_service.search_prefix(prefix, attribute_filter)
 
-    # Join with user ratings and order results
-    ordered_list = join_results_with_user_rating_count(
-        all_words_starting_w_prefix, data_path
-    )
+        # Filter, order by user ratings and apply limit if specified
+        with timer.stage("rank"):
+            entry_ids = filter_entry_ids(
+                entry_ids, trie_service.store, attribute_filter
+            )
+            total_count = len(entry_ids)
+            if limit > 0 and total_count <= min(expand, MAX_EXPAND):
+                limit = 0
+            ranked_ids = rank_entry_ids(entry_ids, trie_service.store, limit)
 
-    # Apply limit if specified
-    if limit > 0:
-        ordered_list = ordered_list.head(limit)
+    # Look up the records of the remaining entries by ID
+    with timer.stage("lookup"):
+        records = lookup_records_by_id(ranked_ids, trie_service.store)
 
-    return ordered_list
+    return AutocompleteResults(records, total_count)
 
 
-def format_autocomplete_response(prefix, results_df, limit=10):
+def stream_autocomplete_results(prefix, limit=0, attribute_filter=None, mode="prefix"):
+    """Yield the matches of a query as NDJSON, one suggestion per line
+
+    Suggestions come straight from a lazy traversal of the index, in index
+    order rather than by rating, so memory stays constant however many
+    entries match. The first suggestion is sent on its own so clients get
+    bytes immediately, then chunks double up to STREAM_BATCH_SIZE lines.
+    The stream lists the entries that existed when it started: restaurants
+    added while it is read are skipped.
+
+    Args:
+        prefix (str): The prefix (or substring) to search for
+        limit (int, optional): Maximum number of suggestions, 0 for all.
+            Defaults to 0.
+        attribute_filter (AttributeFilter, optional): Only return restaurants
+            matching the filter. Defaults to None.
+        mode (str, optional): "prefix" or "substring". Defaults to "prefix".
+
+    Yields:
+        bytes: Lines of {"id", "name", "rating_count"} JSON objects
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(
+            f"Unknown search mode {mode!r}, expected one of {list(SEARCH_MODES)}"
+        )
+    trie_service = TrieService.get_instance()
+    store = trie_service.store
+    # Entries added during the traversal are past the columns read here
+    entry_count = len(store)
+    if mode == "substring":
+        entry_ids = trie_service.iter_substring(prefix)
+    else:
+        entry_ids = trie_service.iter_prefix(prefix, attribute_filter)
+
+    if attribute_filter is not None and attribute_filter.is_empty():
+        attribute_filter = None
+    if attribute_filter is not None:
+        attributes = read_restaurant_attributes(store)
+    ratings = store.column("user_rating_count")
+
+    lines = []
+    batch_size = 1
+    count = 0
+    for entry_id in entry_ids:
+        if entry_id >= entry_count:
+            continue
+        if attribute_filter is not None and not attribute_filter.matches(
+            attributes["is_open"][entry_id],
+            attributes["borough"][entry_id],
+            attributes["average_rating"][entry_id],
+        ):
+            continue
+        suggestion = {
+            "id": entry_id,
+            "name": store.string("display_name", entry_id),
+            "rating_count": int(ratings[entry_id]),
+        }
+        lines.append(json.dumps(suggestion))
+        count += 1
+        if limit > 0 and count >= limit:
+            break
+        if len(lines) >= batch_size:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+            batch_size = min(2 * batch_size, STREAM_BATCH_SIZE)
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def format_autocomplete_response(prefix, results, limit=10, trie_service=None):
     """Format autocomplete results as a JSON-serializable dictionary
 
     Args:
         prefix (str): The prefix that was searched for
-        results_df (DataFrame): DataFrame with autocomplete results
+        results (AutocompleteResults): Records returned by
+            get_autocomplete_results
         limit (int, optional): Maximum number of results. Defaults to 10.
+        trie_service (TrieService, optional): Index the results come from,
+            whose synonyms are listed as aliases. Defaults to the singleton.
 
     Returns:
-        dict: JSON-serializable dictionary with autocomplete results
+        dict: JSON-serializable dictionary with autocomplete results. "complete"
+            is True when the suggestions hold every match, so results for
+            longer prefixes can be derived from them without a new request.
     """
-    # Calculate total count before applying limit
-    total_count = len(results_df)
+    # Total count of matches before applying limit
+    total_count = getattr(results, "total_count", len(results))
+    complete = total_count <= len(results)
+    if trie_service is None:
+        trie_service = TrieService.get_instance()
+    synonyms = trie_service.synonyms
     
     # Calculate max rating for normalization
-    max_rating = results_df["user_rating_count"].max() if not results_df.empty else 1
+    max_rating = max((row["user_rating_count"] for row in results), default=1)
     
     # Build suggestions list
     suggestions = []
-    for _, row in results_df.iterrows():
+    for row in results:
         # Normalize score between 0 and 1
         score = row["user_rating_count"] / max_rating if max_rating > 0 else 0
         
-        suggestions.append({
+        suggestion = {
+            "id": int(row["id"]),
             "name": row["display_name"],
             "rating_count": int(row["user_rating_count"]),
             "score": round(score, 2)
-        })
+        }
+
+        # Synonym variants the entry is also indexed under, which clients
+        # need to refine a complete result set locally
+        if complete:
+            aliases = expand_variants(row["display_name"], synonyms)[1:]
+            if aliases:
+                suggestion["aliases"] = aliases
+
+        suggestions.append(suggestion)
     
     # Build response
     response = {
         "query": prefix,
         "suggestions": suggestions,
         "total_count": total_count,
+        "complete": complete,
         "status": "success"
     }
     
     return response
+
+
+def warm_autocomplete_cache(
+    num_names=100, max_prefix_length=3, limit=10, expand=FRONTEND_EXPAND
+):
+    """Pre-compute the responses of the hottest prefixes into the result cache
+
+    The hottest prefixes are taken to be the short prefixes of the names with
+    the most user ratings.
+
+    Args:
+        num_names (int, optional): Number of top-rated names whose prefixes are
+            warmed. Defaults to 100.
+        max_prefix_length (int, optional): Longest prefix warmed per name.
+            Defaults to 3.
+        limit (int, optional): Result limit of the warmed queries. Defaults to 10.
+        expand (int, optional): Expanded result budget of the warmed queries.
+            Defaults to FRONTEND_EXPAND, the budget of the bundled frontend.
+
+    Returns:
+        int: Number of prefixes warmed
+    """
+    trie_service = TrieService.get_instance()
+    if not trie_service.is_initialized():
+        return 0
+
+    store = trie_service.store
+    ratings = store.column("user_rating_count")
+    top_ids = heapq.nlargest(num_names, range(len(store)), key=ratings.__getitem__)
+
+    prefixes = {}
+    for entry_id in top_ids:
+        name = store.string("display_name", entry_id)
+        for length in range(1, max_prefix_length + 1):
+            # A shard only warms the prefixes the router sends to it
+            if trie_service.serves_prefix(normalize_text(name[:length])):
+                prefixes[name[:length]] = None
+
+    no_filter = AttributeFilter()
+    for prefix in prefixes:
+        results = get_autocomplete_results(prefix, limit, expand=expand)
+        trie_service.result_cache.put(
+            autocomplete_cache_key(prefix, limit, no_filter, expand),
+            format_autocomplete_response(prefix, results, limit),
+        )
+    return len(prefixes)
@@ -0,0 +1,265 @@
+"""
+Size and shape statistics of the autocomplete index, for capacity planning
+"""
+
+import os
+import sys
+import threading
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Number of cached responses measured to estimate the size of the cache
+CACHE_SAMPLE_SIZE = 32
+
+# Structural statistics of the last index measured, keyed by its index tag
+_structure = {"key": None, "stats": None}
+_lock = threading.Lock()
+
+
+def _deep_size(value):
+    """Estimate the bytes held by a JSON-like value (dicts, lists, scalars)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + _deep_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += _deep_size(item)
+    return size
+
+
+def trie_structure_stats(trie):
+    """Walk a trie and measure its shape and approximate size
+
+    Works with both Trie and RadixTrie nodes. The byte estimate counts the
+    node objects (slotted, so without a separate __dict__), their children
+    dictionaries, posting lists and edge labels, but not the interned
+    characters used as dictionary keys.
+
+    Args:
+        trie (Trie): Trie to measure
+
+    Returns:
+        dict: Node, key and posting counts, branching-factor and depth
+            histograms (number of nodes per value) and estimated bytes
+    """
+    nodes = keys = postings = estimated_bytes = 0
+    branching = {}
+    depths = {}
+    stack = [(trie.root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        nodes += 1
+        fanout = len(node.children)
+        branching[fanout] = branching.get(fanout, 0) + 1
+        depths[depth] = depths.get(depth, 0) + 1
+        estimated_bytes += sys.getsizeof(node) + sys.getsizeof(node.children)
+        if node.ids is not None:
+            keys += 1
+            postings += len(node.ids)
+            estimated_bytes += sys.getsizeof(node.ids)
+        label = getattr(node, "label", None)
+        if label:
+            estimated_bytes += sys.getsizeof(label)
+        for child in node.children.values():
+            stack.append((child, depth + 1))
+
+    internal = nodes - branching.get(0, 0)
+    return {
+        "nodes": nodes,
+        "keys": keys,
+        "postings": postings,
+        "branching": {
+            "mean": round((nodes - 1) / internal, 3) if internal else 0.0,
+            "max": max(branching),
+            "histogram": {str(k): branching[k] for k in sorted(branching)},
+        },
+        "depth": {
+            "max": max(depths),
+            "histogram": {str(k): depths[k] for k in sorted(depths)},
+        },
+        "estimated_bytes": estimated_bytes,
+    }
+
+
+def cached_structure_stats(trie, index_tag):
+    """Return the structural statistics of a trie, measured once per index
+
+    The walk visits every node, so its result is reused until the index
+    changes and scraping the stats endpoint stays cheap.
+
+    Args:
+        trie (Trie): Trie to measure
+        index_tag (str): Identity of the index the trie belongs to
+
+    Returns:
+        dict: Result of trie_structure_stats, or of the structure_stats
+            method of indexes that provide one
+    """
+    key = (id(trie), index_tag)
+    with _lock:
+        if _structure["key"] == key:
+            return _structure["stats"]
+    if hasattr(trie, "structure_stats"):
+        # Indexes that are not made of nodes measure themselves
+        stats = trie.structure_stats()
+    else:
+        stats = trie_structure_stats(trie)
+    with _lock:
+        _structure.update(key=key, stats=stats)
+    return stats
+
+
+def store_column_bytes(store):
+    """Return the on-disk size of each column of a store
+
+    Columns are memory-mapped, so these bytes live in the page cache rather
+    than on the Python heap.
+
+    Args:
+        store (ColumnarStore): Store to measure
+
+    Returns:
+        dict: Mapping of column name to its size in bytes
+    """
+    sizes = {}
+    for name in store.schema:
+        sizes[name] = sum(
+            os.path.getsize(os.path.join(store.path, filename))
+            for filename in os.listdir(store.path)
+            if filename.rsplit(".", 1)[0] == name
+        )
+    return sizes
+
+
+def result_cache_stats(result_cache):
+    """Estimate the size of the response cache from a sample of its entries
+
+    Args:
+        result_cache (ResultCache): Cache to measure
+
+    Returns:
+        dict: Number of entries, capacity and estimated bytes
+    """
+    entries = len(result_cache)
+    sample = result_cache.sample(CACHE_SAMPLE_SIZE)
+    estimated_bytes = 0
+    if sample:
+        sample_bytes = sum(_deep_size(key) + _deep_size(value) for key, value in sample)
+        estimated_bytes = sample_bytes * entries // len(sample)
+    return {
+        "entries": entries,
+        "max_size": result_cache.max_size,
+        "estimated_bytes": estimated_bytes,
+    }
+
+
+def process_memory():
+    """Return the resident memory of the current process
+
+    Returns:
+        dict: Current RSS (None where /proc is not available) and peak RSS
+            in bytes (None where the resource module is not available)
+    """
+    rss_bytes = peak_rss_bytes = None
+    if resource is None:
+        return {"rss_bytes": rss_bytes, "peak_rss_bytes": peak_rss_bytes}
+    try:
+        with open("/proc/self/statm") as f:
+            rss_bytes = int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss_bytes = peak if sys.platform == "darwin" else peak * 1024
+    return {"rss_bytes": rss_bytes, "peak_rss_bytes": peak_rss_bytes}
+
+
+def tracemalloc_stats(top=10):
+    """Break down the traced Python allocations by source file
+
+    Only available when tracemalloc was started at process startup (see the
+    AUTOCOMPLETE_TRACEMALLOC environment variable); taking a snapshot walks
+    every traced block, so it is only done on request.
+
+    Args:
+        top (int, optional): Number of source files reported. Defaults to 10.
+
+    Returns:
+        dict: Traced current and peak bytes and the largest allocators, or
+            {"tracing": False} when tracemalloc is not running
+    """
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, tracemalloc.__file__)]
+    )
+    return {
+        "tracing": True,
+        "traced_bytes": current,
+        "peak_traced_bytes": peak,
+        "top_files": [
+            {
+                "file": stat.traceback[0].filename,
+                "bytes": stat.size,
+                "blocks": stat.count,
+            }
+            for stat in snapshot.statistics("filename")[:top]
+        ],
+    }
+
+
+def collect_index_stats(trie_service, deep=False):
+    """Gather the statistics reported by the stats endpoint
+
+    Args:
+        trie_service (TrieService): Service holding the index
+        deep (bool, optional): Include the tracemalloc breakdown. Defaults to
+            False.
+
+    Returns:
+        dict: Index, memory and build statistics
+    """
+    store = trie_service.store
+    columns = store_column_bytes(store)
+    trie = cached_structure_stats(trie_service.trie, trie_service.index_tag())
+    stats = {
+        "index": {
+            "initialized": trie_service.is_initialized(),
+            "tag": trie_service.index_tag(),
+            "trie_mode": trie_service.trie_class.__name__,
+            "entries": len(store),
+            "build_duration_s": trie_service.build_duration_s,
+            "shard": {
+                "index": trie_service.shard_index,
+                "count": trie_service.shard_count,
+            },
+        },
+        "trie": trie,
+        "memory": {
+            "trie_bytes": trie["estimated_bytes"],
+            "substring_index_bytes": (
+                trie_service.substring_index.nbytes()
+                if trie_service.substring_index is not None
+                else 0
+            ),
+            "ratings_bytes": columns.get("user_rating_count", 0)
+            + columns.get("average_rating", 0),
+            "store_bytes": sum(columns.values()),
+            "store_columns": columns,
+            "result_cache": result_cache_stats(trie_service.result_cache),
+            "materialized": {
+                "prefixes": len(trie_service.materialized),
+                "bytes": trie_service.materialized.nbytes(),
+            },
+            "process": process_memory(),
+        },
+    }
+    if deep:
+        stats["memory"]["tracemalloc"] = tracemalloc_stats()
+    return stats
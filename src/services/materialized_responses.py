@@ -0,0 +1,118 @@
+"""
+Autocomplete responses of short prefixes, serialized ahead of time
+
+Most queries are for prefixes of one to three characters, a small and finite
+key space. The JSON response of every existing prefix up to a configurable
+length is built with the index and kept as bytes, for each materialized
+request shape (limit and expand budget: the API defaults and the bundled
+frontend's requests), so these queries are answered without traversal,
+ranking or serialization.
+
+Each entry holds the serialized response without its "query" field, which is
+the raw prefix of each request and is prepended when serving.
+"""
+
+import json
+import threading
+
+
+def serialize_response(response):
+    """Serialize a response the way JSONResponse does
+
+    Args:
+        response (dict): Formatted autocomplete response
+
+    Returns:
+        bytes: Compact UTF-8 JSON
+    """
+    return json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+class MaterializedResponses:
+    """Lookup table of the serialized responses of short prefixes
+
+    The table is only used while it matches the current index version, so
+    responses are never served from an older index.
+    """
+
+    def __init__(self, max_length, shapes=((10, 0),)):
+        """Initialize an empty table
+
+        Args:
+            max_length (int): Longest materialized prefix, 0 disables the table
+            shapes (tuple, optional): (limit, expand) of each materialized
+                request shape. Defaults to the API defaults, ((10, 0),).
+        """
+        self.max_length = max_length
+        self.shapes = tuple(dict.fromkeys(shapes))
+        self.index_version = None  # Version the table is current for
+        # (limit, expand, normalized prefix) -> response bytes after "query"
+        self._tails = {}
+        self._lock = threading.Lock()
+
+    def prefixes(self, key):
+        """Return the prefixes of an index key the table holds
+
+        Args:
+            key (str): Normalized index key
+
+        Returns:
+            list: Prefixes of one to max_length characters
+        """
+        return [key[:length] for length in range(1, min(len(key), self.max_length) + 1)]
+
+    def refresh(self, prefixes, render, index_version, replace=False):
+        """Recompute the responses of some prefixes
+
+        Args:
+            prefixes (iterable): Normalized prefixes to recompute
+            render (callable): Returns the formatted response of a prefix,
+                called with (prefix, limit, expand) for each shape
+            index_version (int): Version of the index the responses are
+                computed from
+            replace (bool, optional): Drop every other prefix. Defaults to
+                False.
+        """
+        tails = {}
+        for prefix in prefixes:
+            for limit, expand in self.shapes:
+                response = dict(render(prefix, limit, expand))
+                del response["query"]
+                tails[limit, expand, prefix] = serialize_response(response)[1:]
+        with self._lock:
+            if replace:
+                self._tails = tails
+            else:
+                self._tails.update(tails)
+            if self.index_version is None or index_version > self.index_version:
+                self.index_version = index_version
+
+    def get(self, query, normalized_prefix, limit, expand, index_version):
+        """Return the serialized response of a query if it is materialized
+
+        Args:
+            query (str): Raw prefix of the request, echoed in the response
+            normalized_prefix (str): Normalized prefix
+            limit (int): Result limit of the request
+            expand (int): Expanded result budget of the request
+            index_version (int): Current version of the index
+
+        Returns:
+            bytes | None: The JSON response, or None if it must be computed
+        """
+        if index_version != self.index_version:
+            return None
+        tail = self._tails.get((limit, expand, normalized_prefix))
+        if tail is None:
+            return None
+        return b'{"query":' + serialize_response(query) + b"," + tail
+
+    def nbytes(self):
+        """Return the size of the serialized responses, in bytes"""
+        return sum(len(tail) for tail in list(self._tails.values()))
+
+    def __len__(self):
+        """Return the number of materialized responses, over all shapes"""
+        return len(self._tails)
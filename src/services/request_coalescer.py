@@ -0,0 +1,79 @@
+"""
+Single-flight coalescing of identical concurrent requests with admission control
+"""
+
+import asyncio
+
+
+class OverloadedError(Exception):
+    """Raised when too many computations are already pending"""
+
+
+class RequestCoalescer:
+    """Share one in-flight computation between concurrent identical requests
+
+    The first request for a key (the leader) starts the computation; requests
+    for the same key arriving before it finishes await it and receive the
+    same result, without holding a worker thread. The number of distinct
+    computations pending (queued for a worker thread or running on one) is
+    bounded by `max_pending`: a new key arriving over the bound is rejected
+    with OverloadedError before it is dispatched, instead of being queued.
+    Requests that join an existing computation are always admitted since they
+    add no work.
+
+    The coalescer is used from the event loop only, so it needs no lock.
+    """
+
+    def __init__(self, max_pending=32):
+        """Initialize the coalescer
+
+        Args:
+            max_pending (int, optional): Maximum number of distinct
+                computations pending. Keep it below the size of the worker
+                thread pool, so admitted computations do not queue behind
+                each other. 0 disables the bound. Defaults to 32.
+        """
+        self.max_pending = max_pending
+        self._calls = {}
+
+    async def run(self, key, fn):
+        """Run fn for the given key, or await an identical run in flight
+
+        The computation runs in its own task, so it completes for the
+        requests still waiting even if the leader is cancelled.
+
+        Args:
+            key (hashable): Identity of the computation
+            fn (callable): Coroutine function computing the result, called
+                without arguments (e.g. dispatching to the thread pool)
+
+        Returns:
+            Any: The result of fn, shared by all coalesced callers
+
+        Raises:
+            OverloadedError: If the bound on pending computations is reached
+        """
+        call = self._calls.get(key)
+        if call is None:
+            if self.max_pending and len(self._calls) >= self.max_pending:
+                raise OverloadedError(f"Too many pending requests ({len(self._calls)})")
+            call = asyncio.ensure_future(fn())
+            self._calls[key] = call
+            call.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(call)
+
+    def _finish(self, key, call):
+        """Forget a finished computation"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Retrieved, even if every request awaiting it was cancelled
+            call.exception()
+
+    def pending(self):
+        """Return the number of distinct computations pending
+
+        Returns:
+            int: Number of pending computations
+        """
+        return len(self._calls)
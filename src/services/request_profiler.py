@@ -0,0 +1,119 @@
+"""
+Opt-in profiling of autocomplete requests: per-stage timings and sampled cProfile dumps
+"""
+
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimer:
+    """Record the wall-clock duration of named stages of one request"""
+
+    def __init__(self):
+        self.stages = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block under the given stage name
+
+        Args:
+            name (str): Stage name, accumulated if used more than once
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    def as_dict(self):
+        """Return the recorded timings in milliseconds
+
+        Returns:
+            dict: Stage durations plus the total time since the timer started
+        """
+        timings = {name: round(s * 1000, 3) for name, s in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self._start) * 1000, 3)
+        return timings
+
+
+class _NullTimer:
+    """Timer used when timings are not requested; every stage is a no-op"""
+
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+
+NULL_TIMER = _NullTimer()
+
+
+class RequestProfiler:
+    """Capture cProfile dumps for a random sample of requests
+
+    With a sample rate of 0 (the default) `run` calls the function directly,
+    so a disabled profiler adds a single comparison per request.
+    """
+
+    def __init__(self, sample_rate=0.0, output_dir="profiles"):
+        """Initialize the profiler
+
+        Args:
+            sample_rate (float, optional): Fraction of requests to profile,
+                between 0 and 1. Defaults to 0.0 (disabled).
+            output_dir (str, optional): Directory for the .pstats dumps.
+                Defaults to "profiles".
+        """
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._counter = 0
+        self._lock = threading.Lock()
+        # Held while a request is profiled: only one profiler can be active
+        # at a time (on Python 3.12+ a second one raises ValueError)
+        self._active = threading.Lock()
+
+    def run(self, fn, label=""):
+        """Call fn, profiling it if the request is sampled
+
+        Only one request is profiled at a time: sampled requests that overlap
+        it run unprofiled.
+
+        Args:
+            fn (callable): Function to run, called without arguments
+            label (str, optional): Label included in the dump file name
+
+        Returns:
+            Any: The result of fn
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return fn()
+
+        if not self._active.acquire(blocking=False):
+            return fn()
+        try:
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(fn)
+            finally:
+                self._dump(profile, label)
+        finally:
+            self._active.release()
+
+    def _dump(self, profile, label):
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+        safe_label = re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")[:40]
+        filename = f"{int(time.time() * 1000)}_{os.getpid()}_{counter}"
+        if safe_label:
+            filename += f"_{safe_label}"
+        os.makedirs(self.output_dir, exist_ok=True)
+        profile.dump_stats(os.path.join(self.output_dir, f"{filename}.pstats"))
@@ -0,0 +1,76 @@
+"""
+Bounded LRU cache of formatted autocomplete responses
+"""
+
+import itertools
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU cache of autocomplete responses
+
+    Entries are only valid for the index they were computed from, so the
+    cache is cleared whenever the trie is rebuilt or a restaurant is added.
+    """
+
+    def __init__(self, max_size=1024):
+        """Initialize the cache
+
+        Args:
+            max_size (int, optional): Maximum number of cached responses,
+                0 disables the cache. Defaults to 1024.
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached response for a key
+
+        Args:
+            key (hashable): Normalized query identity
+
+        Returns:
+            dict | None: The cached response, or None on a miss
+        """
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+            return response
+
+    def put(self, key, response):
+        """Cache a response, evicting the least recently used one if full
+
+        Args:
+            key (hashable): Normalized query identity
+            response (dict): Response to cache
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def sample(self, count):
+        """Return some cached entries, oldest first
+
+        Args:
+            count (int): Maximum number of entries returned
+
+        Returns:
+            list: (key, response) pairs
+        """
+        with self._lock:
+            return list(itertools.islice(self._entries.items(), count))
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,111 @@
+"""
+Partitioning of the index across shards and merging of shard results
+
+Index keys are assigned to shards by a hash of their first characters, so
+every prefix at least that long lives on exactly one shard and is routed
+there. Shorter prefixes span several shards and are scatter-gathered.
+"""
+
+import zlib
+
+from src.utils.http_utils import MAX_EXPAND
+
+# Number of leading characters of a key hashed to pick its shard
+DEFAULT_SHARD_PREFIX_LENGTH = 2
+
+# Shard hosting the suffix array of all the names, which answers every
+# substring query
+SUBSTRING_SHARD = 0
+
+
+def shard_of(key, shard_count, prefix_length=DEFAULT_SHARD_PREFIX_LENGTH):
+    """Return the shard an index key belongs to
+
+    Args:
+        key (str): Normalized index key
+        shard_count (int): Number of shards
+        prefix_length (int, optional): Number of leading characters hashed.
+            Defaults to DEFAULT_SHARD_PREFIX_LENGTH.
+
+    Returns:
+        int: Index of the shard, between 0 and shard_count - 1
+    """
+    return zlib.crc32(key[:prefix_length].encode("utf-8")) % shard_count
+
+
+def shard_for_prefix(prefix, shard_count, prefix_length=DEFAULT_SHARD_PREFIX_LENGTH):
+    """Return the only shard that can hold matches of a prefix
+
+    Args:
+        prefix (str): Normalized prefix
+        shard_count (int): Number of shards
+        prefix_length (int, optional): Number of leading characters hashed.
+            Defaults to DEFAULT_SHARD_PREFIX_LENGTH.
+
+    Returns:
+        int | None: Index of the shard, or None if the prefix is shorter than
+            prefix_length and matches may live on any shard
+    """
+    if len(prefix) < prefix_length:
+        return None
+    return shard_of(prefix, shard_count, prefix_length)
+
+
+def merge_autocomplete_responses(query, responses, limit=10, expand=0):
+    """Merge the autocomplete responses of several shards
+
+    Each shard returns its own top results, so the global top results are
+    among them. A name indexed under several synonym variants can live on
+    more than one shard; its copies share the same entry ID and are merged.
+
+    Args:
+        query (str): The prefix that was searched for
+        responses (list): Autocomplete responses of the shards
+        limit (int, optional): Maximum number of results, 0 for all.
+            Defaults to 10.
+        expand (int, optional): Return every match if there are at most this
+            many (capped at MAX_EXPAND). Defaults to 0.
+
+    Returns:
+        dict: Response in the format of format_autocomplete_response. When
+            some shard result is incomplete, total_count is an upper bound
+            because duplicates outside of the returned results are unknown.
+    """
+    suggestions = {}
+    returned = 0
+    total_count = 0
+    all_complete = True
+    for response in responses:
+        total_count += response["total_count"]
+        all_complete = all_complete and response["complete"]
+        returned += len(response["suggestions"])
+        for suggestion in response["suggestions"]:
+            suggestions.setdefault(suggestion["id"], suggestion)
+
+    ordered = sorted(suggestions.values(), key=lambda s: (-s["rating_count"], s["id"]))
+    if all_complete:
+        total_count = len(ordered)
+    else:
+        total_count -= returned - len(ordered)
+
+    if limit > 0 and total_count > min(expand, MAX_EXPAND):
+        ordered = ordered[:limit]
+    complete = all_complete and total_count <= len(ordered)
+
+    max_rating = ordered[0]["rating_count"] if ordered else 1
+    merged = []
+    for suggestion in ordered:
+        suggestion = dict(suggestion)
+        score = suggestion["rating_count"] / max_rating if max_rating > 0 else 0
+        suggestion["score"] = round(score, 2)
+        if not complete:
+            suggestion.pop("aliases", None)
+        merged.append(suggestion)
+
+    return {
+        "query": query,
+        "suggestions": merged,
+        "total_count": total_count,
+        "complete": complete,
+        "status": "success",
+    }
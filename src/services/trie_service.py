@@ -2,11 +2,76 @@
 Service for managing the Trie data structure as a singleton
 """
 
-from src.models.trie import Trie
-from src.data.data_loader import read_restaurants_txt
+import json
+import os
+import threading
+import time
+import zlib
+from array import array
+
+from src.models.sorted_index import SortedArrayIndex
+from src.models.suffix_array import SuffixArrayIndex
+from src.models.trie import RadixTrie, Trie
+from src.data.columnar_store import ColumnarStore, RESTAURANT_SCHEMA, STRING_TYPE
+from src.data.data_loader import (
+    import_csv_to_store,
+    read_restaurant_attributes,
+    read_restaurants_txt,
+)
+from src.models.attribute_filter import entry_summary
+from src.services.materialized_responses import MaterializedResponses
+from src.services.result_cache import ResultCache
+from src.services.sharding import (
+    DEFAULT_SHARD_PREFIX_LENGTH,
+    SUBSTRING_SHARD,
+    shard_of,
+)
+from src.utils.synonyms import expand_variants, load_synonyms
 from src.utils.text_utils import normalize_text
 
 
+# Trie implementations selectable with the AUTOCOMPLETE_TRIE_MODE variable
+TRIE_MODES = {"standard": Trie, "radix": RadixTrie, "sorted": SortedArrayIndex}
+
+
+def value_checksum(value, type_code, checksum=0):
+    """Update the CRC32 of a store column with one more value
+
+    Numeric values are hashed as their bytes in the column file, so the
+    checksum of a whole numeric column is the CRC32 of its buffer. String
+    values are prefixed with their length, so boundaries are hashed too.
+
+    Args:
+        value: Value of the column
+        type_code (str): Type code of the column
+        checksum (int, optional): Checksum of the previous values
+
+    Returns:
+        int: Updated checksum
+    """
+    if type_code == STRING_TYPE:
+        encoded = value.encode("utf-8")
+        checksum = zlib.crc32(array("Q", [len(encoded)]).tobytes(), checksum)
+        return zlib.crc32(encoded, checksum)
+    return zlib.crc32(array(type_code, [value]).tobytes(), checksum)
+
+
+def shard_store_path(shard_index):
+    """Return the directory of the store copy of a shard
+
+    Args:
+        shard_index (int): Index of the shard
+
+    Returns:
+        str: Path of the shard's store
+    """
+    return f"data/shards/{shard_index}/restaurants_names.store"
+
+
+class EntryIdConflict(Exception):
+    """Raised when an added restaurant cannot get the entry ID it expects"""
+
+
 class TrieService:
     """Singleton service for managing the Trie data structure"""
     
@@ -24,10 +89,129 @@ class TrieService:
             cls._instance = cls()
         return cls._instance
     
-    def __init__(self):
-        """Initialize the TrieService with an empty trie"""
-        self.trie = Trie()
-        self.data_path = "data/restaurants_names.csv"
+    def __init__(
+        self,
+        trie_mode=None,
+        synonyms_path=None,
+        shard_index=None,
+        shard_count=None,
+        substring_index=None,
+        materialize_length=None,
+    ):
+        """Initialize the TrieService with an empty trie
+
+        Args:
+            trie_mode (str, optional): "standard", "radix" or "sorted".
+                Defaults to the AUTOCOMPLETE_TRIE_MODE environment variable,
+                or "standard".
+            synonyms_path (str, optional): JSON file with synonym groups.
+                Defaults to the AUTOCOMPLETE_SYNONYMS_PATH environment
+                variable, or the built-in synonyms.
+            shard_index (int, optional): Shard served by this instance.
+                Defaults to the AUTOCOMPLETE_SHARD_INDEX environment
+                variable, or 0.
+            shard_count (int, optional): Number of shards of the deployment,
+                1 to index everything. Defaults to the
+                AUTOCOMPLETE_SHARD_COUNT environment variable, or 1.
+            substring_index (bool, optional): Build the suffix array used by
+                substring queries. Defaults to the
+                AUTOCOMPLETE_SUBSTRING_INDEX environment variable, or True,
+                but only on the shard hosting it (SUBSTRING_SHARD).
+            materialize_length (int, optional): Serialize the responses of
+                every prefix up to this length when the index is built, 0 for
+                none. Defaults to the AUTOCOMPLETE_MATERIALIZE_LENGTH
+                environment variable, or 0.
+        """
+        trie_mode = trie_mode or os.environ.get("AUTOCOMPLETE_TRIE_MODE", "standard")
+        if trie_mode not in TRIE_MODES:
+            raise ValueError(
+                f"Unknown trie mode {trie_mode!r}, expected one of {list(TRIE_MODES)}"
+            )
+        self.trie_class = TRIE_MODES[trie_mode]
+        self.trie = self.trie_class()
+        self.synonyms = load_synonyms(
+            synonyms_path or os.environ.get("AUTOCOMPLETE_SYNONYMS_PATH")
+        )
+        # A shard only indexes the keys it owns, in its own copy of the store
+        # so that added restaurants get the same entry ID on every shard
+        if shard_count is None:
+            shard_count = os.environ.get("AUTOCOMPLETE_SHARD_COUNT", "1")
+        if shard_index is None:
+            shard_index = os.environ.get("AUTOCOMPLETE_SHARD_INDEX", "0")
+        self.shard_count = int(shard_count)
+        self.shard_index = int(shard_index)
+        self.shard_prefix_length = int(
+            os.environ.get(
+                "AUTOCOMPLETE_SHARD_PREFIX_LENGTH", DEFAULT_SHARD_PREFIX_LENGTH
+            )
+        )
+        if not 0 <= self.shard_index < self.shard_count:
+            raise ValueError(
+                f"Shard index {self.shard_index} out of range for "
+                f"{self.shard_count} shards"
+            )
+        # A substring can match any name, so a single shard hosts the suffix
+        # array of all the names and the others skip it
+        if substring_index is None:
+            substring_index = os.environ.get("AUTOCOMPLETE_SUBSTRING_INDEX", "1")
+            substring_index = (
+                substring_index != "0" and self.shard_index == SUBSTRING_SHARD
+            )
+        self.substring_enabled = bool(substring_index)
+        self.substring_index = None
+        self.data_path = "data/restaurants_names.store"
+        if self.shard_count > 1:
+            self.data_path = shard_store_path(self.shard_index)
+        self.csv_path = "data/restaurants_names.csv"
+        self._store = None
+        # Incremented whenever this process changes its index, to invalidate
+        # derived state (the materialized responses)
+        self.index_version = 0
+        # Checksum of the data and configuration the index is built from,
+        # which identifies it in HTTP ETags; the same in every process
+        # serving the same data
+        self.index_fingerprint = "0"
+        self._column_checksums = {}
+        # Wall-clock duration of the last successful build, in seconds
+        self.build_duration_s = None
+        # Formatted responses of the current index, cleared when it changes
+        self.result_cache = ResultCache(
+            int(os.environ.get("AUTOCOMPLETE_CACHE_SIZE", "1024"))
+        )
+        # Serialized responses of the short prefixes, by default for the API
+        # defaults (limit 10, expand 0) and the requests of the bundled
+        # frontend (limit 10, expand 50)
+        if materialize_length is None:
+            materialize_length = os.environ.get("AUTOCOMPLETE_MATERIALIZE_LENGTH", "0")
+        expands = os.environ.get("AUTOCOMPLETE_MATERIALIZE_EXPAND", "0,50")
+        self.materialized = MaterializedResponses(
+            int(materialize_length),
+            shapes=[(10, int(expand)) for expand in expands.split(",")],
+        )
+        # Serializes added restaurants, so the materialized responses of each
+        # one are refreshed before the next one changes the index
+        self._add_lock = threading.Lock()
+
+    @property
+    def store(self):
+        """Columnar store with the processed restaurant data
+
+        The store is imported from the CSV export on first access if it does
+        not exist yet, or created empty when there is nothing to import.
+
+        Returns:
+            ColumnarStore: The opened store
+        """
+        if self._store is None:
+            if not ColumnarStore.exists(self.data_path):
+                if os.path.exists(self.csv_path):
+                    import_csv_to_store(self.csv_path, self.data_path)
+                else:
+                    ColumnarStore.create(
+                        self.data_path, {name: [] for name in RESTAURANT_SCHEMA}
+                    )
+            self._store = ColumnarStore(self.data_path)
+        return self._store
     
     def build_trie(self):
         """Build the trie from the restaurant data
@@ -35,20 +219,48 @@ class TrieService:
         Returns:
             dict: Status of the operation
         """
+        start = time.perf_counter()
         try:
             # Get restaurant names and build the trie
-            list_names = read_restaurants_txt(self.data_path)
+            list_names = read_restaurants_txt(self.store)
             
-            # Reset the trie
-            self.trie = Trie()
-            
-            # Insert all names
-            for name in list_names:
-                # Normalize the text before inserting into the trie
-                normalized_name = normalize_text(name)
-                self.trie.insert(normalized_name)
+            # Build a new trie, swapped in once complete so that queries
+            # running meanwhile keep using the previous one
+            trie = self.trie_class()
+            indexed = self._index_rows(trie, list_names)
+
+            # Indexes that buffer inserts finish building before the swap
+            if hasattr(trie, "freeze"):
+                trie.freeze(self.store.column("user_rating_count"))
+
+            substring_index = None
+            if self.substring_enabled:
+                substring_index = SuffixArrayIndex(
+                    [name for _, name in indexed], [row for row, _ in indexed]
+                )
             
-            TrieService._is_initialized = True
+            with self._add_lock:
+                # Restaurants added while the trie was built went to the
+                # store (and the previous trie): index them before the swap
+                added_names = self.store.strings("display_name", len(list_names))
+                added = self._index_rows(trie, added_names, len(list_names))
+                if substring_index is not None:
+                    for row, name in added:
+                        substring_index.add(name, row)
+                indexed += added
+
+                self.trie = trie
+                self.substring_index = substring_index
+                self._column_checksums = self._checksum_columns()
+                self.index_fingerprint = self._fingerprint()
+                self.index_version += 1
+                self.result_cache.clear()
+                self._is_initialized = True
+                if self.materialized.max_length > 0:
+                    self.refresh_materialized(
+                        [name for _, name in indexed], replace=True
+                    )
+            self.build_duration_s = round(time.perf_counter() - start, 3)
             return {
                 "status": "success",
                 "message": f"Trie built successfully with {len(list_names)} entries"
@@ -59,26 +271,378 @@ class TrieService:
                 "message": f"Failed to build trie: {str(e)}"
             }
     
+    def _index_rows(self, trie, names, start=0):
+        """Insert the rows owned by this shard among consecutive rows of the store
+
+        Args:
+            trie (Trie): Trie to insert into
+            names (list): Display names of the rows
+            start (int, optional): Row of the first name. Defaults to 0.
+
+        Returns:
+            list: (row, normalized name) of the rows indexed in the trie, or
+                of every row if this instance hosts the substring index
+        """
+        attributes = read_restaurant_attributes(self.store)
+        indexed = []
+        # Insert the owned keys of the names under their entry ID (the row in
+        # the store) with the summary of their filterable attributes. Rows
+        # without any owned key are skipped without reading their attributes
+        for row, name in enumerate(names, start):
+            # Normalize the text before inserting into the trie
+            normalized_name = normalize_text(name)
+            keys = self.owned_keys(normalized_name)
+            if keys or self.substring_enabled:
+                indexed.append((row, normalized_name))
+            if not keys:
+                continue
+            summary = entry_summary(
+                attributes["is_open"][row],
+                attributes["borough"][row],
+                attributes["average_rating"][row],
+            )
+            for key in keys:
+                trie.insert(key, row, summary)
+        return indexed
+
+    def index_name(self, normalized_name, entry_id, summary=None, trie=None):
+        """Insert a name in the trie under itself and all its synonym variants
+
+        Every variant key points back to the same entry ID, so expanding
+        synonyms here costs nothing at query time.
+
+        Args:
+            normalized_name (str): Normalized restaurant name
+            entry_id (int): ID of the entry (its row in the store)
+            summary (tuple, optional): Summary of the filterable attributes
+            trie (Trie, optional): Trie to insert into. Defaults to the current one.
+        """
+        trie = self.trie if trie is None else trie
+        for key in self.owned_keys(normalized_name):
+            trie.insert(key, entry_id, summary)
+
+    def owned_keys(self, normalized_name):
+        """Return the index keys of a name that belong to this shard
+
+        Args:
+            normalized_name (str): Normalized restaurant name
+
+        Returns:
+            list: The name and its synonym variants owned by this shard
+        """
+        return [
+            key
+            for key in expand_variants(normalized_name, self.synonyms)
+            if self.owns_key(key)
+        ]
+
+    def owns_key(self, key):
+        """Check whether an index key belongs to the shard of this instance
+
+        Args:
+            key (str): Normalized index key
+
+        Returns:
+            bool: True if the key is indexed here
+        """
+        if self.shard_count == 1:
+            return True
+        return (
+            shard_of(key, self.shard_count, self.shard_prefix_length)
+            == self.shard_index
+        )
+
+    def serves_prefix(self, normalized_prefix):
+        """Check whether queries for a prefix are sent to this instance
+
+        Args:
+            normalized_prefix (str): Normalized prefix
+
+        Returns:
+            bool: True if the prefix is owned here or spans every shard
+        """
+        return (
+            len(normalized_prefix) < self.shard_prefix_length
+            or self.owns_key(normalized_prefix)
+        )
+
+    def add_restaurant(self, record, expected_id=None):
+        """Append a restaurant to the store and index it if the trie is built
+
+        Names do not have to be unique: every location of a chain gets its
+        own entry ID.
+
+        Args:
+            record (dict): Store row with a normalized display_name
+            expected_id (int, optional): Entry ID the restaurant must get,
+                so that copies of the store stay in step. If the same record
+                already has this ID, it is not added again.
+
+        Returns:
+            int: ID of the new entry
+
+        Raises:
+            EntryIdConflict: If the next entry ID is not expected_id
+        """
+        with self._add_lock:
+            if expected_id is not None and expected_id != len(self.store):
+                if expected_id < len(self.store) and all(
+                    self.store.row(expected_id)[name] == value
+                    for name, value in record.items()
+                ):
+                    return expected_id
+                raise EntryIdConflict(
+                    f"Expected entry ID {expected_id}, "
+                    f"the next entry ID is {len(self.store)}"
+                )
+            entry_id = self.store.append(record)
+            if self.is_initialized():
+                summary = entry_summary(
+                    record["is_open"], record["borough"], record["average_rating"]
+                )
+                self.index_name(record["display_name"], entry_id, summary)
+                if self.substring_index is not None:
+                    self.substring_index.add(record["display_name"], entry_id)
+                self._column_checksums = {
+                    name: value_checksum(record[name], type_code, checksum)
+                    for (name, type_code), checksum in zip(
+                        self.store.schema.items(), self._column_checksums.values()
+                    )
+                }
+                self.index_fingerprint = self._fingerprint()
+                self.index_version += 1
+                self.result_cache.clear()
+                if self.materialized.max_length > 0:
+                    self.refresh_materialized([record["display_name"]])
+        return entry_id
+
+    def refresh_materialized(self, normalized_names, replace=False):
+        """Recompute the materialized responses of the prefixes of some names
+
+        Every owned index key of the names (including synonym variants)
+        contributes its prefixes up to the materialized length. The responses
+        are rendered from the current index of this instance.
+
+        Args:
+            normalized_names (list): Normalized names whose prefixes changed
+            replace (bool, optional): Drop the responses of every other
+                prefix, after a full build. Defaults to False.
+        """
+        # Imported here: the autocomplete service depends on this module
+        from src.services.autocomplete_service import (
+            format_autocomplete_response,
+            get_autocomplete_results,
+        )
+
+        materialized = self.materialized
+        prefixes = set()
+        for name in normalized_names:
+            for key in self.owned_keys(name):
+                prefixes.update(materialized.prefixes(key))
+
+        def render(prefix, limit, expand):
+            results = get_autocomplete_results(
+                prefix, limit, expand=expand, trie_service=self
+            )
+            return format_autocomplete_response(
+                prefix, results, limit, trie_service=self
+            )
+
+        materialized.refresh(sorted(prefixes), render, self.index_version, replace)
+
+    def materialized_response(self, prefix, limit, expand):
+        """Return the serialized response of a query if it is materialized
+
+        Args:
+            prefix (str): Raw prefix of the query
+            limit (int): Result limit of the query
+            expand (int): Expanded result budget of the query
+
+        Returns:
+            bytes | None: The JSON response, or None if it must be computed
+        """
+        if self.materialized.max_length <= 0:
+            return None
+        return self.materialized.get(
+            prefix, normalize_text(prefix), limit, expand, self.index_version
+        )
+
+    def _checksum_columns(self):
+        """Compute the CRC32 of every column of the store
+
+        Returns:
+            dict: Mapping of column name to checksum, in schema order
+        """
+        checksums = {}
+        for name, type_code in self.store.schema.items():
+            if type_code == STRING_TYPE:
+                checksum = 0
+                for value in self.store.strings(name):
+                    checksum = value_checksum(value, type_code, checksum)
+            else:
+                checksum = zlib.crc32(self.store.column(name))
+            checksums[name] = checksum
+        return checksums
+
+    def _fingerprint(self):
+        """Checksum of the data and configuration the index is built from
+
+        It covers every column of the store (names, ratings and the filtered
+        attributes), the number of entries, the shard and the synonyms, so
+        processes serving the same data share the same fingerprint and their
+        ETags are interchangeable behind a shared cache. Column checksums are
+        updated incrementally by add_restaurant.
+
+        Returns:
+            str: Hexadecimal CRC32
+        """
+        identity = json.dumps(
+            [
+                len(self.store),
+                self._column_checksums,
+                [self.shard_index, self.shard_count, self.shard_prefix_length],
+                self.synonyms,
+            ],
+            sort_keys=True,
+        )
+        return f"{zlib.crc32(identity.encode('utf-8')):08x}"
+
+    def index_tag(self):
+        """Identity of the current index, changing whenever results may change
+
+        Returns:
+            str: Fingerprint of the data the index is built from
+        """
+        return self.index_fingerprint
+
     def is_initialized(self):
         """Check if the trie has been initialized
         
         Returns:
             bool: True if initialized, False otherwise
         """
-        return TrieService._is_initialized
+        return self._is_initialized
     
-    def search_prefix(self, prefix):
-        """Search for words with the given prefix
+    def search_prefix(self, prefix, attribute_filter=None):
+        """Search for entries with the given prefix
         
         Args:
             prefix (str): The prefix to search for
+            attribute_filter (AttributeFilter, optional): Prune subtrees that
+                cannot match the filter
             
         Returns:
-            list: List of words matching the prefix
+            list: IDs of the entries matching the prefix
         """
         if not self.is_initialized():
             return []
         
         # Normalize the prefix before searching
         normalized_prefix = normalize_text(prefix)
-        return self.trie.search_prefix(normalized_prefix)
+        return self.trie.search_prefix(normalized_prefix, attribute_filter)
+
+    def iter_prefix(self, prefix, attribute_filter=None):
+        """Lazily yield the entries with the given prefix, in index order
+
+        An entry indexed under several matching synonym variants is only
+        yielded under the first of them, so no set of seen entries is kept
+        and memory does not grow with the number of matches. On a sharded
+        deployment, that variant is owned by exactly one shard.
+
+        Args:
+            prefix (str): The prefix to search for
+            attribute_filter (AttributeFilter, optional): Prune subtrees that
+                cannot match the filter
+
+        Yields:
+            int: ID of a matching entry
+        """
+        if not self.is_initialized():
+            return
+
+        normalized_prefix = normalize_text(prefix)
+        trie = self.trie
+        for key, entry_id in trie.iter_prefix(normalized_prefix, attribute_filter):
+            if self.synonyms:
+                name = normalize_text(self.store.string("display_name", entry_id))
+                first_key = next(
+                    (
+                        variant
+                        for variant in expand_variants(name, self.synonyms)
+                        if variant.startswith(normalized_prefix)
+                    ),
+                    key,
+                )
+                if key != first_key:
+                    continue
+            yield entry_id
+
+    def iter_substring(self, query):
+        """Lazily yield the entries whose name contains the given text
+
+        Args:
+            query (str): The text to search for anywhere in the names
+
+        Yields:
+            int: ID of a matching entry
+        """
+        if not self.is_initialized() or self.substring_index is None:
+            return
+
+        yield from self.substring_index.iter_search(normalize_text(query))
+
+    def supports_top_k(self):
+        """Check whether the index answers top-K queries by rating itself
+
+        Returns:
+            bool: True if search_top can be used
+        """
+        return hasattr(self.trie, "top_k")
+
+    def search_top(self, prefix, limit, expand=0):
+        """Return the best entries of a prefix by rating count
+
+        Only available when supports_top_k() is True.
+
+        Args:
+            prefix (str): The prefix to search for
+            limit (int): Number of entries to return, 0 for all
+            expand (int, optional): Return every entry if there are at most
+                this many. Defaults to 0.
+
+        Returns:
+            tuple: (entry IDs ranked by rating count, number of entries
+                matching the prefix)
+        """
+        if not self.is_initialized():
+            return [], 0
+
+        normalized_prefix = normalize_text(prefix)
+        return self.trie.top_k(
+            normalized_prefix,
+            limit,
+            self.store.column("user_rating_count"),
+            expand,
+        )
+
+    def supports_substring(self):
+        """Check whether substring queries can be answered
+
+        Returns:
+            bool: True if the suffix array of the names is built
+        """
+        return self.substring_index is not None
+
+    def search_substring(self, query):
+        """Search for entries whose name contains the given text
+
+        Args:
+            query (str): The text to search for anywhere in the names
+
+        Returns:
+            list: IDs of the matching entries
+        """
+        if not self.is_initialized() or self.substring_index is None:
+            return []
+
+        return self.substring_index.search(normalize_text(query))
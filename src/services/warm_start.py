@@ -0,0 +1,87 @@
+"""
+Automatic loading of the index at application startup
+"""
+
+import threading
+import time
+
+from src.services.autocomplete_service import warm_autocomplete_cache
+from src.services.trie_service import TrieService
+
+# State of the startup load, reported by the readiness endpoint
+_state = {"status": "idle", "message": None, "duration_s": None}
+_lock = threading.Lock()
+
+
+def get_warm_start_state():
+    """Return a copy of the startup load state
+
+    Returns:
+        dict: status ("idle", "loading", "ready" or "failed"), message and
+            duration_s of the startup load
+    """
+    with _lock:
+        return dict(_state)
+
+
+def _set_state(**values):
+    with _lock:
+        _state.update(values)
+
+
+def warm_start(num_names=100, max_prefix_length=3):
+    """Build the index and pre-warm the hottest prefixes
+
+    Args:
+        num_names (int, optional): Number of top-rated names whose prefixes
+            are warmed. Defaults to 100.
+        max_prefix_length (int, optional): Longest prefix warmed per name.
+            Defaults to 3.
+
+    Returns:
+        dict: Final startup load state
+    """
+    _set_state(status="loading", message="Building index", duration_s=None)
+    start = time.perf_counter()
+
+    result = TrieService.get_instance().build_trie()
+    if result["status"] == "error":
+        _set_state(
+            status="failed",
+            message=result["message"],
+            duration_s=round(time.perf_counter() - start, 3),
+        )
+        return get_warm_start_state()
+
+    warmed = warm_autocomplete_cache(num_names, max_prefix_length)
+    _set_state(
+        status="ready",
+        message=f"{result['message']}, {warmed} prefixes pre-warmed",
+        duration_s=round(time.perf_counter() - start, 3),
+    )
+    return get_warm_start_state()
+
+
+def start_warm_start_thread(num_names=100, max_prefix_length=3):
+    """Run warm_start in a background thread
+
+    The server keeps answering liveness probes while the index loads.
+
+    Args:
+        num_names (int, optional): Number of top-rated names whose prefixes
+            are warmed. Defaults to 100.
+        max_prefix_length (int, optional): Longest prefix warmed per name.
+            Defaults to 3.
+
+    Returns:
+        threading.Thread: The started thread
+    """
+    _set_state(status="loading", message="Building index", duration_s=None)
+    thread = threading.Thread(
+        target=warm_start,
+        args=(num_names, max_prefix_length),
+        name="warm-start",
+        daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,35 @@
+"""
+Protocol helpers of the autocomplete API shared by the backend and the shard
+router
+
+The router imports only this module, not the serving stack (services,
+indexes and NumPy), to stay a lightweight process.
+"""
+
+# Upper bound of the expanded result budget a client can ask for
+MAX_EXPAND = 200
+
+# Largest number of suggestions sent per chunk of a streamed response
+STREAM_BATCH_SIZE = 256
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header against an ETag (weak comparison)
+
+    Args:
+        if_none_match (str): Value of the If-None-Match header
+        etag (str): Current ETag of the resource
+
+    Returns:
+        bool: True if the client's copy is still current
+    """
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == current:
+            return True
+    return False
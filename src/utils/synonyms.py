@@ -0,0 +1,91 @@
+"""
+Synonym and abbreviation expansion of restaurant names at index time
+"""
+
+import itertools
+import json
+
+# Groups of interchangeable words. A name is indexed under every combination
+# of the alternatives of its words, so "st marks pizza" also matches the
+# name "saint marks pizza" without any extra work at query time. Single
+# letters are only abbreviations with their trailing period: a bare "e" or
+# "n" is too common in names to stand for "east" or "and".
+DEFAULT_SYNONYMS = [
+    ["saint", "st", "st."],
+    ["street", "st", "st."],
+    ["avenue", "ave", "ave."],
+    ["and", "&"],
+    ["barbecue", "bbq", "bar-b-q"],
+    ["brothers", "bros", "bros."],
+    ["company", "co", "co."],
+    ["restaurant", "rest."],
+    ["mount", "mt", "mt."],
+    ["east", "e."],
+    ["west", "w."],
+]
+
+# Maximum number of keys a single name is indexed under, including itself
+MAX_VARIANTS = 16
+
+
+def load_synonyms(path=None):
+    """Load synonym groups from a JSON file
+
+    Args:
+        path (str, optional): Path to a JSON list of word groups. Defaults to
+            the built-in DEFAULT_SYNONYMS.
+
+    Words in several groups, such as "st" for both "saint" and "street", are
+    ambiguous: they are alternatives of the words of each of their groups,
+    but are not replaced themselves, so a name is never indexed under both
+    meanings.
+
+    Returns:
+        dict: Mapping of each word to the other words it can be replaced with
+    """
+    groups = DEFAULT_SYNONYMS
+    if path:
+        with open(path) as f:
+            groups = json.load(f)
+    groups = [[word.lower() for word in group] for group in groups]
+
+    group_counts = {}
+    for words in groups:
+        for word in set(words):
+            group_counts[word] = group_counts.get(word, 0) + 1
+
+    alternatives = {}
+    for words in groups:
+        for word in words:
+            if group_counts[word] > 1:
+                continue
+            others = alternatives.setdefault(word, [])
+            others.extend(w for w in words if w != word and w not in others)
+    return alternatives
+
+
+def expand_variants(name, alternatives, max_variants=MAX_VARIANTS):
+    """Return the keys a normalized name should be indexed under
+
+    Args:
+        name (str): Normalized restaurant name
+        alternatives (dict): Mapping returned by load_synonyms
+        max_variants (int, optional): Maximum number of keys returned.
+            Defaults to MAX_VARIANTS.
+
+    Returns:
+        list: The name itself first, followed by its distinct variants
+    """
+    words = name.split(" ")
+    choices = [[word] + alternatives.get(word, []) for word in words]
+    if all(len(options) == 1 for options in choices):
+        return [name]
+
+    variants = []
+    for combination in itertools.product(*choices):
+        variant = " ".join(combination)
+        if variant not in variants:
+            variants.append(variant)
+        if len(variants) >= max_variants:
+            break
+    return variants
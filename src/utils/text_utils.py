@@ -15,7 +15,7 @@ def normalize_text(text):
         return text
 
     # Replace various apostrophe types with a standard apostrophe
-    apostrophe_variants = ["'", "`", "´", "′", "'"]
+    apostrophe_variants = ["`", "´", "′", "’"]
     normalized = text.lower()
     for variant in apostrophe_variants:
         normalized = normalized.replace(variant, "'")
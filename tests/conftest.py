@@ -0,0 +1,69 @@
+"""
+Shared fixtures: autocomplete indexes built from temporary datasets
+"""
+
+import itertools
+import json
+
+import pandas as pd
+import pytest
+
+from src.services.trie_service import TrieService
+
+
+@pytest.fixture
+def build_index(tmp_path, monkeypatch):
+    """Return a factory building a TrieService over a dataset
+
+    The service is installed as the singleton, so the autocomplete functions
+    query it, and is removed again after the test.
+
+    The factory takes (rows, trie_mode, synonyms=False, csv_path=None,
+    substring_index=True, materialize_length=0, shard_index=0,
+    shard_count=1), where rows is a list of (display_name,
+    user_rating_count) written to a temporary CSV unless csv_path points to
+    an existing one. Synonym expansion is disabled unless synonyms is True.
+    """
+    monkeypatch.setattr(TrieService, "_instance", None)
+    monkeypatch.setattr(TrieService, "_is_initialized", False)
+    counter = itertools.count()
+
+    def factory(
+        rows,
+        trie_mode,
+        synonyms=False,
+        csv_path=None,
+        substring_index=True,
+        materialize_length=0,
+        shard_index=0,
+        shard_count=1,
+    ):
+        synonyms_path = None
+        if not synonyms:
+            synonyms_path = tmp_path / "no_synonyms.json"
+            synonyms_path.write_text(json.dumps([]))
+        service = TrieService(
+            trie_mode,
+            str(synonyms_path) if synonyms_path else None,
+            shard_index=shard_index,
+            shard_count=shard_count,
+            substring_index=substring_index,
+            materialize_length=materialize_length,
+        )
+
+        name = f"restaurants_{trie_mode}_{next(counter)}"
+        if csv_path is None:
+            csv_path = tmp_path / f"{name}.csv"
+            pd.DataFrame(rows, columns=["display_name", "user_rating_count"]).to_csv(
+                csv_path, index=False
+            )
+        service.csv_path = str(csv_path)
+        service.data_path = str(tmp_path / f"{name}.store")
+
+        TrieService._instance = service
+        TrieService._is_initialized = False
+        result = service.build_trie()
+        assert result["status"] == "success", result["message"]
+        return service
+
+    return factory
@@ -0,0 +1,128 @@
+"""
+Frozen copy of the original search pipeline, used as a reference oracle
+
+Trie and join_results_with_user_rating_count are copied verbatim from the
+first version of src/models/trie.py and src/data/data_loader.py. Do not
+change them: faster engines and ranking paths are validated against them.
+"""
+
+import pandas as pd
+
+from src.utils.text_utils import normalize_text
+
+
+class TrieNode:
+    def __init__(self):
+        self.children = {}  # Use dictionary instead of fixed array
+        self.isLeaf = False
+
+
+class Trie:
+    def __init__(self):
+        self.root = TrieNode()
+
+    # Method to insert a key into the Trie
+    def insert(self, key):
+        curr = self.root
+        for c in key:
+            if c not in curr.children:
+                curr.children[c] = TrieNode()
+            curr = curr.children[c]
+        curr.isLeaf = True
+
+    # Method to search for words with a given prefix
+    def search_prefix(self, prefix):
+        """
+        Returns a list of all words in the Trie that start with the given prefix.
+
+        Args:
+            prefix (str): The prefix to search for
+
+        Returns:
+            list: List of complete words starting with the prefix
+        """
+        # First, navigate to the end of the prefix
+        curr = self.root
+        for c in prefix:
+            if c not in curr.children:
+                return []  # Prefix not found
+            curr = curr.children[c]
+
+        # Now collect all words starting from this node
+        words = []
+        self._collect_words(curr, prefix, words)
+        return words
+
+    def _collect_words(self, node, current_word, words):
+        """
+        Helper method to recursively collect all words from a given node.
+
+        Args:
+            node (TrieNode): Current node in the Trie
+            current_word (str): Word built so far
+            words (list): List to store found words
+        """
+        # If this node marks the end of a word, add it to results
+        if node.isLeaf:
+            words.append(current_word)
+
+        # Recursively check all children
+        for char in node.children:
+            self._collect_words(node.children[char], current_word + char, words)
+
+
+def join_results_with_user_rating_count(all_words_starting_w_prefix, data_path):
+    """Extract subset of the restaurant names df with user rating count
+
+    Args:
+        all_words_starting_w_prefix (list): List of restaurant names matching the prefix
+        data_path (str): Path to the CSV file with restaurant data
+
+    Returns:
+        DataFrame: Ordered results matching the prefix, sorted by user_rating_count
+    """
+    all_restaurants = pd.read_csv(data_path)
+
+    # Filter restaurants that match our prefix results
+    # Use .isin() method for filtering a list of values
+    subset_with_prefix = all_restaurants[
+        all_restaurants["display_name"].isin(all_words_starting_w_prefix)
+    ]
+
+    # Sort by user_rating_count in descending order
+    ordered_results = subset_with_prefix.sort_values(
+        by="user_rating_count", ascending=False
+    )
+
+    return ordered_results
+
+
+def build_reference_trie(names):
+    """Build the original trie the way the original TrieService did
+
+    Args:
+        names (list): Restaurant names
+
+    Returns:
+        Trie: Trie of the normalized names
+    """
+    trie = Trie()
+    for name in names:
+        trie.insert(normalize_text(name))
+    return trie
+
+
+def reference_results(trie, prefix, data_path):
+    """Run the original search and join for a prefix, without a limit
+
+    Args:
+        trie (Trie): Trie returned by build_reference_trie
+        prefix (str): The prefix to search for
+        data_path (str): Path to the CSV file the trie was built from
+
+    Returns:
+        DataFrame: Every match ordered by user_rating_count, indexed by the
+            CSV row (the entry ID of the current pipeline)
+    """
+    words = trie.search_prefix(normalize_text(prefix))
+    return join_results_with_user_rating_count(words, data_path)
@@ -0,0 +1,32 @@
+"""
+Tests of the borough codes derived from borough names and addresses
+"""
+
+import pytest
+
+from src.models.attribute_filter import BOROUGHS, borough_code
+
+
+@pytest.mark.parametrize(
+    "text, borough",
+    [
+        ("Brooklyn", "brooklyn"),
+        ("staten island", "staten island"),
+        ("350 5th Ave, New York, NY 10118, USA", "manhattan"),
+        ("1 E 161st St, Bronx, NY 10451, USA", "bronx"),
+        ("1 E 161st St, The Bronx, NY 10451", "bronx"),
+        # Street names are not the locality
+        ("12 Brooklyn Ave, Queens", "queens"),
+        ("10 Manhattan Ave, Brooklyn, NY 11206, USA", "brooklyn"),
+        ("200 Queens Blvd, New York, NY 10011", "manhattan"),
+        # Neighborhood localities are resolved by ZIP code
+        ("37-02 Main St, Flushing, NY 11354, USA", "queens"),
+        ("1 Bay St, Saint George, NY 10301-1234", "staten island"),
+        ("1 Main St, Hempstead, NY 11550, USA", "unknown"),
+        ("1 Main St, Buffalo, NY 14202, USA", "unknown"),
+        ("", "unknown"),
+        (None, "unknown"),
+    ],
+)
+def test_borough_code(text, borough):
+    assert BOROUGHS[borough_code(text)] == borough
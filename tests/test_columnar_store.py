@@ -0,0 +1,68 @@
+"""
+Crash consistency of the columnar store: interrupted appends and replacements
+"""
+
+import os
+from array import array
+
+from src.data.columnar_store import OLD_SUFFIX, ColumnarStore
+
+SCHEMA = {"name": "s", "count": "q", "flag": "B"}
+
+
+def create_store(path):
+    return ColumnarStore.create(
+        str(path), {"name": ["alpha", "beta"], "count": [1, 2], "flag": [0, 1]}, SCHEMA
+    )
+
+
+def append_bytes(path, data):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def test_interrupted_append_is_discarded(tmp_path):
+    path = tmp_path / "store"
+    create_store(path)
+    # A third row stopped after its name bytes and its count
+    append_bytes(path / "name.data", "gamma".encode("utf-8"))
+    append_bytes(path / "count.col", array("q", [3]).tobytes())
+
+    store = ColumnarStore(str(path))
+    assert len(store) == 2
+    assert os.path.getsize(path / "name.data") == len("alphabeta")
+    assert os.path.getsize(path / "count.col") == 2 * 8
+
+    store.append({"name": "delta", "count": 4, "flag": 1})
+    assert store.rows() == [
+        {"name": "alpha", "count": 1, "flag": 0},
+        {"name": "beta", "count": 2, "flag": 1},
+        {"name": "delta", "count": 4, "flag": 1},
+    ]
+
+
+def test_append_overwrites_leftovers(tmp_path):
+    store = create_store(tmp_path / "store")
+    # Leftovers written while the store is open are overwritten, not built on
+    append_bytes(tmp_path / "store" / "name.data", b"orphan")
+    append_bytes(tmp_path / "store" / "flag.col", b"\x07")
+
+    assert store.append({"name": "gamma", "count": 3, "flag": 0}) == 2
+    assert store.row(2) == {"name": "gamma", "count": 3, "flag": 0}
+    assert store.strings("name") == ["alpha", "beta", "gamma"]
+
+
+def test_interrupted_replace_restores_previous_store(tmp_path):
+    path = tmp_path / "store"
+    create_store(path)
+    # Stopped after renaming the store aside, before moving the new one in
+    os.replace(path, str(path) + OLD_SUFFIX)
+
+    assert ColumnarStore.exists(str(path))
+    assert ColumnarStore(str(path)).strings("name") == ["alpha", "beta"]
+
+    store = ColumnarStore.create(
+        str(path), {"name": ["omega"], "count": [9], "flag": [1]}, SCHEMA
+    )
+    assert store.rows() == [{"name": "omega", "count": 9, "flag": 1}]
+    assert not os.path.exists(str(path) + OLD_SUFFIX)
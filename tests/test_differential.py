@@ -0,0 +1,643 @@
+"""
+Differential tests of the autocomplete pipeline against the original one
+
+Random datasets and prefixes are generated from fixed seeds, and every
+engine in TRIE_MODES must return the same matches, in the same rating order
+and with the same total count, as the frozen original Trie plus
+join_results_with_user_rating_count (see reference.py). Substring queries
+are checked against a scan of every name, filtered queries against a
+brute-force filter of every entry, synonym expansion against a scan of the
+variants of every name, sharded deployments against a single index,
+streamed responses against the unlimited results, and materialized
+responses against computed ones.
+
+The original pipeline sorts with an unstable sort, so entries with equal
+rating counts may come in any order: ties are compared as sets, and a tie
+group cut by the limit only has to be a subset of the reference group.
+"""
+
+import json
+import random
+
+import pandas as pd
+import pytest
+
+from reference import (
+    build_reference_trie,
+    join_results_with_user_rating_count,
+    reference_results,
+)
+from src.models import suffix_array
+from src.models.attribute_filter import BOROUGHS, AttributeFilter
+from src.services.autocomplete_service import (
+    FRONTEND_EXPAND,
+    format_autocomplete_response,
+    get_autocomplete_results,
+    stream_autocomplete_results,
+)
+from src.services.sharding import (
+    SUBSTRING_SHARD,
+    merge_autocomplete_responses,
+    shard_for_prefix,
+)
+from src.services.trie_service import TRIE_MODES
+from src.utils.synonyms import expand_variants
+from src.utils.text_utils import normalize_text
+
+SEEDS = range(12)
+LIMITS = [0, 1, 3, 10, 50]
+EXPAND = 20
+
+# Short syllables over a small alphabet, so names share many prefixes
+SYLLABLES = ["a", "ab", "an", "ba", "be", "ca", "co", "da", "é", "la", "ma", "o'"]
+
+# Words of the built-in synonym groups, so names have variants
+SYNONYM_WORDS = ["saint", "st", "street", "and", "&", "bbq", "e.", "east", "co", "n"]
+
+# Values pandas reads back from a CSV as missing
+NA_NAMES = {"na", "nan", "null", "none", "n/a"}
+
+
+def random_name(rng):
+    """Return a random normalized restaurant name of one to three words"""
+    words = [
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+        for _ in range(rng.randint(1, 3))
+    ]
+    return " ".join(words)
+
+
+def random_dataset(rng, size):
+    """Return (display_name, user_rating_count) rows with duplicate names
+    and many tied rating counts"""
+    rows = []
+    while len(rows) < size:
+        if rows and rng.random() < 0.1:
+            name = rng.choice(rows)[0]
+        else:
+            name = random_name(rng)
+        if name in NA_NAMES:
+            continue
+        rating = rng.choice([0, 1, 5, 5, 10, 10, rng.randint(0, 100_000)])
+        rows.append((name, rating))
+    return rows
+
+
+def random_synonym_dataset(rng, size):
+    """Return rows whose names mix random words with synonym words"""
+    rows = random_dataset(rng, size)
+    for i, (name, rating) in enumerate(rows):
+        words = name.split(" ")
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randint(0, len(words)), rng.choice(SYNONYM_WORDS))
+        rows[i] = (" ".join(words), rating)
+    return rows
+
+
+def random_prefixes(rng, rows, count):
+    """Return prefixes of existing names, unknown prefixes and edge cases"""
+    prefixes = ["", " ", "a", "zz"]
+    while len(prefixes) < count:
+        kind = rng.random()
+        if rows and kind < 0.7:
+            name = rng.choice(rows)[0]
+            prefix = name[: rng.randint(1, len(name) + 1)]
+        elif kind < 0.85:
+            prefix = random_name(rng)[: rng.randint(1, 6)]
+        else:
+            prefix = "".join(rng.choice("abcdé' z") for _ in range(rng.randint(1, 4)))
+        # The original pipeline normalizes case and apostrophes of queries too
+        if rng.random() < 0.2:
+            prefix = prefix.upper().replace("'", "’")
+        prefixes.append(prefix)
+    return prefixes
+
+
+def random_substrings(rng, rows, count):
+    """Return fragments from anywhere in existing names, and unknown ones"""
+    substrings = ["", " ", "a", "zz"]
+    while len(substrings) < count:
+        if rows and rng.random() < 0.8:
+            name = rng.choice(rows)[0]
+            start = rng.randint(0, len(name))
+            substring = name[start : start + rng.randint(1, 5)]
+        else:
+            substring = "".join(
+                rng.choice("abcdé' z") for _ in range(rng.randint(1, 4))
+            )
+        if rng.random() < 0.2:
+            substring = substring.upper().replace("'", "’")
+        substrings.append(substring)
+    return substrings
+
+
+def substring_reference(rows, substring, csv_path):
+    """Return every entry whose name contains substring, by rating count"""
+    query = normalize_text(substring)
+    names = {name for name, _ in rows if query in normalize_text(name)}
+    return join_results_with_user_rating_count(names, csv_path)
+
+
+def random_attributes(rng):
+    """Return random (average_rating, is_open, borough) attributes"""
+    average_rating = rng.choice([0.0, 1.0, 3.5, 4.2, 5.0, round(rng.uniform(1, 5), 1)])
+    return average_rating, rng.randint(0, 1), rng.randrange(len(BOROUGHS))
+
+
+def random_filter(rng):
+    """Return a random non-empty AttributeFilter"""
+    while True:
+        attribute_filter = AttributeFilter(
+            open_only=rng.random() < 0.5,
+            boroughs=rng.sample(BOROUGHS[1:], rng.choice([0, 0, 1, 2])),
+            min_rating=rng.choice([None, None, 0.0, 3.5, 4.2, 5.0]),
+        )
+        if not attribute_filter.is_empty():
+            return attribute_filter
+
+
+def filter_reference(entries, prefix, attribute_filter):
+    """Return every entry matching a prefix and a filter, by rating count
+
+    Args:
+        entries (list): (display_name, user_rating_count, average_rating,
+            is_open, borough) tuples, indexed by entry ID
+        prefix (str): The prefix to search for
+        attribute_filter (AttributeFilter): Filter of the query
+
+    Returns:
+        DataFrame: The matches in the format of reference_results
+    """
+    query = normalize_text(prefix)
+    df = pd.DataFrame(
+        entries,
+        columns=[
+            "display_name",
+            "user_rating_count",
+            "average_rating",
+            "is_open",
+            "borough",
+        ],
+    )
+    keep = [
+        normalize_text(name).startswith(query)
+        and attribute_filter.matches(is_open, borough, average_rating)
+        for name, _, average_rating, is_open, borough in entries
+    ]
+    return df[keep].sort_values(by="user_rating_count", ascending=False)
+
+
+def synonym_reference(rows, prefix, alternatives):
+    """Return every entry with a variant starting with prefix, by rating count
+
+    Args:
+        rows (list): (display_name, user_rating_count) rows
+        prefix (str): The prefix to search for
+        alternatives (dict): Synonyms the names are expanded with
+
+    Returns:
+        DataFrame: The matches in the format of reference_results
+    """
+    query = normalize_text(prefix)
+    df = pd.DataFrame(rows, columns=["display_name", "user_rating_count"])
+    keep = [
+        any(
+            variant.startswith(query)
+            for variant in expand_variants(normalize_text(name), alternatives)
+        )
+        for name, _ in rows
+    ]
+    return df[keep].sort_values(by="user_rating_count", ascending=False)
+
+
+def assert_matches_reference(results, reference_df, limit, expand=0):
+    """Check results of the current pipeline against the reference results
+
+    Args:
+        results (AutocompleteResults): Output of get_autocomplete_results
+        reference_df (DataFrame): Output of reference_results
+        limit (int): Limit the results were computed with, 0 for none
+        expand (int, optional): Expanded result budget of the query
+    """
+    expected_count = len(reference_df)
+    expected_length = expected_count
+    if limit > 0 and expected_count > expand:
+        expected_length = min(limit, expected_count)
+    assert results.total_count == expected_count
+    assert len(results) == expected_length
+
+    ids = [record["id"] for record in results]
+    ratings = [record["user_rating_count"] for record in results]
+    expected_ratings = reference_df["user_rating_count"].tolist()
+    assert ratings == expected_ratings[:expected_length]
+
+    tie_groups = {}
+    for entry_id, rating in zip(reference_df.index, expected_ratings):
+        tie_groups.setdefault(rating, set()).add(entry_id)
+    for entry_id, rating in zip(ids, ratings):
+        assert entry_id in tie_groups[rating]
+    assert len(set(ids)) == len(ids)
+
+    names = reference_df["display_name"]
+    assert [record["display_name"] for record in results] == [names[i] for i in ids]
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matches_reference_on_random_datasets(build_index, trie_mode, seed):
+    rng = random.Random(seed)
+    rows = random_dataset(rng, rng.choice([1, 10, 50, 200, 400]))
+    service = build_index(rows, trie_mode)
+    reference_trie = build_reference_trie(name for name, _ in rows)
+
+    for prefix in random_prefixes(rng, rows, 40):
+        reference_df = reference_results(reference_trie, prefix, service.csv_path)
+        for limit in LIMITS:
+            results = get_autocomplete_results(prefix, limit)
+            assert_matches_reference(results, reference_df, limit)
+        results = get_autocomplete_results(prefix, 3, expand=EXPAND)
+        assert_matches_reference(results, reference_df, 3, EXPAND)
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("seed", SEEDS[:4])
+def test_matches_reference_after_incremental_adds(
+    build_index, tmp_path, trie_mode, seed
+):
+    rng = random.Random(seed)
+    rows = random_dataset(rng, 100)
+    added = random_dataset(rng, 20)
+    service = build_index(rows, trie_mode)
+    for name, rating in added:
+        service.add_restaurant(
+            {
+                "display_name": name,
+                "user_rating_count": rating,
+                "average_rating": 0.0,
+                "is_open": 0,
+                "borough": 0,
+            }
+        )
+
+    # Added entries get the next IDs, which are their rows in this CSV
+    csv_path = tmp_path / "reference.csv"
+    pd.DataFrame(rows + added, columns=["display_name", "user_rating_count"]).to_csv(
+        csv_path, index=False
+    )
+    reference_trie = build_reference_trie(name for name, _ in rows + added)
+
+    for prefix in random_prefixes(rng, rows + added, 40):
+        reference_df = reference_results(reference_trie, prefix, csv_path)
+        for limit in LIMITS:
+            results = get_autocomplete_results(prefix, limit)
+            assert_matches_reference(results, reference_df, limit)
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("seed", SEEDS[:6])
+def test_filtered_results_match_brute_force(
+    build_index, tmp_path, monkeypatch, trie_mode, seed
+):
+    rng = random.Random(seed)
+    rows = random_dataset(rng, rng.choice([10, 50, 200, 400]))
+    entries = [row + random_attributes(rng) for row in rows]
+    csv_path = tmp_path / "attributes.csv"
+    pd.DataFrame(
+        entries,
+        columns=[
+            "display_name",
+            "user_rating_count",
+            "average_rating",
+            "is_open",
+            "borough",
+        ],
+    ).to_csv(csv_path, index=False)
+    service = build_index(rows, trie_mode, csv_path=csv_path)
+
+    # Count the subtrees the summaries let the search skip
+    pruned = []
+    matches_summary = AttributeFilter.matches_summary
+
+    def counting_matches_summary(self, mask, max_rating):
+        match = matches_summary(self, mask, max_rating)
+        if not match:
+            pruned.append(mask)
+        return match
+
+    monkeypatch.setattr(AttributeFilter, "matches_summary", counting_matches_summary)
+
+    def check(prefixes):
+        for prefix in prefixes:
+            attribute_filter = random_filter(rng)
+            reference_df = filter_reference(entries, prefix, attribute_filter)
+            for limit in LIMITS:
+                results = get_autocomplete_results(
+                    prefix, limit, attribute_filter=attribute_filter
+                )
+                assert_matches_reference(results, reference_df, limit)
+            body = b"".join(stream_autocomplete_results(prefix, 0, attribute_filter))
+            ids = [json.loads(line)["id"] for line in body.decode().splitlines()]
+            assert sorted(ids) == sorted(reference_df.index)
+
+    check(random_prefixes(rng, rows, 30))
+
+    # Added entries update the summaries of their paths
+    added = [row + random_attributes(rng) for row in random_dataset(rng, 20)]
+    for name, rating, average_rating, is_open, borough in added:
+        service.add_restaurant(
+            {
+                "display_name": name,
+                "user_rating_count": rating,
+                "average_rating": average_rating,
+                "is_open": is_open,
+                "borough": borough,
+            }
+        )
+    entries += added
+    check(random_prefixes(rng, rows + added, 30))
+    assert pruned
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("seed", SEEDS[:6])
+def test_synonym_variants_match_scan(build_index, trie_mode, seed):
+    rng = random.Random(seed)
+    rows = random_synonym_dataset(rng, rng.choice([10, 50, 200]))
+    service = build_index(rows, trie_mode, synonyms=True)
+    prefixes = random_prefixes(rng, rows, 30) + ["s", "st", "saint", "east", "&"]
+    for prefix in prefixes:
+        reference_df = synonym_reference(rows, prefix, service.synonyms)
+        for limit in LIMITS:
+            results = get_autocomplete_results(prefix, limit)
+            assert_matches_reference(results, reference_df, limit)
+        results = get_autocomplete_results(prefix, 3, expand=EXPAND)
+        assert_matches_reference(results, reference_df, 3, EXPAND)
+
+
+def sharded_response(shards, prefix, limit, expand):
+    """Answer a query the way the shard router does
+
+    Args:
+        shards (list): TrieService of every shard, by shard index
+        prefix (str): The prefix to search for
+        limit (int): Maximum number of results
+        expand (int): Expanded result budget
+
+    Returns:
+        dict: Response of the shard owning the prefix, or the merged
+            responses of every shard
+    """
+
+    def shard_response(service):
+        results = get_autocomplete_results(
+            prefix, limit, expand=expand, trie_service=service
+        )
+        return format_autocomplete_response(prefix, results, limit, service)
+
+    shard = shard_for_prefix(
+        normalize_text(prefix), len(shards), shards[0].shard_prefix_length
+    )
+    if shard is not None:
+        return shard_response(shards[shard])
+    responses = [shard_response(service) for service in shards]
+    return merge_autocomplete_responses(prefix, responses, limit, expand)
+
+
+def sorted_suggestions(response):
+    """Return the suggestions of a response by rating count, then ID"""
+    return sorted(response["suggestions"], key=lambda s: (-s["rating_count"], s["id"]))
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("shard_count", [2, 3])
+@pytest.mark.parametrize("seed", SEEDS[:4])
+def test_sharded_results_match_single_index(build_index, trie_mode, shard_count, seed):
+    rng = random.Random(seed)
+    rows = random_synonym_dataset(rng, rng.choice([10, 50, 200]))
+    shards = [
+        build_index(
+            rows,
+            trie_mode,
+            synonyms=True,
+            shard_index=shard_index,
+            shard_count=shard_count,
+        )
+        for shard_index in range(shard_count)
+    ]
+    build_index(rows, trie_mode, synonyms=True)
+
+    prefixes = random_prefixes(rng, rows, 30) + ["s", "st", "saint", "&"]
+    for prefix in prefixes:
+        reference_df = synonym_reference(rows, prefix, shards[0].synonyms)
+        for limit, expand in [(0, 0), (1, 0), (10, 0), (3, EXPAND)]:
+            response = sharded_response(shards, prefix, limit, expand)
+            expected = format_autocomplete_response(
+                prefix, get_autocomplete_results(prefix, limit, expand=expand), limit
+            )
+            assert response["complete"] == expected["complete"]
+            if expected["complete"]:
+                assert response["total_count"] == expected["total_count"]
+                # Ties may come in any order
+                assert sorted_suggestions(response) == sorted_suggestions(expected)
+            else:
+                # Duplicates outside of the shards' top results are unknown
+                assert response["total_count"] >= expected["total_count"]
+                ratings = [s["rating_count"] for s in response["suggestions"]]
+                assert ratings == [s["rating_count"] for s in expected["suggestions"]]
+                for suggestion in response["suggestions"]:
+                    entry = reference_df.loc[suggestion["id"]]
+                    assert entry["display_name"] == suggestion["name"]
+
+
+@pytest.mark.parametrize("seed", SEEDS[:3])
+def test_substring_shard_matches_scan(build_index, monkeypatch, seed):
+    monkeypatch.delenv("AUTOCOMPLETE_SUBSTRING_INDEX", raising=False)
+    rng = random.Random(seed)
+    rows = random_dataset(rng, rng.choice([50, 200]))
+    shards = [
+        build_index(
+            rows,
+            "standard",
+            substring_index=None,
+            shard_index=shard_index,
+            shard_count=3,
+        )
+        for shard_index in range(3)
+    ]
+    # Only the designated shard builds the suffix array, over all the names
+    assert [service.supports_substring() for service in shards] == [
+        shard_index == SUBSTRING_SHARD for shard_index in range(3)
+    ]
+    for substring in random_substrings(rng, rows, 20):
+        reference_df = substring_reference(rows, substring, shards[0].csv_path)
+        for limit in LIMITS:
+            results = get_autocomplete_results(
+                substring,
+                limit,
+                mode="substring",
+                trie_service=shards[SUBSTRING_SHARD],
+            )
+            assert_matches_reference(results, reference_df, limit)
+
+
+@pytest.mark.parametrize("seed", SEEDS[:6])
+def test_substring_mode_matches_scan(build_index, tmp_path, monkeypatch, seed):
+    rng = random.Random(seed)
+    rows = random_dataset(rng, rng.choice([10, 50, 200]))
+    service = build_index(rows, "standard")
+    for substring in random_substrings(rng, rows, 40):
+        reference_df = substring_reference(rows, substring, service.csv_path)
+        for limit in LIMITS:
+            results = get_autocomplete_results(substring, limit, mode="substring")
+            assert_matches_reference(results, reference_df, limit)
+
+    # Added entries are matched before, during and after the background
+    # rebuilds of the suffix array
+    monkeypatch.setattr(suffix_array, "MAX_PENDING", 4)
+    added = random_dataset(rng, 20)
+    for name, rating in added:
+        service.add_restaurant(
+            {
+                "display_name": name,
+                "user_rating_count": rating,
+                "average_rating": 0.0,
+                "is_open": 0,
+                "borough": 0,
+            }
+        )
+    csv_path = tmp_path / "reference.csv"
+    pd.DataFrame(rows + added, columns=["display_name", "user_rating_count"]).to_csv(
+        csv_path, index=False
+    )
+    substrings = random_substrings(rng, rows + added, 40)
+    for substring in substrings:
+        reference_df = substring_reference(rows + added, substring, csv_path)
+        results = get_autocomplete_results(substring, 10, mode="substring")
+        assert_matches_reference(results, reference_df, 10)
+
+    service.substring_index.join()
+    for substring in substrings:
+        reference_df = substring_reference(rows + added, substring, csv_path)
+        results = get_autocomplete_results(substring, 10, mode="substring")
+        assert_matches_reference(results, reference_df, 10)
+
+
+def streamed_ids(prefix, limit=0, mode="prefix"):
+    """Return the entry IDs of a streamed NDJSON response"""
+    body = b"".join(stream_autocomplete_results(prefix, limit, mode=mode))
+    return [json.loads(line)["id"] for line in body.decode("utf-8").splitlines()]
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("seed", SEEDS[:4])
+def test_stream_matches_unlimited_results(build_index, trie_mode, seed):
+    rng = random.Random(seed)
+    # Words with synonyms, so entries are indexed under several keys
+    rows = random_dataset(rng, 150) + [
+        ("saint marks", 5),
+        ("st marks place", 10),
+        ("bar and grill", 1),
+        ("ma & pa", 3),
+    ]
+    build_index(rows, trie_mode, synonyms=True)
+    prefixes = random_prefixes(rng, rows, 30) + ["s", "st", "saint", "bar &"]
+    for prefix in prefixes:
+        expected = get_autocomplete_results(prefix, 0)
+        ids = streamed_ids(prefix)
+        assert len(ids) == len(set(ids))
+        assert set(ids) == {record["id"] for record in expected}
+        assert streamed_ids(prefix, 3) == ids[:3]
+
+    for substring in random_substrings(rng, rows, 20):
+        expected = get_autocomplete_results(substring, 0, mode="substring")
+        ids = streamed_ids(substring, mode="substring")
+        assert len(ids) == len(set(ids))
+        assert set(ids) == {record["id"] for record in expected}
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("open_only", [False, True])
+def test_stream_skips_entries_added_while_read(
+    build_index, tmp_path, trie_mode, open_only
+):
+    rows = [(f"pa{i:04d}", i) for i in range(0, 1000, 20)]
+    csv_path = tmp_path / "open.csv"
+    df = pd.DataFrame(rows, columns=["display_name", "user_rating_count"])
+    df["is_open"] = 1
+    df.to_csv(csv_path, index=False)
+    service = build_index(rows, trie_mode, csv_path=csv_path)
+    attribute_filter = AttributeFilter(open_only=open_only)
+    expected = streamed_ids("pa")
+
+    chunks = stream_autocomplete_results("pa", 0, attribute_filter)
+    body = next(chunks)
+    # Sorts after every name read so far, so the traversal reaches it
+    service.add_restaurant(
+        {
+            "display_name": "pa0495",
+            "user_rating_count": 1,
+            "average_rating": 0.0,
+            "is_open": 1,
+            "borough": 0,
+        }
+    )
+    body += b"".join(chunks)
+    ids = [json.loads(line)["id"] for line in body.decode("utf-8").splitlines()]
+    assert ids == expected
+
+
+def assert_materialized_responses(service, rows):
+    """Check the materialized response of every short prefix of the names"""
+    materialized = service.materialized
+    prefixes = {
+        prefix
+        for name, _ in rows
+        for prefix in materialized.prefixes(normalize_text(name))
+    }
+    assert len(materialized) >= len(prefixes) * len(materialized.shapes)
+    for prefix in sorted(prefixes) + [prefix.upper() for prefix in prefixes]:
+        for limit, expand in materialized.shapes:
+            body = service.materialized_response(prefix, limit, expand)
+            results = get_autocomplete_results(prefix, limit, expand=expand)
+            expected = format_autocomplete_response(prefix, results, limit)
+            assert json.loads(body) == expected
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+@pytest.mark.parametrize("seed", SEEDS[:4])
+def test_materialized_responses_match_computed(build_index, trie_mode, seed):
+    rng = random.Random(seed)
+    rows = random_dataset(rng, 150) + [("saint marks", 5), ("st marks place", 10)]
+    service = build_index(rows, trie_mode, synonyms=True, materialize_length=3)
+    assert_materialized_responses(service, rows)
+
+    # The API defaults and the frontend's requests are materialized
+    assert set(service.materialized.shapes) == {(10, 0), (10, FRONTEND_EXPAND)}
+
+    # Other queries are computed
+    assert service.materialized_response("zzzz", 10, 0) is None
+    assert service.materialized_response("a", 11, 0) is None
+    assert service.materialized_response("a", 10, 1) is None
+
+    # Added entries refresh the responses of their prefixes
+    added = random_dataset(rng, 20) + [("zz top", 7)]
+    for name, rating in added:
+        service.add_restaurant(
+            {
+                "display_name": normalize_text(name),
+                "user_rating_count": rating,
+                "average_rating": 0.0,
+                "is_open": 0,
+                "borough": 0,
+            }
+        )
+    assert_materialized_responses(service, rows + added)
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+def test_empty_dataset(build_index, trie_mode):
+    build_index([], trie_mode)
+    for prefix in ["", "a", "zz"]:
+        results = get_autocomplete_results(prefix, 10)
+        assert len(results) == 0
+        assert results.total_count == 0
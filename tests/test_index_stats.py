@@ -0,0 +1,64 @@
+"""
+Accuracy and cost of the size estimates reported by /api/stats
+"""
+
+import gc
+import tracemalloc
+
+import pytest
+
+from src.models.sorted_index import SortedArrayIndex
+from src.models.trie import RadixTrie, Trie
+from src.services.index_stats import trie_structure_stats
+
+# Fraction of the traced allocations the estimate may miss or add
+TOLERANCE = 0.1
+
+
+@pytest.mark.parametrize("trie_class", [Trie, RadixTrie])
+def test_estimated_bytes_match_traced_allocations(trie_class):
+    names = [
+        f"restaurant {i * 7919 % 10007} {word}"
+        for i, word in enumerate(["pizza", "bagel", "noodle", "taco", "curry"] * 400)
+    ]
+    summaries = [(1, float(i % 50) / 10) for i in range(len(names))]
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        trie = trie_class()
+        for entry_id, name in enumerate(names):
+            trie.insert(name, entry_id, summaries[entry_id])
+        gc.collect()
+        traced = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+    estimated = trie_structure_stats(trie)["estimated_bytes"]
+    assert abs(estimated - traced) <= TOLERANCE * traced
+
+
+def test_sorted_index_stats_do_not_merge_pending_inserts():
+    index = SortedArrayIndex()
+    names = ["pizza place", "pita house", "burger barn", "bagel bar"]
+    for entry_id, name in enumerate(names):
+        index.insert(name, entry_id, (1, 4.0))
+    rating_counts = [10, 5, 7, 3, 8, 1]
+    index.freeze(rating_counts)
+    state = index._current[0]
+
+    # A new key, a new entry of an existing key, and an insert repeated
+    index.insert("pasta bar", 4, (1, 4.0))
+    index.insert("pizza place", 5, (1, 4.0))
+    index.insert("pizza place", 5, (1, 4.0))
+    stats = index.structure_stats()
+    assert index.count_nodes() == stats["nodes"] == 6
+    assert stats["keys"] == 5
+    # The rank structures built for top-K queries are kept
+    assert index._current[0] is state
+    assert state.sparse is not None
+
+    index.freeze()
+    merged = index.structure_stats()
+    assert (merged["nodes"], merged["keys"]) == (stats["nodes"], stats["keys"])
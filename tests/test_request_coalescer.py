@@ -0,0 +1,99 @@
+"""
+Tests of the single-flight coalescing of identical autocomplete requests
+"""
+
+import asyncio
+
+import pytest
+
+from src.services.request_coalescer import OverloadedError, RequestCoalescer
+
+
+def computation(release, calls, result="result"):
+    """Return a coroutine function that runs until release is set"""
+
+    async def compute():
+        calls.append(result)
+        await release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return compute
+
+
+def test_identical_requests_share_one_computation():
+    async def main():
+        coalescer = RequestCoalescer()
+        release = asyncio.Event()
+        calls = []
+        compute = computation(release, calls)
+        requests = [
+            asyncio.ensure_future(coalescer.run("pi", compute)) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        assert coalescer.pending() == 1
+        release.set()
+        assert await asyncio.gather(*requests) == ["result"] * 5
+        assert calls == ["result"]
+        assert coalescer.pending() == 0
+
+        # Later requests compute again
+        assert await coalescer.run("pi", computation(release, calls)) == "result"
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_error_is_raised_to_every_waiter():
+    async def main():
+        coalescer = RequestCoalescer()
+        release = asyncio.Event()
+        compute = computation(release, [], ValueError("boom"))
+        requests = [
+            asyncio.ensure_future(coalescer.run("pi", compute)) for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        for outcome in await asyncio.gather(*requests, return_exceptions=True):
+            assert isinstance(outcome, ValueError)
+        assert coalescer.pending() == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_leader_does_not_cancel_the_computation():
+    async def main():
+        coalescer = RequestCoalescer()
+        release = asyncio.Event()
+        compute = computation(release, [])
+        leader = asyncio.ensure_future(coalescer.run("pi", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(coalescer.run("pi", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        assert await follower == "result"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+
+
+def test_new_keys_over_the_bound_are_shed():
+    async def main():
+        coalescer = RequestCoalescer(max_pending=1)
+        release = asyncio.Event()
+        leader = asyncio.ensure_future(coalescer.run("pi", computation(release, [])))
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError):
+            await coalescer.run("bu", computation(release, []))
+
+        # Joining the computation in flight adds no work and is admitted
+        follower = asyncio.ensure_future(coalescer.run("pi", computation(release, [])))
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(leader, follower) == ["result", "result"]
+        assert await coalescer.run("bu", computation(release, [], "bu")) == "bu"
+
+    asyncio.run(main())
@@ -0,0 +1,33 @@
+"""
+Tests of the sampled cProfile capture of autocomplete requests
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.request_profiler import RequestProfiler
+
+
+def test_overlapping_sampled_requests_run(tmp_path):
+    profiler = RequestProfiler(sample_rate=1.0, output_dir=str(tmp_path))
+    # Both requests are inside fn at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def request(label):
+        def fn():
+            barrier.wait()
+            return label
+
+        return profiler.run(fn, label=label)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(request, ["first", "second"]))
+
+    assert results == ["first", "second"]
+    # Only one of them was profiled
+    assert len(os.listdir(tmp_path)) == 1
+
+    # The profiler is free again afterwards
+    assert profiler.run(lambda: "third", label="third") == "third"
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,166 @@
+"""
+Tests of the request path of /api/autocomplete: the pre-warmed result cache,
+ETag revalidation and load shedding
+"""
+
+import asyncio
+import threading
+
+import anyio.to_thread
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import src.api.routes as routes
+from main_api import app
+from src.services.autocomplete_service import (
+    FRONTEND_EXPAND,
+    get_autocomplete_results,
+    warm_autocomplete_cache,
+)
+from src.services.request_coalescer import RequestCoalescer
+
+ROWS = [("pizza place", 10), ("pita house", 5), ("burger barn", 7), ("bagel bar", 3)]
+
+
+@pytest.fixture
+def client():
+    """Client of the app, without the startup load of the index"""
+    return TestClient(app)
+
+
+def test_warmed_prefixes_serve_frontend_queries(build_index, client, monkeypatch):
+    build_index(ROWS, "standard")
+    assert warm_autocomplete_cache(num_names=10, max_prefix_length=2) > 0
+
+    def not_cached(*args, **kwargs):
+        raise AssertionError("computed a pre-warmed response")
+
+    monkeypatch.setattr(routes, "get_autocomplete_results", not_cached)
+    # The query the bundled frontend sends for a first keystroke
+    for prefix in ["p", "Pi", "b"]:
+        response = client.get(
+            "/api/autocomplete",
+            params={"prefix": prefix, "limit": 10, "expand": FRONTEND_EXPAND},
+        )
+        assert response.status_code == 200
+        assert response.json()["query"] == prefix
+
+
+def test_unchanged_responses_are_not_modified(build_index, client):
+    service = build_index(ROWS, "standard")
+    response = client.get("/api/autocomplete", params={"prefix": "pi"})
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert "max-age" in response.headers["Cache-Control"]
+
+    # Raw prefixes normalizing to the same query share the ETag
+    for prefix in ["pi", "PI"]:
+        response = client.get(
+            "/api/autocomplete",
+            params={"prefix": prefix},
+            headers={"If-None-Match": f'"other", {etag}'},
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+    # Other queries and streamed responses have their own ETags
+    for params in [{"limit": 3}, {"stream": "true"}]:
+        response = client.get(
+            "/api/autocomplete",
+            params={"prefix": "pi", **params},
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    # An added restaurant changes the responses
+    service.add_restaurant(
+        {
+            "display_name": "pizza palace",
+            "user_rating_count": 8,
+            "average_rating": 0.0,
+            "is_open": 0,
+            "borough": 0,
+        }
+    )
+    response = client.get(
+        "/api/autocomplete", params={"prefix": "pi"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["total_count"] == 3
+
+
+def test_debug_responses_are_not_cached(build_index, client):
+    build_index(ROWS, "standard")
+    response = client.get("/api/autocomplete", params={"prefix": "pi", "debug": True})
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "timings" in response.json()
+
+
+def test_overload_is_shed(build_index, monkeypatch):
+    build_index(ROWS, "standard")
+    monkeypatch.setattr(routes, "coalescer", RequestCoalescer(max_pending=2))
+    release = threading.Event()
+    computed = []
+
+    def blocked_results(prefix, *args, **kwargs):
+        computed.append(prefix)
+        assert release.wait(5)
+        return get_autocomplete_results(prefix, *args, **kwargs)
+
+    monkeypatch.setattr(routes, "get_autocomplete_results", blocked_results)
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://t"
+        ) as client:
+
+            def query(prefix):
+                return asyncio.ensure_future(
+                    client.get("/api/autocomplete", params={"prefix": prefix})
+                )
+
+            admitted = [query("pi"), query("bu")]
+            while routes.coalescer.pending() < 2:
+                await asyncio.sleep(0.001)
+            # Joins the computation of "pi", so it is admitted over the bound
+            admitted.append(query("PI"))
+            shed = await client.get("/api/autocomplete", params={"prefix": "ba"})
+            assert shed.status_code == 503
+            assert shed.headers["Retry-After"] == "1"
+
+            release.set()
+            responses = await asyncio.gather(*admitted)
+            assert [r.status_code for r in responses] == [200, 200, 200]
+            assert responses[2].json()["suggestions"] == (
+                responses[0].json()["suggestions"]
+            )
+
+    asyncio.run(main())
+    assert sorted(computed) == ["bu", "pi"]
+
+
+def test_default_bound_is_below_the_thread_pool():
+    async def thread_pool_size():
+        return anyio.to_thread.current_default_thread_limiter().total_tokens
+
+    # Admitted computations never wait for a worker thread
+    assert 0 < routes.coalescer.max_pending < asyncio.run(thread_pool_size())
+
+
+def test_default_queries_are_materialized(build_index, client, monkeypatch):
+    build_index(ROWS, "standard", materialize_length=2)
+
+    def not_materialized(*args, **kwargs):
+        raise AssertionError("computed a materialized response")
+
+    monkeypatch.setattr(routes, "get_autocomplete_results", not_materialized)
+    # The API defaults, as sent by curl or a CDN, and the frontend's requests
+    for params in [{}, {"limit": 10, "expand": FRONTEND_EXPAND}]:
+        response = client.get("/api/autocomplete", params={"prefix": "Pi", **params})
+        assert response.status_code == 200
+        assert response.json()["query"] == "Pi"
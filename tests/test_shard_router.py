@@ -0,0 +1,215 @@
+"""
+Tests of the shard router against in-process fake shards
+"""
+
+import json
+from urllib.parse import parse_qs
+
+import pytest
+from fastapi.testclient import TestClient
+
+import shard_router
+from src.models.attribute_filter import BOROUGHS
+from src.services.sharding import SUBSTRING_SHARD, shard_for_prefix
+
+
+class FakeShard:
+    """Shard backend holding a store of records, following the backend API"""
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self.failures = 0  # Number of next adds answered with a 502
+        self.indexed = None  # IDs of the entries indexed here, None for all
+
+    def request(self, method, path, query="", payload=None, headers=None):
+        if path == "/autocomplete":
+            params = parse_qs(query, keep_blank_values=True)
+            return self.autocomplete(params, headers or {})
+        if path == "/health/ready":
+            body = {"status": "ready", "entries": len(self.records)}
+            return 200, {}, json.dumps(body).encode("utf-8")
+        if path == "/restaurants" and method == "GET":
+            params = parse_qs(query)
+            offset = int(params["offset"][0])
+            limit = int(params["limit"][0])
+            restaurants = [
+                {"id": offset + i, **record}
+                for i, record in enumerate(self.records[offset : offset + limit])
+            ]
+            body = {"restaurants": restaurants, "total": len(self.records)}
+            return 200, {}, json.dumps(body).encode("utf-8")
+        if path == "/restaurants" and method == "POST":
+            return self.add(payload)
+        raise AssertionError(f"Unexpected shard request {method} {path}")
+
+    def autocomplete(self, params, headers):
+        prefix = params["prefix"][0].lower()
+        limit = int(params.get("limit", ["10"])[0])
+        etag = f'W/"{len(self.records)}-{prefix}-{limit}"'
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        matches = sorted(
+            (
+                (-record["user_rating_count"], entry_id, record["display_name"])
+                for entry_id, record in enumerate(self.records)
+                if (self.indexed is None or entry_id in self.indexed)
+                and record["display_name"].startswith(prefix)
+            )
+        )
+        shown = matches[:limit] if limit > 0 else matches
+        body = {
+            "query": prefix,
+            "suggestions": [
+                {"id": entry_id, "name": name, "rating_count": -rating, "score": 1.0}
+                for rating, entry_id, name in shown
+            ],
+            "total_count": len(matches),
+            "complete": len(matches) <= len(shown),
+            "status": "success",
+        }
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+        return 200, headers, json.dumps(body).encode("utf-8")
+
+    def add(self, payload):
+        if self.failures:
+            self.failures -= 1
+            return 502, {}, b'{"detail": "Shard unreachable"}'
+        record = {
+            "display_name": payload["name"],
+            "user_rating_count": payload["rating"],
+            "average_rating": payload.get("average_rating", 0.0),
+            "is_open": int(payload.get("is_open", False)),
+            "borough": BOROUGHS.index(payload.get("borough") or "unknown"),
+        }
+        entry_id = payload.get("expected_id")
+        if entry_id != len(self.records):
+            if entry_id < len(self.records) and self.records[entry_id] == record:
+                return 200, {}, json.dumps({"id": entry_id}).encode("utf-8")
+            return 409, {}, b'{"detail": "Unexpected entry ID"}'
+        self.records.append(record)
+        return 200, {}, json.dumps({"id": entry_id}).encode("utf-8")
+
+
+@pytest.fixture
+def shards(monkeypatch):
+    """Three fake shards behind the router"""
+    fakes = [FakeShard() for _ in range(3)]
+    monkeypatch.setattr(shard_router, "SHARD_URLS", ["a", "b", "c"])
+    monkeypatch.setattr(
+        shard_router,
+        "shard_request",
+        lambda shard, *args, **kwargs: fakes[shard].request(*args, **kwargs),
+    )
+    return fakes
+
+
+@pytest.fixture
+def client():
+    return TestClient(shard_router.app)
+
+
+def test_failed_add_is_rolled_forward(shards, client):
+    restaurant = {"name": "pizza place", "rating": 3, "borough": "brooklyn"}
+    assert client.post("/api/restaurants", json=restaurant).json()["id"] == 0
+
+    # Shard 1 fails every attempt of the second add
+    shards[1].failures = shard_router.WRITE_ATTEMPTS
+    response = client.post("/api/restaurants", json={"name": "pita", "rating": 5})
+    assert response.status_code == 502
+    assert [len(shard.records) for shard in shards] == [2, 1, 2]
+    ready = client.get("/api/health/ready")
+    assert ready.status_code == 503
+    assert ready.json()["detail"]["status"] == "out_of_sync"
+
+    # The next add first copies the missing entry to shard 1
+    response = client.post("/api/restaurants", json={"name": "bagel", "rating": 1})
+    assert response.json()["id"] == 2
+    assert shards[1].records == shards[0].records == shards[2].records
+    assert client.get("/api/health/ready").status_code == 200
+
+
+def test_transient_shard_failure_is_retried(shards, client):
+    shards[2].failures = shard_router.WRITE_ATTEMPTS - 1
+    response = client.post("/api/restaurants", json={"name": "pizza", "rating": 3})
+    assert response.json()["id"] == 0
+    assert [len(shard.records) for shard in shards] == [1, 1, 1]
+
+
+def restaurant(name, rating):
+    """Return a store record with default attributes"""
+    return {
+        "display_name": name,
+        "user_rating_count": rating,
+        "average_rating": 0.0,
+        "is_open": 0,
+        "borough": 0,
+    }
+
+
+def test_short_prefix_is_merged_across_shards(shards, client):
+    records = [
+        restaurant("pizza place", 10),
+        restaurant("st marks pizza", 7),
+        restaurant("pita house", 5),
+        restaurant("pasta bar", 8),
+    ]
+    for shard in shards:
+        shard.records = list(records)
+    # Entry 1 is also indexed as "saint marks pizza" on another shard
+    shards[0].indexed = {0, 1}
+    shards[1].indexed = {1, 2}
+    shards[2].indexed = {3}
+
+    response = client.get("/api/autocomplete", params={"prefix": "", "limit": 3})
+    body = response.json()
+    assert [s["id"] for s in body["suggestions"]] == [0, 3, 1]
+    assert [s["score"] for s in body["suggestions"]] == [1.0, 0.8, 0.7]
+    assert body["total_count"] == 4
+    assert not body["complete"]
+
+    # The merged response is revalidated against the ETags of every shard
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"merged-')
+    assert response.headers["Cache-Control"] == "public, max-age=60"
+    response = client.get(
+        "/api/autocomplete",
+        params={"prefix": "", "limit": 3},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 304
+    shards[2].records.append(restaurant("pho", 1))
+    response = client.get(
+        "/api/autocomplete",
+        params={"prefix": "", "limit": 3},
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_long_prefix_is_routed_to_its_shard(shards, client):
+    owner = shard_for_prefix("pi", len(shards), shard_router.SHARD_PREFIX_LENGTH)
+    shards[owner].records = [restaurant("pizza place", 10)]
+
+    response = client.get("/api/autocomplete", params={"prefix": "Pi"})
+    assert [s["name"] for s in response.json()["suggestions"]] == ["pizza place"]
+    etag = response.headers["ETag"]
+    response = client.get(
+        "/api/autocomplete", params={"prefix": "Pi"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_substring_query_is_sent_to_the_substring_shard(shards, client, monkeypatch):
+    requested = []
+    monkeypatch.setattr(
+        shard_router,
+        "shard_request",
+        lambda shard, *args, **kwargs: requested.append(shard)
+        or shards[shard].request(*args, **kwargs),
+    )
+    for query in ["p", "pi", "zza", "place"]:
+        params = {"prefix": query, "mode": "substring"}
+        assert client.get("/api/autocomplete", params=params).status_code == 200
+    assert requested == [SUBSTRING_SHARD] * 4
@@ -0,0 +1,36 @@
+"""
+Tests of the synonym groups names are expanded with at index time
+"""
+
+import json
+
+from src.utils.synonyms import MAX_VARIANTS, expand_variants, load_synonyms
+
+
+def test_single_letters_need_their_period():
+    alternatives = load_synonyms()
+    assert expand_variants("b n b e w deli", alternatives) == ["b n b e w deli"]
+    assert expand_variants("e. village pizza", alternatives) == [
+        "e. village pizza",
+        "east village pizza",
+    ]
+
+
+def test_ambiguous_words_are_not_expanded():
+    alternatives = load_synonyms()
+    # "st" is saint or street: abbreviated from either, never expanded
+    assert expand_variants("st marks place", alternatives) == ["st marks place"]
+    assert "st marks" in expand_variants("saint marks", alternatives)
+    assert "main st" in expand_variants("main street", alternatives)
+    assert not any(
+        "street" in variant for variant in expand_variants("saint marks", alternatives)
+    )
+
+
+def test_variants_are_capped(tmp_path):
+    path = tmp_path / "synonyms.json"
+    path.write_text(json.dumps([["a", "b", "c"]]))
+    alternatives = load_synonyms(str(path))
+    variants = expand_variants("a a a a", alternatives)
+    assert len(variants) == MAX_VARIANTS
+    assert variants[0] == "a a a a"
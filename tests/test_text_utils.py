@@ -0,0 +1,22 @@
+"""
+Tests of the text normalization shared by the backend and the frontend
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from src.utils.text_utils import normalize_text
+
+# Also checked against the frontend's normalizeText in frontend/src/api.test.ts
+VECTORS_PATH = (
+    Path(__file__).parent.parent / "frontend" / "src" / "normalizationVectors.json"
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected", json.loads(VECTORS_PATH.read_text(encoding="utf-8"))
+)
+def test_normalization_matches_frontend(text, expected):
+    assert normalize_text(text) == expected
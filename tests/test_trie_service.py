@@ -0,0 +1,108 @@
+"""
+Tests of the index lifecycle of TrieService: builds, adds and index identity
+"""
+
+import json
+
+import pandas as pd
+import pytest
+
+from src.services.autocomplete_service import get_autocomplete_results
+from src.services.trie_service import TRIE_MODES, EntryIdConflict
+
+ROWS = [("pizza place", 10), ("pita house", 5), ("burger barn", 7)]
+
+
+def restaurant(name, rating):
+    """Return a store record with default attributes"""
+    return {
+        "display_name": name,
+        "user_rating_count": rating,
+        "average_rating": 0.0,
+        "is_open": 0,
+        "borough": 0,
+    }
+
+
+@pytest.mark.parametrize("trie_mode", TRIE_MODES)
+def test_add_during_build_is_indexed(build_index, trie_mode):
+    service = build_index(ROWS, trie_mode)
+
+    # Add a restaurant after the rebuild read the names, before its swap
+    trie_class = service.trie_class
+    added = []
+
+    def new_trie():
+        added.append(service.add_restaurant(restaurant("pizza palace", 8)))
+        return trie_class()
+
+    service.trie_class = new_trie
+    assert service.build_trie()["status"] == "success"
+    service.trie_class = trie_class
+
+    ids = [record["id"] for record in get_autocomplete_results("pizza p", 10)]
+    assert ids == [0, added[0]]
+    substring = get_autocomplete_results("palace", 10, mode="substring")
+    assert [record["id"] for record in substring] == added
+
+
+def test_add_with_expected_id(build_index):
+    service = build_index(ROWS, "standard")
+    record = restaurant("pizza palace", 8)
+    assert service.add_restaurant(record, expected_id=3) == 3
+    # A retry of the same add is not applied twice
+    assert service.add_restaurant(record, expected_id=3) == 3
+    assert len(service.store) == 4
+
+    with pytest.raises(EntryIdConflict):
+        service.add_restaurant(restaurant("pita palace", 2), expected_id=3)
+    with pytest.raises(EntryIdConflict):
+        service.add_restaurant(record, expected_id=5)
+    assert len(service.store) == 4
+
+
+def test_index_tag_identifies_the_data(build_index, tmp_path):
+    first = build_index(ROWS, "standard")
+    second = build_index(ROWS, "radix")
+    # Shared by instances serving the same data, whatever their history
+    second.build_trie()
+    assert first.index_tag() == second.index_tag()
+
+    # Covers the filtered attributes, not only names and ratings
+    csv_path = tmp_path / "open.csv"
+    df = pd.DataFrame(ROWS, columns=["display_name", "user_rating_count"])
+    df["is_open"] = [0, 0, 1]
+    df.to_csv(csv_path, index=False)
+    assert build_index(ROWS, "standard", csv_path=csv_path).index_tag() != (
+        first.index_tag()
+    )
+
+    tag = first.index_tag()
+    first.add_restaurant(restaurant("pizza palace", 8))
+    assert first.index_tag() != tag
+    # Updated incrementally to the checksum of the store
+    assert first._column_checksums == first._checksum_columns()
+    second.add_restaurant(restaurant("pizza palace", 8))
+    assert first.index_tag() == second.index_tag()
+
+
+def test_materialized_responses_render_their_own_index(build_index):
+    service = build_index(ROWS, "standard", synonyms=True, materialize_length=2)
+    # Another instance, without synonyms, is the singleton while the first
+    # one rebuilds
+    other = build_index([("pizza planet", 99)], "standard")
+    service.build_trie()
+    service.add_restaurant(restaurant("pizza palace", 8))
+    service.add_restaurant(restaurant("saint marks pizza", 1))
+
+    limit, expand = service.materialized.shapes[-1]
+    body = json.loads(service.materialized_response("pi", limit, expand))
+    names = [suggestion["name"] for suggestion in body["suggestions"]]
+    assert names == ["pizza place", "pizza palace", "pita house"]
+    assert other.materialized_response("pi", limit, expand) is None
+
+    body = json.loads(service.materialized_response("st", limit, expand))
+    assert body["suggestions"][0]["aliases"] == [
+        "st marks pizza",
+        "st. marks pizza",
+    ]